@@ -24,8 +24,8 @@ Features:
 API Endpoints:
 - Authentication: /api/login, /api/profile
 - Chat: /api/ask, /api/aichat/*
-- Document Management: /api/upload, /api/admin/*
-- Search: /api/search
+- Document Management: /api/upload, /api/upload/status/<job_id>, /api/admin/*
+- Search: /api/search, /api/rag/batch_search
 - Support: /api/save_ticket, /api/get_tickets
 - Configuration: /api/readconfig, /api/updateconfig
 
@@ -46,8 +46,18 @@ License: Internal UNSW Project
 from flask import Flask, request, jsonify, send_from_directory, abort
 from flask_cors import CORS
 from flask_mail import Mail, Message
+import pdf_extract  # pdf_extract.py
+# Fork the PDF extraction workers while this process is still single-threaded
+pdf_extract.start_pool()
 import database  # database.py
-from search import extract_keywords, multi_hot_encode, calculate_similarity
+import embedding  # embedding.py
+import chunker  # chunker.py
+import ingest  # ingest.py
+import ingest_cache  # ingest_cache.py
+import qa_parser  # qa_parser.py
+import rag_cache  # rag_cache.py
+import rag_store  # rag_store.py
+from search import extract_keywords, encode_keyword_ids, document_index, keyword_vocabulary
 import requests
 # JWT token generation library
 import jwt
@@ -56,16 +66,10 @@ import datetime  # For JWT expiration time, etc.
 
 # RAG (Retrieval-Augmented Generation) imports
 import re
-import uuid
-import logging
-import pdfplumber
 from werkzeug.utils import secure_filename
 
 # RAG (Retrieval-Augmented Generation) imports
-import faiss
-import pickle
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import json
 from datetime import datetime  # For file time display
 import time
@@ -113,9 +117,16 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RAG_FOLDER, exist_ok=True)
 
-# RAG model initialization
-ragMODEL = SentenceTransformer('all-MiniLM-L6-v2')
+# RAG model initialization (one shared encoder per process, warmed at startup)
+encoder = embedding.get_encoder()
+encoder.warmup()
+# Query-time encodes go through the micro-batcher so concurrent chat turns share a forward pass
+query_encoder = embedding.get_batcher()
 PDF_URL_BASE = "http://localhost:8000/pdfs"
+# Upper bound on questions accepted by /api/rag/batch_search per request
+RAG_BATCH_MAX_QUESTIONS = 1000
+# Upper bound on top_k; faiss allocates questions x top_k results
+RAG_BATCH_MAX_TOP_K = 100
 
 # AI Chat Configuration Section
 API_URL = "https://api.siliconflow.cn/v1/chat/completions"
@@ -231,23 +242,24 @@ def search_api():
     data = request.get_json()
     query = data.get("query", "").strip()
 
-    # Get documents from database
-    documents, error = database.get_pdf_documents_for_search()
-    if error:
-        return jsonify({"success": False, "error": error}), 500
-
-    extracted = extract_keywords(query)
-    query_encoded = multi_hot_encode(extracted)
-
-    results = []
-    for doc in documents:
-        # Parse JSON format keywords_encoded
-        try:
-            keywords_encoded = json.loads(doc["keywords_encoded"])
-        except:
+    # Get the document index (cached; rebuilt after documents change)
+    index = document_index.get()
+    if index is None:
+        return jsonify({"success": False, "error": document_index.last_error}), 500
+
+    vocabulary = keyword_vocabulary.get()
+    extracted = extract_keywords(query, vocabulary)
+    query_ids = encode_keyword_ids(extracted, vocabulary)
+
+    # Score the documents sharing a keyword or title word with the query,
+    # then keep the 5 best above the threshold
+    document_ids, scores = index.score(query_ids, query)
+    filtered = []
+    for document_id, score in index.top(document_ids, scores, 5, 0.1):
+        doc = index.documents.get(document_id)
+        if doc is None:
+            # Deleted by another request after scoring
             continue
-            
-        score = calculate_similarity(query_encoded, keywords_encoded, query, doc["title"])
         # Handle document_date format
         document_date = doc.get("document_date", "")
         if document_date and hasattr(document_date, 'isoformat'):
@@ -256,17 +268,14 @@ def search_api():
         elif document_date:
             # If it's a string, keep as is
             document_date = str(document_date)
-        
-        results.append({
+
+        filtered.append({
             "title": doc["title"],
             "pdf_path": doc.get("pdf_path", ""),
             "score": score,
             "document_date": document_date
         })
 
-    # Set higher threshold, only return results with real matching degree
-    filtered = sorted([r for r in results if r["score"] > 0.1], key=lambda x: x["score"], reverse=True)[:5]
-
     return jsonify({"results": filtered})
 
 
@@ -338,54 +347,50 @@ def list_pdf_names(pdfs_dir="pdfs"):
     return pdf_names
 
 
-def rag_search(question, top_k=10, score_threshold=1.0):
-    # 1. First get all PDF prefix names
-    pdf_list = list_pdf_names()
+rag_corpus = rag_store.CorpusManager(RAG_FOLDER, list_pdf_names)
+retrieval_cache = rag_cache.RetrievalCache()
+ingestion_cache = ingest_cache.IngestCache(os.path.join(RAG_FOLDER, 'cache'), encoder.model_name)
 
-    # 2. Generate query vector
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    q_emb = model.encode([question])
 
-    all_hits = []
-    for prefix in pdf_list:
-        # 3. Construct index & metadata paths
-        idx_path = os.path.join(BASE_DIR, "rag", f"{prefix}.index")
-        ids_path = os.path.join(BASE_DIR, "rag", f"{prefix}_ids.pkl")
-        docs_path = os.path.join(BASE_DIR, "rag", f"{prefix}_docs.json")
-
-        # Skip if corresponding files don't exist
-        if not (os.path.exists(idx_path) and os.path.exists(ids_path) and os.path.exists(docs_path)):
-            continue
+def cite_hit(h):
+    """
+    Add the citation title and url to a retrieval hit
 
-        # 4. Load index and document mapping
-        index = faiss.read_index(idx_path)
-        with open(ids_path, "rb") as f:
-            ids = pickle.load(f)
-        with open(docs_path, "r", encoding="utf-8") as f:
-            docs = json.load(f)
-        doc_map = {d["id"]: d for d in docs}
-
-        # 5. Retrieve top_k
-        D, I = index.search(np.array(q_emb, dtype="float32"), top_k)
-        for dist, idx in zip(D[0], I[0]):
-            if dist > score_threshold:
-                continue
-            entry = doc_map[ids[idx]]
-            all_hits.append({
-                "score": float(dist),
-                "pdf": prefix,
-                "question": entry.get("question", ""),
-                "answer": entry.get("answer", ""),
-                # Change here: title directly uses prefix; url uses file path under pdfs directory
-                "title": prefix,
-                "url": f"{PDF_URL_BASE}/{prefix}.pdf",
-            })
+    Hits from chunked documents carry a page label as their question; their
+    url opens the PDF at the chunk's first page.
+    """
+    url = f"{PDF_URL_BASE}/{h['pdf']}.pdf"
+    pages = chunker.parse_page_label(h["question"])
+    if pages:
+        url = f"{url}#page={pages[0]}"
+    return {**h, "title": h["pdf"], "url": url}
+
+
+def rag_search(question, top_k=10, score_threshold=rag_store.DEFAULT_SCORE_THRESHOLD):
+    # 1. Get the resident corpus (loaded once, swapped on upload/delete)
+    corpus = rag_corpus.get()
+    retrieval_cache.sync(corpus.version)
+    normalized = rag_cache.normalize_question(question)
+
+    # 2. Retrieve top_k, reusing cached results and embeddings. Confident exact-term
+    #    matches come from the BM25 index alone; everything else is hybrid search
+    hits = retrieval_cache.get_results(normalized, top_k, score_threshold, corpus.version)
+    if hits is None:
+        hits = corpus.lexical_match(normalized, top_k=top_k, score_threshold=score_threshold)
+        if hits is None:
+            q_emb = retrieval_cache.get_embedding(normalized)
+            if q_emb is None:
+                q_emb = query_encoder.encode([normalized])
+                retrieval_cache.put_embedding(normalized, q_emb)
+            hits = corpus.hybrid_search(normalized, q_emb, top_k=top_k, score_threshold=score_threshold)
+        retrieval_cache.put_results(normalized, top_k, score_threshold, corpus.version, hits)
+
+    # 3. title directly uses prefix; url uses file path under pdfs directory
+    all_hits = [cite_hit(h) for h in hits]
 
-    # 6. Merge all, sort and take final top_k
-    all_hits = sorted(all_hits, key=lambda x: x["score"])[:top_k]
     if not all_hits:
         return {}
-    # 7. Assemble return value
+    # 4. Assemble return value
     parts = []
     ref_dict = {}
     for h in all_hits:
@@ -394,17 +399,134 @@ def rag_search(question, top_k=10, score_threshold=1.0):
         # If the same pdf appears multiple times, it will be overwritten once here, finally getting unique mapping
         ref_dict[prefix] = url
 
-    # Construct knowledge_str same as before
-    parts = [
-        f"{i}. （{h['pdf']}）Question: {h['question']}\n"
-        f"   Answer:   {h['answer']}"
-        for i, h in enumerate(all_hits, 1)
-    ]
+    # Construct knowledge_str same as before; text chunks are cited by page
+    parts = []
+    for i, h in enumerate(all_hits, 1):
+        pages = chunker.parse_page_label(h["question"])
+        if pages:
+            where = f"page {pages[0]}" if pages[0] == pages[1] else f"pages {pages[0]}-{pages[1]}"
+            parts.append(f"{i}. （{h['pdf']}, {where}）Excerpt: {h['answer']}")
+        else:
+            parts.append(
+                f"{i}. （{h['pdf']}）Question: {h['question']}\n"
+                f"   Answer:   {h['answer']}"
+            )
     knowledge_str = "\n\n".join(parts)
 
     return knowledge_str, ref_dict
 
 
+def rag_batch_search(questions, top_k=10, score_threshold=rag_store.DEFAULT_SCORE_THRESHOLD):
+    """
+    Retrieve hits for many questions at once (no LLM call, nothing persisted)
+
+    Uncached questions that the lexical fast path cannot answer are encoded in
+    one batch and searched with one matrix index search; results are written to the retrieval cache, so this also
+    serves as a cache warmer. The lexical fast path only answers with the
+    default score_threshold (see RagCorpus.lexical_match).
+
+    Returns:
+        list: One dict per question with 'question' and 'hits'
+    """
+    corpus = rag_corpus.get()
+    retrieval_cache.sync(corpus.version)
+    normalized = [rag_cache.normalize_question(q) for q in questions]
+
+    # Look up each distinct question once
+    results = {}
+    computed = {}
+    for n in dict.fromkeys(normalized):
+        results[n] = retrieval_cache.get_results(n, top_k, score_threshold, corpus.version)
+        if results[n] is None:
+            computed[n] = results[n] = corpus.lexical_match(n, top_k=top_k, score_threshold=score_threshold)
+    missing = [n for n, hits in results.items() if hits is None]
+    if missing:
+        embeddings = {n: retrieval_cache.get_embedding(n) for n in missing}
+        to_encode = [n for n, emb in embeddings.items() if emb is None]
+        if to_encode:
+            for n, emb in zip(to_encode, encoder.encode(to_encode)):
+                embeddings[n] = emb.reshape(1, -1)
+                retrieval_cache.put_embedding(n, embeddings[n])
+
+        batch = corpus.hybrid_search_batch(missing, np.vstack([embeddings[n] for n in missing]),
+                                           top_k=top_k, score_threshold=score_threshold)
+        for n, hits in zip(missing, batch):
+            computed[n] = results[n] = hits
+    for n, hits in computed.items():
+        retrieval_cache.put_results(n, top_k, score_threshold, corpus.version, hits)
+
+    return [
+        {
+            "question": question,
+            "hits": [cite_hit(h) for h in hits]
+        }
+        for question, hits in zip(questions, (results[n] for n in normalized))
+    ]
+
+
+@app.route('/api/rag/batch_search', methods=['POST'])
+def rag_batch_search_api():
+    """
+    Run retrieval for a list of questions without calling the LLM
+
+    score_threshold is the maximum L2 distance of vector hits. With the
+    default (1.0), confident exact-term questions may be answered from BM25
+    alone (hits with score null); any other value always runs the
+    thresholded hybrid search.
+    """
+    data = request.get_json() or {}
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        return jsonify({'success': False, 'error': 'questions must be a non-empty list'}), 400
+    if len(questions) > RAG_BATCH_MAX_QUESTIONS:
+        return jsonify({
+            'success': False,
+            'error': f'At most {RAG_BATCH_MAX_QUESTIONS} questions per request'
+        }), 400
+    questions = [str(q).strip() for q in questions]
+
+    try:
+        top_k = int(data.get('top_k', 10))
+        score_threshold = float(data.get('score_threshold', rag_store.DEFAULT_SCORE_THRESHOLD))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'top_k and score_threshold must be numbers'}), 400
+    if not 1 <= top_k <= RAG_BATCH_MAX_TOP_K:
+        return jsonify({'success': False, 'error': f'top_k must be between 1 and {RAG_BATCH_MAX_TOP_K}'}), 400
+
+    results = rag_batch_search(questions, top_k=top_k, score_threshold=score_threshold)
+    return jsonify({'success': True, 'results': results})
+
+
+@app.route('/api/admin/encoder/stats', methods=['GET'])
+def encoder_stats_api():
+    """Get embedding encoder latency statistics"""
+    stats = encoder.stats()
+    stats['batching'] = query_encoder.stats()
+    return jsonify({'success': True, 'stats': stats})
+
+
+@app.route('/api/admin/rag/stats', methods=['GET'])
+def rag_stats_api():
+    """Get resident corpus and retrieval cache statistics"""
+    corpus = rag_corpus.get()
+    return jsonify({
+        'success': True,
+        'corpus': {
+            'version': corpus.version,
+            'entries': len(corpus),
+            'index_type': corpus.index_type
+        },
+        'cache': retrieval_cache.stats(),
+        'ingestion_cache': ingestion_cache.stats()
+    })
+
+
+@app.route('/api/admin/db/stats', methods=['GET'])
+def db_stats_api():
+    """Get database connection pool statistics of this worker process"""
+    return jsonify({'success': True, 'stats': database.pool.stats()})
+
+
 def try_load_json(text: str):
     """Prioritize parsing model output as JSON, return None and exception if failed"""
     try:
@@ -519,79 +641,101 @@ def allowed_file(filename):
 
 
 # RAG Generation
-def extract_text_from_pdf(path):
+def process_ingest_job(job, report):
     """
-    Extract text from PDF and return the entire document as a string.
-    """
-    texts = []
-    with pdfplumber.open(path) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            try:
-                text = page.extract_text()
-            except Exception as e:
-                logging.error(f"Error extracting text from page {page_num}: {e}")
-                continue
-            if text:
-                texts.append(text)
-    return "\n".join(texts)
+    Ingestion pipeline for one uploaded PDF, run by the background job queue
 
+    Args:
+        job (dict): ingest_jobs row
+        report (callable): Called with the name of each stage as it starts
 
-def parse_qa_pairs(full_text):
+    Returns:
+        int: Number of entries (Q&A pairs or text chunks) indexed
     """
-    Extract Q&A pairs from full text.
-    Match lines ending with question marks or numbered heading lines as questions, 
-    with subsequent content as answers.
-    """
-    docs = []
-    lines = [line.strip() for line in full_text.splitlines()]
-    heading_re = re.compile(r'^(\d+(?:\.\d+)*):\s*(.+)')
-    i = 0
-    while i < len(lines):
-        question = None
-        line = lines[i]
-        if line.endswith('?') or line.endswith('？'):
-            question = line
-        else:
-            m = heading_re.match(line)
-            if m:
-                question = m.group(2)
-        if question:
-            answer_lines = []
-            j = i + 1
-            while j < len(lines) and lines[j]:
-                if lines[j].endswith('?') or heading_re.match(lines[j]):
-                    break
-                answer_lines.append(lines[j])
-                j += 1
-            answer = ' '.join(answer_lines).strip()
-            docs.append({
-                'id': f"qa_{uuid.uuid4().hex[:8]}",
-                'question': question,
-                'answer': answer
-            })
-            i = j
-        else:
-            i += 1
-    return docs
+    filename = job['pdf_path']
+    title = job['title']
+    keywords = job['keywords']
+    pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
 
+    report('parsing')
+
+    # 1-2. Stream pages -> lines -> Q&A pairs -> fixed-size embedding batches
+    #    into the document's shard, so memory is bounded by the batch size.
+    #    PDFs without Q&A structure are split into page-tagged text chunks
+    #    instead (see chunker.py). The same bytes ingested before (under any
+    #    filename) reuse the cached entries and vectors; otherwise only text
+    #    not embedded before is encoded
+    extractor = pdf_extract.resolve_backend(job.get('extractor'))
+    chunking = chunker.resolve_mode(job.get('chunking'))
+    variant = f"{extractor}-{chunker.cache_tag(chunking)}"
+    content_hash = job.get('content_hash')
+    base = os.path.splitext(filename)[0]
+    source = {'title': title, 'url': pdf_path, 'last_edited': datetime.today().isoformat()}
 
-def build_docs_from_pdf(pdf_path, title, url=None, last_edited=None):
-    """
-    Build Q&A document list from PDF.
-    """
-    text = extract_text_from_pdf(pdf_path)
-    qa = parse_qa_pairs(text)
-    docs = []
-    for item in qa:
-        docs.append({
-            **item,
-            'source': {
-                'title': title,
-                'url': url or pdf_path,
-                'last_edited': last_edited or datetime.today().isoformat()
-            }
-        })
-    return docs
+    # 3. Write the shard to disk batch by batch (an existing shard is only replaced once complete)
+    batches = ingestion_cache.get_document(content_hash, variant, rag_store.STREAM_BATCH_SIZE)
+    if batches is not None:
+        shard_path, entries = rag_store.write_shard_stream(RAG_FOLDER, base, batches, source)
+    else:
+        embedding_started = False
+
+        def encode(texts):
+            nonlocal embedding_started
+            if not embedding_started:
+                report('embedding')
+                embedding_started = True
+            return ingestion_cache.encode(texts, encoder.encode)
+
+        entries = 0
+        if chunking != 'chunks':
+            pages = pdf_extract.iter_pages(pdf_path, backend=extractor)
+            qa = qa_parser.iter_qa_pairs(qa_parser.iter_lines(pages))
+            shard_path, entries = rag_store.write_shard_stream(
+                RAG_FOLDER, base, rag_store.embed_batches(qa, encode), source
+            )
+        if not entries and chunking != 'qa':
+            pages = pdf_extract.iter_pages(pdf_path, backend=extractor, numbered=True)
+            chunks = chunker.iter_chunks(pages)
+            shard_path, entries = rag_store.write_shard_stream(
+                RAG_FOLDER, base, rag_store.embed_batches(chunks, encode), source
+            )
+        if entries:
+            ingestion_cache.put_document(content_hash, variant, shard_path)
+    if not entries:
+        if chunking == 'qa':
+            raise ingest.IngestError('No Q&A pairs found in the PDF. Please check the file content.')
+        raise ingest.IngestError('No text found in the PDF. Please check the file content.')
+
+    # 4. Add (or replace) the document's vectors in the resident corpus
+    report('indexing')
+    rag_corpus.add_document(base)
+
+    # 5. Save to database; new keywords get ids and the document is linked
+    #    to its keyword ids, without touching any other document. Saving
+    #    updates the file's existing row, so a re-run job does not add another
+    report('saving')
+    success, error = database.save_pdf_document(
+        title, keywords, filename, job['document_date'], job['uploader_id'], job['file_size']
+    )
+    if not success:
+        # Answers must not cite a document that has no row (and so cannot be
+        # deleted); a re-uploaded file keeps its row and its new vectors
+        document_id, lookup_error = database.get_pdf_document_id(filename)
+        if document_id is None and not lookup_error:
+            rag_store.remove_shard(RAG_FOLDER, base)
+            rag_corpus.remove_document(base)
+        raise ingest.IngestError(f'Failed to save document metadata: {error}')
+
+    return entries
+
+
+# Link documents saved before keyword ids were stored per document
+success, msg = database.backfill_document_keywords()
+if not success:
+    print(f"Warning: Failed to link document keywords: {msg}")
+
+ingest_queue = ingest.IngestQueue(process_ingest_job)
+ingest_queue.start()
 
 
 @app.route('/api/upload', methods=['POST'])
@@ -609,101 +753,83 @@ def upload_and_generate_rag():
     title = request.form.get('title', '').strip()
     keywords = request.form.get('keywords', '').strip()
     document_date = request.form.get('document_date', '').strip()
+    # Optional PDF text extractor backend for this upload (see pdf_extract.BACKENDS)
+    extractor = request.form.get('extractor', '').strip() or None
+    # Optional chunking mode: auto, qa or chunks (see chunker.py)
+    chunking = request.form.get('chunking', '').strip() or None
     
     if not title:
         return jsonify({'success': False, 'message': 'Title is required'}), 400
     if not keywords:
         return jsonify({'success': False, 'message': 'Keywords are required'}), 400
-
-    # 3. Save PDF
-    filename = secure_filename(file.filename)
-    pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(pdf_path)
-    file_size = os.path.getsize(pdf_path)
-
-    # 4. Generate keyword encoding
-    from search import multi_hot_encode
-    keyword_list = [k.strip() for k in keywords.split(',') if k.strip()]
-    keywords_encoded = multi_hot_encode(keyword_list)
-    keywords_encoded_json = json.dumps(keywords_encoded)
-
-    # 5. Parse PDF, generate Q&A pairs
-    docs = build_docs_from_pdf(
-        pdf_path=pdf_path,
-        title=title,
-        url=None,
-        last_edited=None
-    )
-
-    # 6. Prepare texts and generate embeddings
-    texts = [d['question'] + ' ' + d['answer'] for d in docs]
-    if not texts:
+    if extractor and extractor not in pdf_extract.BACKENDS:
         return jsonify({
             'success': False,
-            'message': 'No Q&A pairs found in the PDF. Please check the file content.'
+            'message': f"Unknown extractor, expected one of: {', '.join(pdf_extract.BACKENDS)}"
+        }), 400
+    if chunking and chunking not in chunker.MODES:
+        return jsonify({
+            'success': False,
+            'message': f"Unknown chunking mode, expected one of: {', '.join(chunker.MODES)}"
         }), 400
 
-    embeddings = ragMODEL.encode(
-        texts,
-        convert_to_numpy=True,
-        show_progress_bar=False
-    )
-    emb_array = np.array(embeddings, dtype='float32')
-    if emb_array.ndim == 1:
-        emb_array = np.vstack(emb_array)
-
-    # 7. Build FAISS index
-    dim = emb_array.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(emb_array)
-
-    # 8. Write to disk
-    base = os.path.splitext(filename)[0]
-    index_file = os.path.join(RAG_FOLDER, f"{base}.index")
-    faiss.write_index(index, index_file)
-
-    docs_file = os.path.join(RAG_FOLDER, f"{base}_docs.json")
-    with open(docs_file, 'w', encoding='utf-8') as f:
-        json.dump(docs, f, ensure_ascii=False, indent=2)
-
-    ids_file = os.path.join(RAG_FOLDER, f"{base}_ids.pkl")
-    ids = [d['id'] for d in docs]
-    with open(ids_file, 'wb') as f:
-        pickle.dump(ids, f)
+    # 3. Save PDF, hashing the bytes as they are written for the ingestion cache
+    filename = secure_filename(file.filename)
+    pdf_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    content_hash, file_size = ingest_cache.save_upload(file.stream, pdf_path)
 
-    # 9. Save to database
+    # 4. Queue parsing, embedding and indexing for the background workers
     uploader_id = None  # Can be obtained from token, temporarily set to None
-    success, error = database.save_pdf_document(
-        title, keywords, keywords_encoded_json, filename, document_date, uploader_id, file_size
+    job_id, error = ingest_queue.submit(
+        filename, title, keywords, document_date, file_size, uploader_id, extractor, content_hash, chunking
     )
-    
-    if not success:
+    if error:
         return jsonify({
             'success': False,
-            'message': f'Failed to save document metadata: {error}'
+            'message': f'Failed to queue document for processing: {error}'
         }), 500
 
-    # 10. Update keyword database and re-encode all documents
-    keyword_list = [k.strip() for k in keywords.split(',') if k.strip()]
-    success, msg = database.add_keywords_to_db(keyword_list)
-    if not success:
-        print(f"Warning: Failed to add keywords to database: {msg}")
-    
-    # Re-encode all documents
-    success, msg = database.update_all_documents_encoding()
-    if not success:
-        print(f"Warning: Failed to update document encodings: {msg}")
-
-    # 11. Return result
+    # 5. Return the job for status polling
     return jsonify({
         'success': True,
-        'message': 'Upload succeeded, new RAG files have been generated',
+        'message': 'Upload received, the document is being processed',
+        'job_id': job_id,
+        'status_url': f'/api/upload/status/{job_id}',
         'pdf': filename,
-        'title': title,
-        'index_path': index_file,
-        'docs_path': docs_file,
-        'entries': len(docs)
-    }), 200
+        'title': title
+    }), 202
+
+
+@app.route('/api/upload/status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    """Get the stage, progress and result of an ingestion job"""
+    job, error = ingest_queue.status(job_id)
+    if error:
+        return jsonify({'success': False, 'error': error}), 500
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    for key in ('created_at', 'updated_at', 'started_at', 'finished_at'):
+        if job.get(key) and hasattr(job[key], 'isoformat'):
+            job[key] = job[key].isoformat()
+
+    return jsonify({
+        'success': True,
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'entries': job['entries'],
+        'pdf': job['pdf_path'],
+        'title': job['title'],
+        'extractor': job['extractor'] or pdf_extract.BACKEND,
+        'chunking': job['chunking'] or chunker.MODE,
+        'attempts': job['attempts'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    })
 
 
 
@@ -758,36 +884,20 @@ def delete_pdf(document_id):
     
     # 3. Delete related RAG files
     base = os.path.splitext(target_doc['pdf_path'])[0]
-    rag_files = [
-        os.path.join(RAG_FOLDER, f"{base}.index"),
-        os.path.join(RAG_FOLDER, f"{base}_docs.json"),
-        os.path.join(RAG_FOLDER, f"{base}_ids.pkl")
-    ]
-    
-    for rag_file in rag_files:
-        if os.path.isfile(rag_file):
-            try:
-                os.remove(rag_file)
-                print(f"Deleted RAG file: {rag_file}")
-            except Exception as e:
-                print(f"Warning: Failed to delete RAG file {rag_file}: {str(e)}")
+    try:
+        for rag_file in rag_store.remove_shard(RAG_FOLDER, base):
+            print(f"Deleted RAG file: {rag_file}")
+    except Exception as e:
+        print(f"Warning: Failed to delete RAG files for {base}: {str(e)}")
+
+    # Remove the document's vectors from the resident corpus
+    rag_corpus.remove_document(base)
     
-    # 4. Delete database record
+    # 4. Delete database record (and keywords no other document uses)
     success, error = database.delete_pdf_document(document_id)
     if not success:
         return jsonify({'success': False, 'error': f'Failed to delete database record: {error}'}), 500
     
-    # 5. Update keyword database and re-encode all documents
-    # Rebuild keyword database (extract from remaining documents)
-    success, msg = database.rebuild_keywords_database()
-    if not success:
-        print(f"Warning: Failed to rebuild keywords database: {msg}")
-    
-    # Re-encode all documents
-    success, msg = database.update_all_documents_encoding()
-    if not success:
-        print(f"Warning: Failed to update document encodings: {msg}")
-    
     return jsonify({'success': True, 'message': 'PDF and related RAG files deleted successfully'})
 
 
@@ -1379,47 +1489,46 @@ def update_message_checklist_api(message_id):
 @app.route('/api/message/<int:message_id>/details', methods=['GET'])
 def get_message_details_api(message_id):
     """Get detailed information of a single message"""
-    conn = database.get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            "SELECT m.*, ch.user_id, ch.title as session_title, "
-            "ui.first_name, ui.last_name, ui.email "
-            "FROM messages m "
-            "JOIN chat_history ch ON m.session_id = ch.session_id "
-            "JOIN user_info ui ON ch.user_id = ui.user_id "
-            "WHERE m.message_id = %s",
-            (message_id,)
-        )
-        message = cursor.fetchone()
-        
-        if not message:
-            return jsonify({'success': False, 'error': 'Message not found'}), 404
-        
-        # Handle boolean conversion and JSON parsing
-        message['need_human'] = bool(message['need_human'])
-        if message['checklist']:
-            try:
-                message['checklist'] = json.loads(message['checklist'])
-            except json.JSONDecodeError:
-                message['checklist'] = None
-        
-        if message['reference']:
-            try:
-                message['reference'] = json.loads(message['reference'])
-            except json.JSONDecodeError:
-                pass  # Keep original string
-        
-        return jsonify({
-            'success': True,
-            'message': message
-        })
-        
-    except Exception as err:
-        return jsonify({'success': False, 'error': str(err)}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    with database.db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                "SELECT m.*, ch.user_id, ch.title as session_title, "
+                "ui.first_name, ui.last_name, ui.email "
+                "FROM messages m "
+                "JOIN chat_history ch ON m.session_id = ch.session_id "
+                "JOIN user_info ui ON ch.user_id = ui.user_id "
+                "WHERE m.message_id = %s",
+                (message_id,)
+            )
+            message = cursor.fetchone()
+
+            if not message:
+                return jsonify({'success': False, 'error': 'Message not found'}), 404
+
+            # Handle boolean conversion and JSON parsing
+            message['need_human'] = bool(message['need_human'])
+            if message['checklist']:
+                try:
+                    message['checklist'] = json.loads(message['checklist'])
+                except json.JSONDecodeError:
+                    message['checklist'] = None
+
+            if message['reference']:
+                try:
+                    message['reference'] = json.loads(message['reference'])
+                except json.JSONDecodeError:
+                    pass  # Keep original string
+
+            return jsonify({
+                'success': True,
+                'message': message
+            })
+
+        except Exception as err:
+            return jsonify({'success': False, 'error': str(err)}), 500
+        finally:
+            cursor.close()
 
 
 # ==================== Human Support Ticket System API ====================
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+
+"""
+Bulk PDF Ingestion Tool
+
+Seeds a deployment from a directory of PDFs and a metadata CSV instead of
+uploading them one at a time through /api/upload. Compared with N uploads,
+the whole batch shares the expensive steps:
+
+- PDFs are extracted and parsed in parallel across a process pool
+- Q&A pairs (or page-tagged text chunks, for PDFs without pairs) from all
+  documents are embedded together in large batches
+  (reusing the ingestion cache, so unchanged files and texts are free)
+- Document metadata and keyword links are inserted in one transaction
+- The corpus snapshot is rebuilt once, after the metadata is saved
+
+The CSV needs a header row with the columns filename, title, keywords and
+date (or document_date); keywords are comma-separated inside one quoted
+field, as in the upload form:
+
+    filename,title,keywords,date
+    Account_expiry.pdf,Account expiry,"account,expiry,password",2024-05-01
+
+Usage:
+    python bulk_ingest.py ../seed/pdfs ../seed/metadata.csv
+    python bulk_ingest.py ../seed/pdfs ../seed/metadata.csv --extractor pdfium --workers 4
+    python bulk_ingest.py ../seed/policies ../seed/metadata.csv --chunking chunks
+    python bulk_ingest.py ../seed/pdfs ../seed/metadata.csv --dry-run
+
+Files whose name already has a pdf_documents row are skipped (use
+--no-skip-existing to ingest them again). Running servers pick up the new
+corpus snapshot on their next query.
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+import chunker
+import database
+import embedding
+import ingest_cache
+import pdf_extract
+import qa_parser
+import rag_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Texts per shared embedding batch
+EMBED_BATCH_SIZE = 1024
+
+
+def read_metadata(csv_path, pdf_dir):
+    """
+    Read and validate the metadata CSV
+
+    Returns:
+        tuple: (rows, problems) - valid rows as dicts (filename, source path,
+               title, keywords, keyword_list, document_date) and messages for
+               the rows that were rejected
+    """
+    rows = []
+    problems = []
+    seen = set()
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        for line_no, record in enumerate(csv.DictReader(f), start=2):
+            record = {(k or "").strip().lower(): (v or "").strip() for k, v in record.items()}
+            name = record.get("filename", "")
+            title = record.get("title", "")
+            keyword_list = [k.strip() for k in record.get("keywords", "").split(",") if k.strip()]
+            path = os.path.join(pdf_dir, name)
+            filename = secure_filename(name)
+            if not name.lower().endswith(".pdf"):
+                problems.append(f"line {line_no}: '{name}' is not a PDF filename")
+            elif not os.path.isfile(path):
+                problems.append(f"line {line_no}: {path} not found")
+            elif not title:
+                problems.append(f"line {line_no}: title is required")
+            elif not keyword_list:
+                problems.append(f"line {line_no}: keywords are required")
+            elif filename in seen:
+                problems.append(f"line {line_no}: duplicate filename {filename}")
+            else:
+                seen.add(filename)
+                rows.append({
+                    "filename": filename,
+                    "source_path": path,
+                    "title": title,
+                    "keywords": ",".join(keyword_list),
+                    "keyword_list": keyword_list,
+                    "document_date": record.get("date") or record.get("document_date", ""),
+                })
+    return rows, problems
+
+
+def pdf_names(upload_dir):
+    """
+    Return the names (without extension) of the PDFs in the upload folder
+    """
+    return [os.path.splitext(f)[0] for f in os.listdir(upload_dir) if f.lower().endswith(".pdf")]
+
+
+def store_pdf(row, upload_dir):
+    """
+    Copy a PDF into the upload folder, hashing it on the way
+
+    Returns:
+        tuple: (sha256 hex digest, size in bytes)
+    """
+    dest = os.path.join(upload_dir, row["filename"])
+    if os.path.abspath(row["source_path"]) == os.path.abspath(dest):
+        with open(dest, "rb") as f:
+            return ingest_cache.hash_stream(f)
+    with open(row["source_path"], "rb") as f:
+        return ingest_cache.save_upload(f, dest)
+
+
+def parse_pdf(path, extractor, chunking):
+    """
+    Extract and parse one PDF into Q&A pairs or text chunks (runs in a pool worker)
+
+    Returns:
+        list: (question, answer) tuples
+    """
+    docs = []
+    if chunking != "chunks":
+        text = pdf_extract.extract_text(path, workers=1, backend=extractor)
+        docs = qa_parser.parse_qa_pairs(text)
+    if not docs and chunking != "qa":
+        docs = chunker.iter_chunks(pdf_extract.iter_pages(path, workers=1, backend=extractor, numbered=True))
+    return [(d["question"], d["answer"]) for d in docs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory of PDFs described by a metadata CSV")
+    parser.add_argument("pdf_dir", help="Directory holding the PDFs")
+    parser.add_argument("metadata", help="CSV with filename, title, keywords and date columns")
+    parser.add_argument("--upload-dir", default=os.path.join(BASE_DIR, "pdfs"))
+    parser.add_argument("--rag-dir", default=os.path.join(BASE_DIR, "rag"))
+    parser.add_argument("--extractor", default=pdf_extract.BACKEND, choices=list(pdf_extract.BACKENDS))
+    parser.add_argument("--chunking", default=chunker.MODE, choices=list(chunker.MODES),
+                        help="Q&A pairs, text chunks, or pairs with a chunk fallback (auto)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel PDF parsers")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Texts per embedding batch")
+    parser.add_argument("--uploader-id", default=None)
+    parser.add_argument("--no-skip-existing", dest="skip_existing", action="store_false",
+                        help="Ingest files that already have a pdf_documents row")
+    parser.add_argument("--dry-run", action="store_true", help="Only validate the CSV")
+    args = parser.parse_args()
+
+    rows, problems = read_metadata(args.metadata, args.pdf_dir)
+    for problem in problems:
+        print(f"  SKIP  {problem}")
+
+    # Files that already have a row; also needed to undo a failed save
+    existing = set()
+    if rows and (args.skip_existing or not args.dry_run):
+        documents, error = database.get_all_pdf_documents()
+        if error:
+            print(f"Failed to read existing documents: {error}")
+            return 1
+        existing = {doc["pdf_path"] for doc in documents}
+    if args.skip_existing:
+        for row in [r for r in rows if r["filename"] in existing]:
+            print(f"  SKIP  {row['filename']}: already ingested")
+        rows = [r for r in rows if r["filename"] not in existing]
+
+    print(f"{len(rows)} PDFs to ingest from {args.pdf_dir}")
+    if args.dry_run or not rows:
+        for row in rows:
+            print(f"  {row['filename']}: {row['title']} [{row['keywords']}]")
+        return 1 if problems else 0
+
+    started = time.perf_counter()
+    os.makedirs(args.upload_dir, exist_ok=True)
+    cache = ingest_cache.IngestCache(os.path.join(args.rag_dir, "cache"), embedding.MODEL_NAME)
+    variant = f"{args.extractor}-{chunker.cache_tag(args.chunking)}"
+
+    # 1. Copy and hash; files ingested before reuse their cached shard
+    for row in rows:
+        row["content_hash"], row["file_size"] = store_pdf(row, args.upload_dir)
+        batches = cache.get_document(row["content_hash"], variant, rag_store.STREAM_BATCH_SIZE)
+        row["cached"] = batches is not None
+        if row["cached"]:
+            row["pairs"] = []
+            row["vectors"] = []
+            for pairs, vectors in batches:
+                row["pairs"].extend((p["question"], p["answer"]) for p in pairs)
+                row["vectors"].extend(vectors)
+
+    # 2. Extract and parse the rest in parallel
+    to_parse = [row for row in rows if not row["cached"]]
+    print(f"Parsing {len(to_parse)} PDFs ({len(rows) - len(to_parse)} cached) with {args.extractor}...")
+    paths = [os.path.join(args.upload_dir, row["filename"]) for row in to_parse]
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for row, pairs in zip(to_parse, pool.map(parse_pdf, paths, [args.extractor] * len(paths), [args.chunking] * len(paths))):
+            row["pairs"] = pairs
+
+    # 3. Embed the entries of all documents in shared batches
+    texts = [f"{q} {a}" for row in to_parse for q, a in row["pairs"]]
+    print(f"Embedding {len(texts)} entries in batches of {args.batch_size}...")
+    encoder = embedding.get_encoder()
+    vectors = []
+    for start in range(0, len(texts), args.batch_size):
+        vectors.extend(cache.encode(texts[start:start + args.batch_size], encoder.encode))
+    pos = 0
+    for row in to_parse:
+        row["vectors"] = vectors[pos:pos + len(row["pairs"])]
+        pos += len(row["pairs"])
+
+    # 4. Write every shard
+    ingested = []
+    for row in rows:
+        if not row["pairs"]:
+            print(f"  SKIP  {row['filename']}: no Q&A pairs or text found")
+            continue
+        row["base"] = base = os.path.splitext(row["filename"])[0]
+        source = {
+            "title": row["title"],
+            "url": os.path.join(args.upload_dir, row["filename"]),
+            "last_edited": datetime.today().isoformat()
+        }
+        docs = [{"question": q, "answer": a, "source": source} for q, a in row["pairs"]]
+        shard_path = rag_store.write_shard(args.rag_dir, base, docs, row["vectors"])
+        if not row["cached"]:
+            cache.put_document(row["content_hash"], variant, shard_path)
+        ingested.append(row)
+        print(f"  OK    {row['filename']}: {len(docs)} entries")
+
+    if not ingested:
+        print("Nothing to ingest")
+        return 1
+
+    # 5. Insert the metadata and keyword links in one transaction. The corpus
+    #    must not serve documents without a row, so on failure the new shards
+    #    are removed and the snapshot is left as it was
+    count, error = database.save_pdf_documents_bulk([
+        (row["title"], row["keywords"], row["filename"], row["document_date"], args.uploader_id, row["file_size"])
+        for row in ingested
+    ])
+    if error:
+        print(f"Failed to save document metadata: {error}")
+        for row in ingested:
+            if row["filename"] not in existing:
+                rag_store.remove_shard(args.rag_dir, row["base"])
+        return 1
+
+    # 6. Rebuild the corpus snapshot once
+    print("Rebuilding the corpus snapshot...")
+    corpus = rag_store.CorpusManager(args.rag_dir, lambda: pdf_names(args.upload_dir)).reload()
+
+    print(f"Ingested {count} PDFs ({sum(len(r['pairs']) for r in ingested)} entries, "
+          f"corpus {len(corpus)} entries) in {time.perf_counter() - started:.1f}s")
+    stats = cache.stats()
+    print(f"Ingestion cache: {stats['document_hits']} cached files, {stats['embedding_hits']} cached embeddings")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -172,11 +172,13 @@ UNLOCK TABLES;
 DROP TABLE IF EXISTS `pdf_documents`;
 /*!40101 SET @saved_cs_client     = @@character_set_client */;
 /*!40101 SET character_set_client = utf8 */;
+-- Upgrading an existing database: delete duplicate rows for the same pdf_path
+-- (keeping the lowest id), then
+--   ALTER TABLE `pdf_documents` ADD UNIQUE KEY `pdf_path` (`pdf_path`);
 CREATE TABLE `pdf_documents` (
   `id` int NOT NULL AUTO_INCREMENT,
   `title` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
   `keywords` text COLLATE utf8mb4_unicode_ci NOT NULL,
-  `keywords_encoded` text COLLATE utf8mb4_unicode_ci NOT NULL,
   `pdf_path` varchar(500) COLLATE utf8mb4_unicode_ci NOT NULL,
   -- `year` varchar(4) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
   `document_date` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
@@ -184,6 +186,7 @@ CREATE TABLE `pdf_documents` (
   `file_size` bigint DEFAULT NULL,
   `uploader_id` varchar(64) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
   PRIMARY KEY (`id`),
+  UNIQUE KEY `pdf_path` (`pdf_path`),
   KEY `uploader_id` (`uploader_id`),
   CONSTRAINT `pdf_documents_ibfk_1` FOREIGN KEY (`uploader_id`) REFERENCES `user_info` (`user_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -213,6 +216,20 @@ INSERT INTO `all_keywords` (`keyword`) VALUES
 ('account'), ('group'), ('class'), ('expiring'), ('expiry'),
 ('world');
 
+-- Keyword ids of each document. all_keywords ids never change, so adding
+-- or deleting a document only writes that document's links.
+-- Upgrading an existing database: create this table, then
+--   ALTER TABLE `pdf_documents` DROP COLUMN `keywords_encoded`;
+-- existing documents are linked from their keywords on the next server start
+CREATE TABLE `pdf_document_keywords` (
+  `document_id` int NOT NULL,
+  `keyword_id` int NOT NULL,
+  PRIMARY KEY (`document_id`,`keyword_id`),
+  KEY `keyword_id` (`keyword_id`),
+  CONSTRAINT `pdf_document_keywords_ibfk_1` FOREIGN KEY (`document_id`) REFERENCES `pdf_documents` (`id`) ON DELETE CASCADE,
+  CONSTRAINT `pdf_document_keywords_ibfk_2` FOREIGN KEY (`keyword_id`) REFERENCES `all_keywords` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 --
 -- Table structure for table `tickets`
 --
@@ -249,6 +266,41 @@ LOCK TABLES `tickets` WRITE;
 /*!40000 ALTER TABLE `tickets` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `ingest_jobs`
+--
+
+DROP TABLE IF EXISTS `ingest_jobs`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8 */;
+CREATE TABLE `ingest_jobs` (
+  `job_id` varchar(64) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `pdf_path` varchar(500) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `title` varchar(255) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `keywords` text COLLATE utf8mb4_unicode_ci NOT NULL,
+  `document_date` varchar(255) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `file_size` bigint DEFAULT NULL,
+  `uploader_id` varchar(64) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `extractor` varchar(32) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT 'PDF text extractor backend, NULL for the default',
+  `content_hash` char(64) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT 'SHA-256 of the uploaded file',
+  `chunking` varchar(16) COLLATE utf8mb4_unicode_ci DEFAULT NULL COMMENT 'auto, qa or chunks; NULL for the default',
+  `status` enum('queued','running','succeeded','failed') COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'queued',
+  `stage` varchar(32) COLLATE utf8mb4_unicode_ci NOT NULL DEFAULT 'queued',
+  `progress` int NOT NULL DEFAULT '0',
+  `entries` int DEFAULT NULL,
+  `error` text COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `attempts` int NOT NULL DEFAULT '0',
+  `claimed_by` varchar(64) COLLATE utf8mb4_unicode_ci DEFAULT NULL,
+  `created_at` datetime DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` datetime DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `started_at` datetime DEFAULT NULL,
+  `finished_at` datetime DEFAULT NULL,
+  PRIMARY KEY (`job_id`),
+  KEY `status_created` (`status`, `created_at`),
+  KEY `claimed_by` (`claimed_by`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='Background PDF ingestion jobs';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 /*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;
 /*!40101 SET SQL_MODE=@OLD_SQL_MODE */;
 /*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;
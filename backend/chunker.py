@@ -0,0 +1,117 @@
+"""
+Sliding-Window Chunker Module for HDingo Backend
+
+Policy documents and other PDFs without question/answer structure yield no
+pairs from qa_parser, so they could not be uploaded. This module splits such
+documents into overlapping fixed-size word windows that are indexed like Q&A
+entries: the "question" is a page label such as "[Pages 3-4]" and the
+"answer" is the chunk text, so retrieval can cite the page it came from.
+
+Chunking mode (RAG_CHUNKING, or per upload):
+- auto: Q&A pairs, falling back to chunks when a PDF has none (default)
+- qa: Q&A pairs only; PDFs without pairs are rejected
+- chunks: always chunk
+
+Key Features:
+- Token-bounded windows with configurable size and overlap, streamed from
+  pages with memory bounded by the window size
+- Window size capped at MAX_CHUNK_TOKENS so every chunk fits the embedding
+  model's input, making embedding cost per chunk predictable
+- Page numbers kept with every chunk for citations
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import collections
+import os
+import re
+import uuid
+
+MODES = ("auto", "qa", "chunks")
+MODE = os.environ.get("RAG_CHUNKING", "auto")
+# Tokens are whitespace-separated words; all-MiniLM-L6-v2 reads at most 256
+# word pieces, roughly 190 English words, so longer chunks would be truncated
+MAX_CHUNK_TOKENS = 190
+CHUNK_TOKENS = min(int(os.environ.get("RAG_CHUNK_TOKENS", "160")), MAX_CHUNK_TOKENS)
+CHUNK_OVERLAP = int(os.environ.get("RAG_CHUNK_OVERLAP", "32"))
+
+_PAGE_LABEL_RE = re.compile(r"^\[Pages? (\d+)(?:-(\d+))?\]$")
+
+
+def resolve_mode(mode=None):
+    """
+    Return the chunking mode to use, defaulting to RAG_CHUNKING
+
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    mode = mode or MODE
+    if mode not in MODES:
+        raise ValueError(f"Unknown chunking mode '{mode}', expected one of: {', '.join(MODES)}")
+    return mode
+
+
+def cache_tag(mode, size=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """
+    Return a short tag identifying the entries a mode produces, for cache keys
+    """
+    return "qa" if mode == "qa" else f"{mode}{size}o{overlap}"
+
+
+def page_label(first, last):
+    """
+    Return the question label of a chunk spanning pages first..last
+    """
+    return f"[Page {first}]" if first == last else f"[Pages {first}-{last}]"
+
+
+def parse_page_label(question):
+    """
+    Return (first, last) pages if question is a chunk label, else None
+    """
+    m = _PAGE_LABEL_RE.match(question)
+    if not m:
+        return None
+    first = int(m.group(1))
+    return first, int(m.group(2) or first)
+
+
+def iter_chunks(pages, size=CHUNK_TOKENS, overlap=CHUNK_OVERLAP):
+    """
+    Split numbered page texts into overlapping word windows
+
+    Args:
+        pages (iterable): (page number, text) pairs in page order
+        size (int): Words per chunk (capped at MAX_CHUNK_TOKENS)
+        overlap (int): Words shared by consecutive chunks (at most half a chunk)
+
+    Yields:
+        dict: Entries with 'id', 'question' (page label), 'answer' (chunk text)
+              and 'pages' (first, last)
+    """
+    size = max(1, min(size, MAX_CHUNK_TOKENS))
+    overlap = max(0, min(overlap, size // 2))
+    window = collections.deque()  # (word, page number)
+    fresh = 0  # words in the window not yet emitted
+
+    def make_chunk():
+        first, last = window[0][1], window[-1][1]
+        return {
+            'id': f"chunk_{uuid.uuid4().hex[:8]}",
+            'question': page_label(first, last),
+            'answer': ' '.join(word for word, _ in window),
+            'pages': (first, last)
+        }
+
+    for page_num, text in pages:
+        for word in text.split():
+            window.append((word, page_num))
+            fresh += 1
+            if len(window) == size:
+                yield make_chunk()
+                for _ in range(size - overlap):
+                    window.popleft()
+                fresh = 0
+    if fresh:
+        yield make_chunk()
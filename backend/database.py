@@ -5,17 +5,21 @@ This module provides comprehensive database operations for a chat system with th
 - User management and authentication
 - Chat session management
 - Message storage and retrieval
-- PDF document management with keyword encoding
+- PDF document management with stable keyword ids
 - Human intervention ticket system
 - User activity logging and statistics
+- Persistent PDF ingestion job queue
+- Pooled connections (see db_pool), always returned by a context manager
 
 Database Schema:
 - user_info: User account information and permissions
 - chat_history: Chat session metadata
 - messages: Individual chat messages with metadata
-- pdf_documents: PDF document storage with keyword encoding
-- all_keywords: Keyword vocabulary for document search
+- pdf_documents: PDF document storage
+- all_keywords: Keyword vocabulary for document search (stable ids)
+- pdf_document_keywords: Keyword ids of each document
 - tickets: Human intervention request tickets
+- ingest_jobs: Background PDF ingestion jobs and their progress
 - user_login_logs: User login activity tracking
 
 Author: Capstone Project Team
@@ -23,11 +27,14 @@ Version: 1.0
 Date: 2024
 """
 
+import contextlib
 import mysql.connector
 import uuid
 from datetime import datetime, timedelta
 import json
 
+import db_pool
+
 # Database configuration
 # Note: Update these values according to your local database setup
 db_config = {
@@ -46,6 +53,46 @@ def get_db_connection():
     """
     return mysql.connector.connect(**db_config)
 
+# Shared by every request thread and ingest worker in this process
+pool = db_pool.ConnectionPool(get_db_connection)
+
+@contextlib.contextmanager
+def db_connection():
+    """
+    Borrow a pooled database connection for a with block
+    
+    The connection goes back to the pool when the block exits, whether it
+    returned or raised; uncommitted changes are rolled back.
+    
+    Yields:
+        mysql.connector.connection: Database connection object
+    """
+    with pool.connection() as conn:
+        yield conn
+
+def keywords_changed():
+    """
+    Invalidate the in-process keyword vocabulary after all_keywords changed
+    """
+    from search import keyword_vocabulary
+    keyword_vocabulary.invalidate()
+
+def documents_changed(added=None, removed=None):
+    """
+    Update the in-process search index after pdf_documents changed
+    
+    Args:
+        added (list): New document rows (as from get_pdf_documents_for_search)
+        removed (list): Ids of deleted documents
+        
+    Without either, the index is invalidated and rebuilt on next use.
+    """
+    from search import document_index
+    if added is None and removed is None:
+        document_index.invalidate()
+    else:
+        document_index.update(added or (), removed or ())
+
 def get_user(username):
     """
     Retrieve user information by username
@@ -56,15 +103,14 @@ def get_user(username):
     Returns:
         dict: User information dictionary or None if not found
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM user_info WHERE user_id=%s", (username,))
-        user = cursor.fetchone()
-        return user
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM user_info WHERE user_id=%s", (username,))
+            user = cursor.fetchone()
+            return user
+        finally:
+            cursor.close()
 
 def start_session_db(user_id, title="Untitled Session"):
     """
@@ -78,20 +124,19 @@ def start_session_db(user_id, title="Untitled Session"):
         tuple: (session_id, error) - session ID on success, error message on failure
     """
     session_id = str(uuid.uuid4())
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO chat_history (user_id, session_id, title) VALUES (%s, %s, %s)",
-            (user_id, session_id, title)
-        )
-        conn.commit()
-        return session_id, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO chat_history (user_id, session_id, title) VALUES (%s, %s, %s)",
+                (user_id, session_id, title)
+            )
+            conn.commit()
+            return session_id, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 def add_message_db(session_id, role, content, reference=None, checklist=None, mode='general', need_human=False):
     """
@@ -109,21 +154,20 @@ def add_message_db(session_id, role, content, reference=None, checklist=None, mo
     Returns:
         tuple: (success, message_id, error) - success status, message ID, error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO messages (session_id, role, content, reference, checklist, mode, need_human) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-            (session_id, role, content, reference, checklist, mode, 1 if need_human else 0)
-        )
-        message_id = cursor.lastrowid
-        conn.commit()
-        return True, message_id, None
-    except mysql.connector.Error as err:
-        return False, None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO messages (session_id, role, content, reference, checklist, mode, need_human) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                (session_id, role, content, reference, checklist, mode, 1 if need_human else 0)
+            )
+            message_id = cursor.lastrowid
+            conn.commit()
+            return True, message_id, None
+        except mysql.connector.Error as err:
+            return False, None, str(err)
+        finally:
+            cursor.close()
 
 def get_messages_db(session_id):
     """
@@ -135,23 +179,22 @@ def get_messages_db(session_id):
     Returns:
         tuple: (messages_list, error) - list of messages or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            "SELECT message_id, role, content, timestamp, reference, checklist, mode, need_human FROM messages WHERE session_id = %s ORDER BY timestamp ASC",
-            (session_id,)
-        )
-        messages = cursor.fetchall()
-        # Convert boolean values
-        for message in messages:
-            message['need_human'] = bool(message['need_human'])
-        return messages, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                "SELECT message_id, role, content, timestamp, reference, checklist, mode, need_human FROM messages WHERE session_id = %s ORDER BY timestamp ASC",
+                (session_id,)
+            )
+            messages = cursor.fetchall()
+            # Convert boolean values
+            for message in messages:
+                message['need_human'] = bool(message['need_human'])
+            return messages, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 def session_exists(session_id):
     """
@@ -163,14 +206,13 @@ def session_exists(session_id):
     Returns:
         bool: True if session exists, False otherwise
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT 1 FROM chat_history WHERE session_id = %s", (session_id,))
-        return cursor.fetchone() is not None
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1 FROM chat_history WHERE session_id = %s", (session_id,))
+            return cursor.fetchone() is not None
+        finally:
+            cursor.close()
 
 def check_or_create_session(session_id, user_id, title="New Chat"):
     """
@@ -187,22 +229,21 @@ def check_or_create_session(session_id, user_id, title="New Chat"):
     if session_exists(session_id):
         return True, None
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        # chat_history user_id is constrained by foreign key user_info(user_id)
-        # so we need to ensure user_id is valid
-        cursor.execute(
-            "INSERT INTO chat_history (user_id, session_id, title) VALUES (%s, %s, %s)",
-            (user_id, session_id, title)
-        )
-        conn.commit()
-        return True, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # chat_history user_id is constrained by foreign key user_info(user_id)
+            # so we need to ensure user_id is valid
+            cursor.execute(
+                "INSERT INTO chat_history (user_id, session_id, title) VALUES (%s, %s, %s)",
+                (user_id, session_id, title)
+            )
+            conn.commit()
+            return True, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
 
 def get_sessions_db(user_id):
     """
@@ -214,20 +255,19 @@ def get_sessions_db(user_id):
     Returns:
         tuple: (sessions_list, error) - list of sessions or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            "SELECT session_id, title, created_at FROM chat_history WHERE user_id = %s ORDER BY created_at DESC",
-            (user_id,)
-        )
-        sessions = cursor.fetchall()
-        return sessions, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                "SELECT session_id, title, created_at FROM chat_history WHERE user_id = %s ORDER BY created_at DESC",
+                (user_id,)
+            )
+            sessions = cursor.fetchall()
+            return sessions, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 def update_session_title(session_id, new_title):
     """
@@ -240,20 +280,19 @@ def update_session_title(session_id, new_title):
     Returns:
         tuple: (success, error) - success status and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE chat_history SET title = %s WHERE session_id = %s",
-            (new_title, session_id)
-        )
-        conn.commit()
-        return True, None
-    except Exception as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE chat_history SET title = %s WHERE session_id = %s",
+                (new_title, session_id)
+            )
+            conn.commit()
+            return True, None
+        except Exception as err:
+            return False, str(err)
+        finally:
+            cursor.close()
 
 def delete_session(session_id):
     """
@@ -265,22 +304,21 @@ def delete_session(session_id):
     Returns:
         tuple: (success, error) - success status and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        # First delete all tickets for this session
-        cursor.execute("DELETE FROM tickets WHERE session_id = %s", (session_id,))
-        # Then delete all messages for this session
-        cursor.execute("DELETE FROM messages WHERE session_id = %s", (session_id,))
-        # Finally delete the session from chat_history
-        cursor.execute("DELETE FROM chat_history WHERE session_id = %s", (session_id,))
-        conn.commit()
-        return True, None
-    except Exception as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # First delete all tickets for this session
+            cursor.execute("DELETE FROM tickets WHERE session_id = %s", (session_id,))
+            # Then delete all messages for this session
+            cursor.execute("DELETE FROM messages WHERE session_id = %s", (session_id,))
+            # Finally delete the session from chat_history
+            cursor.execute("DELETE FROM chat_history WHERE session_id = %s", (session_id,))
+            conn.commit()
+            return True, None
+        except Exception as err:
+            return False, str(err)
+        finally:
+            cursor.close()
 
 def get_all_admins():
     """
@@ -289,17 +327,16 @@ def get_all_admins():
     Returns:
         tuple: (admins_list, error) - list of admin users or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT email, first_name, last_name FROM user_info WHERE is_admin = 1")
-        admins = cursor.fetchall()
-        return admins, None
-    except Exception as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT email, first_name, last_name FROM user_info WHERE is_admin = 1")
+            admins = cursor.fetchall()
+            return admins, None
+        except Exception as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def record_user_login(user_id, ip_address=None, user_agent=None):
@@ -314,20 +351,19 @@ def record_user_login(user_id, ip_address=None, user_agent=None):
     Returns:
         tuple: (success, error) - success status and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO user_login_logs (user_id, ip_address, user_agent) VALUES (%s, %s, %s)",
-            (user_id, ip_address, user_agent)
-        )
-        conn.commit()
-        return True, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO user_login_logs (user_id, ip_address, user_agent) VALUES (%s, %s, %s)",
+                (user_id, ip_address, user_agent)
+            )
+            conn.commit()
+            return True, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
 
 
 def get_daily_login_stats(days=7):
@@ -340,83 +376,236 @@ def get_daily_login_stats(days=7):
     Returns:
         tuple: (stats_list, error) - list of daily stats or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        # Get daily login counts for the last N days, excluding admin users
-        cursor.execute("""
-            SELECT 
-                DATE(ull.login_time) as date, 
-                COUNT(*) as login_count
-            FROM user_login_logs ull
-            JOIN user_info ui ON ull.user_id = ui.user_id
-            WHERE ull.login_time >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-            AND ui.is_admin = 0
-            GROUP BY DATE(ull.login_time)
-            ORDER BY date
-        """, (days - 1,))
-        
-        results = cursor.fetchall()
-        
-        # Ensure complete N days of data, return 0 for dates with no records
-        stats = []
-        for i in range(days):
-            date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-            found = False
-            for result in results:
-                if result['date'].strftime('%Y-%m-%d') == date:
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # Get daily login counts for the last N days, excluding admin users
+            cursor.execute("""
+                SELECT 
+                    DATE(ull.login_time) as date, 
+                    COUNT(*) as login_count
+                FROM user_login_logs ull
+                JOIN user_info ui ON ull.user_id = ui.user_id
+                WHERE ull.login_time >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
+                AND ui.is_admin = 0
+                GROUP BY DATE(ull.login_time)
+                ORDER BY date
+            """, (days - 1,))
+
+            results = cursor.fetchall()
+
+            # Ensure complete N days of data, return 0 for dates with no records
+            stats = []
+            for i in range(days):
+                date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
+                found = False
+                for result in results:
+                    if result['date'].strftime('%Y-%m-%d') == date:
+                        stats.append({
+                            'date': date,
+                            'active_users': result['login_count']
+                        })
+                        found = True
+                        break
+                if not found:
                     stats.append({
                         'date': date,
-                        'active_users': result['login_count']
+                        'active_users': 0
                     })
-                    found = True
-                    break
-            if not found:
-                stats.append({
-                    'date': date,
-                    'active_users': 0
-                })
-        
-        # Sort by date in ascending order
-        stats.reverse()
-        return stats, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
 
+            # Sort by date in ascending order
+            stats.reverse()
+            return stats, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
+
+
+def split_keywords(keywords):
+    """
+    Split a comma-separated keywords string into a list of keywords
+    """
+    return [k.strip() for k in (keywords or '').split(',') if k.strip()]
 
-def save_pdf_document(title, keywords, keywords_encoded, pdf_path, document_date, uploader_id, file_size):
+def _link_document_keywords(cursor, document_id, keyword_list):
     """
-    Save PDF document metadata to database
+    Add missing keywords to all_keywords and link them to a document
+    
+    Runs inside the caller's transaction; only the document's own links and
+    new keyword rows are written.
+    
+    Returns:
+        tuple: (added_count, keyword_ids) - number of keywords added to
+               all_keywords and the document's keyword ids
+    """
+    if not keyword_list:
+        return 0, []
+    cursor.executemany("INSERT IGNORE INTO all_keywords (keyword) VALUES (%s)", [(k,) for k in keyword_list])
+    added_count = cursor.rowcount
+    placeholders = ", ".join(["%s"] * len(keyword_list))
+    cursor.execute(
+        "INSERT IGNORE INTO pdf_document_keywords (document_id, keyword_id) "
+        f"SELECT %s, id FROM all_keywords WHERE keyword IN ({placeholders})",
+        (document_id, *keyword_list)
+    )
+    cursor.execute("SELECT keyword_id FROM pdf_document_keywords WHERE document_id = %s", (document_id,))
+    return max(added_count, 0), [row[0] for row in cursor.fetchall()]
+
+
+def _prune_keywords(cursor, keyword_ids):
+    """
+    Drop keywords (among keyword_ids) that no document links to any more
+    
+    Returns:
+        int: Number of keywords removed from all_keywords
+    """
+    if not keyword_ids:
+        return 0
+    placeholders = ", ".join(["%s"] * len(keyword_ids))
+    cursor.execute(
+        f"DELETE FROM all_keywords WHERE id IN ({placeholders}) AND NOT EXISTS "
+        "(SELECT 1 FROM pdf_document_keywords dk WHERE dk.keyword_id = all_keywords.id)",
+        keyword_ids
+    )
+    return max(cursor.rowcount, 0)
+
+def _upsert_pdf_document(cursor, title, keywords, pdf_path, document_date, uploader_id, file_size):
+    """
+    Insert a document row, or update the row already saved for the same file
+    
+    Re-uploading a file, or re-running an ingestion job whose worker stopped
+    after saving, must not add a second row for one pdf_path. Runs inside the
+    caller's transaction. The new keywords are linked before the old ones are
+    pruned, so a keyword the document keeps keeps its id.
+    
+    Returns:
+        tuple: (document_id, keywords_changed, keyword_ids)
+    """
+    cursor.execute("SELECT id FROM pdf_documents WHERE pdf_path = %s ORDER BY id LIMIT 1 FOR UPDATE", (pdf_path,))
+    row = cursor.fetchone()
+    old_keyword_ids = []
+    if row is None:
+        cursor.execute(
+            "INSERT INTO pdf_documents (title, keywords, pdf_path, document_date, uploader_id, file_size) VALUES (%s, %s, %s, %s, %s, %s)",
+            (title, keywords, pdf_path, document_date, uploader_id, file_size)
+        )
+        document_id = cursor.lastrowid
+    else:
+        document_id = row[0]
+        cursor.execute(
+            "UPDATE pdf_documents SET title = %s, keywords = %s, document_date = %s, uploader_id = %s, "
+            "file_size = %s, upload_time = CURRENT_TIMESTAMP WHERE id = %s",
+            (title, keywords, document_date, uploader_id, file_size, document_id)
+        )
+        cursor.execute("SELECT keyword_id FROM pdf_document_keywords WHERE document_id = %s", (document_id,))
+        old_keyword_ids = [r[0] for r in cursor.fetchall()]
+        cursor.execute("DELETE FROM pdf_document_keywords WHERE document_id = %s", (document_id,))
+    added_count, keyword_ids = _link_document_keywords(cursor, document_id, split_keywords(keywords))
+    removed_count = _prune_keywords(cursor, old_keyword_ids)
+    return document_id, bool(added_count or removed_count), keyword_ids
+
+
+def save_pdf_document(title, keywords, pdf_path, document_date, uploader_id, file_size):
+    """
+    Save PDF document metadata to database and link its keywords
+    
+    Saving a file that already has a row updates that row (see
+    _upsert_pdf_document), so the call is safe to repeat. Keywords not yet in
+    all_keywords are added with new ids; existing keyword ids and other
+    documents are left untouched.
     
     Args:
         title (str): Document title
         keywords (str): Comma-separated keywords
-        keywords_encoded (str): JSON string of encoded keywords
         pdf_path (str): File path to the PDF
         document_date (str): Document date
         uploader_id (str): ID of the user who uploaded the document
         file_size (int): File size in bytes
         
     Returns:
-        tuple: (success, error) - success status and error message if any
+        tuple: (document_id, error) - id of the saved row and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO pdf_documents (title, keywords, keywords_encoded, pdf_path, document_date, uploader_id, file_size) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-            (title, keywords, keywords_encoded, pdf_path, document_date, uploader_id, file_size)
-        )
-        conn.commit()
-        return True, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            document_id, changed, keyword_ids = _upsert_pdf_document(
+                cursor, title, keywords, pdf_path, document_date, uploader_id, file_size
+            )
+            conn.commit()
+            if changed:
+                keywords_changed()
+            documents_changed(added=[{
+                'id': document_id, 'title': title, 'keywords': keywords, 'pdf_path': pdf_path,
+                'document_date': document_date, 'keyword_ids': keyword_ids
+            }])
+            return document_id, None
+        except mysql.connector.Error as err:
+            conn.rollback()
+            return None, str(err)
+        finally:
+            cursor.close()
+
+
+def save_pdf_documents_bulk(documents):
+    """
+    Save the metadata of many PDF documents in one transaction
+    
+    Args:
+        documents (list): Tuples of (title, keywords, pdf_path, document_date,
+                          uploader_id, file_size), as for save_pdf_document
+        
+    Returns:
+        tuple: (count, error) - number of saved rows, error message if any
+    """
+    if not documents:
+        return 0, None
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            any_changed = False
+            added = []
+            for title, keywords, pdf_path, document_date, uploader_id, file_size in documents:
+                document_id, changed, keyword_ids = _upsert_pdf_document(
+                    cursor, title, keywords, pdf_path, document_date, uploader_id, file_size
+                )
+                any_changed = any_changed or changed
+                added.append({
+                    'id': document_id, 'title': title, 'keywords': keywords, 'pdf_path': pdf_path,
+                    'document_date': document_date, 'keyword_ids': keyword_ids
+                })
+            conn.commit()
+            if any_changed:
+                keywords_changed()
+            documents_changed(added=added)
+            return len(documents), None
+        except mysql.connector.Error as err:
+            conn.rollback()
+            return 0, str(err)
+        finally:
+            cursor.close()
+
+
+def get_pdf_document_id(pdf_path):
+    """
+    Look up the id of the document saved for a PDF file
+    
+    Args:
+        pdf_path (str): File path to the PDF, as passed to save_pdf_document
+        
+    Returns:
+        tuple: (document_id, error) - id or None if the file has no row, error message if any
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id FROM pdf_documents WHERE pdf_path = %s ORDER BY id LIMIT 1", (pdf_path,))
+            row = cursor.fetchone()
+            return (row[0] if row else None), None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def get_all_pdf_documents():
@@ -426,106 +615,114 @@ def get_all_pdf_documents():
     Returns:
         tuple: (documents_list, error) - list of documents or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT * FROM pdf_documents ORDER BY upload_time DESC")
-        documents = cursor.fetchall()
-        return documents, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM pdf_documents ORDER BY upload_time DESC")
+            documents = cursor.fetchall()
+            return documents, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def get_pdf_documents_for_search():
     """
-    Get PDF documents for search operations (includes encoded data)
+    Get PDF documents for search operations with their keyword ids
     
     Returns:
-        tuple: (documents_list, error) - list of documents or error message
+        tuple: (documents_list, error) - list of documents (each with a
+               'keyword_ids' list) or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute("SELECT id, title, keywords, keywords_encoded, pdf_path, document_date FROM pdf_documents")
-        documents = cursor.fetchall()
-        return documents, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT id, title, keywords, pdf_path, document_date FROM pdf_documents ORDER BY id")
+            documents = cursor.fetchall()
+            by_id = {}
+            for doc in documents:
+                doc['keyword_ids'] = []
+                by_id[doc['id']] = doc
+            cursor.execute("SELECT document_id, keyword_id FROM pdf_document_keywords ORDER BY document_id, keyword_id")
+            for row in cursor.fetchall():
+                doc = by_id.get(row['document_id'])
+                if doc is not None:
+                    doc['keyword_ids'].append(row['keyword_id'])
+            return documents, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def delete_pdf_document(document_id):
     """
     Delete a PDF document record from database
     
+    The document's keyword links are removed with it, and keywords no other
+    document uses are dropped from all_keywords. Other documents' rows and
+    keyword ids are never rewritten.
+    
     Args:
         document_id (int): ID of the document to delete
         
     Returns:
         tuple: (success, error) - success status and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM pdf_documents WHERE id = %s", (document_id,))
-        conn.commit()
-        return True, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
-
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT keyword_id FROM pdf_document_keywords WHERE document_id = %s", (document_id,))
+            keyword_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DELETE FROM pdf_document_keywords WHERE document_id = %s", (document_id,))
+            cursor.execute("DELETE FROM pdf_documents WHERE id = %s", (document_id,))
+            removed_count = _prune_keywords(cursor, keyword_ids)
+            conn.commit()
+            if removed_count:
+                keywords_changed()
+            documents_changed(removed=[document_id])
+            return True, None
+        except mysql.connector.Error as err:
+            conn.rollback()
+            return False, str(err)
+        finally:
+            cursor.close()
 
-def update_keywords_encoded(document_id, keywords_encoded):
+def get_all_keywords_from_db():
     """
-    Update the keyword encoding for a document
+    Get all keywords from the database
     
-    Args:
-        document_id (int): ID of the document to update
-        keywords_encoded (str): New encoded keywords JSON string
-        
     Returns:
-        tuple: (success, error) - success status and error message if any
+        tuple: (keywords_list, error) - list of keywords or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE pdf_documents SET keywords_encoded = %s WHERE id = %s",
-            (keywords_encoded, document_id)
-        )
-        conn.commit()
-        return True, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT keyword FROM all_keywords ORDER BY keyword")
+            keywords = [row[0] for row in cursor.fetchall()]
+            return keywords, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
-def get_all_keywords_from_db():
+def get_keyword_ids_from_db():
     """
-    Get all keywords from the database
+    Get all keywords with their stable ids
     
     Returns:
-        tuple: (keywords_list, error) - list of keywords or error message
+        tuple: (entries, error) - list of (keyword, id) ordered by keyword, or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT keyword FROM all_keywords ORDER BY keyword")
-        keywords = [row[0] for row in cursor.fetchall()]
-        return keywords, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT keyword, id FROM all_keywords ORDER BY keyword")
+            return [(row[0], row[1]) for row in cursor.fetchall()], None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 def add_keywords_to_db(keywords_list):
     """
@@ -537,112 +734,91 @@ def add_keywords_to_db(keywords_list):
     Returns:
         tuple: (success, message) - success status and result message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        added_count = 0
-        for keyword in keywords_list:
-            try:
-                cursor.execute("INSERT INTO all_keywords (keyword) VALUES (%s)", (keyword,))
-                added_count += 1
-            except mysql.connector.IntegrityError:
-                # Keyword already exists, ignore
-                pass
-        conn.commit()
-        return True, f"Added {added_count} new keywords"
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
-
-def update_all_documents_encoding():
-    """
-    Update keyword encoding for all documents
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            added_count = 0
+            for keyword in keywords_list:
+                try:
+                    cursor.execute("INSERT INTO all_keywords (keyword) VALUES (%s)", (keyword,))
+                    added_count += 1
+                except mysql.connector.IntegrityError:
+                    # Keyword already exists, ignore
+                    pass
+            conn.commit()
+            if added_count:
+                keywords_changed()
+            return True, f"Added {added_count} new keywords"
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
+
+def backfill_document_keywords():
+    """
+    Link documents that have no keyword links yet to their keywords
+    
+    Documents saved before keyword ids were stored per document only have
+    the keywords text; this links them once. Already linked documents are
+    not touched, so it is cheap to run on every start. It runs when app.py
+    is imported, so an unreachable database is reported, not raised.
     
     Returns:
         tuple: (success, message) - success status and result message
     """
-    from search import multi_hot_encode
-    import json
-    
-    # Get all keywords
-    all_keywords, error = get_all_keywords_from_db()
-    if error:
-        return False, f"Failed to get keywords: {error}"
-    
-    # Get all documents
-    documents, error = get_all_pdf_documents()
-    if error:
-        return False, f"Failed to get documents: {error}"
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
-        updated_count = 0
-        for doc in documents:
-            keywords = doc['keywords']
-            if not keywords:
-                continue
-                
-            # Re-encode keywords
-            keyword_list = [k.strip() for k in keywords.split(',') if k.strip()]
-            keywords_encoded = multi_hot_encode(keyword_list)
-            keywords_encoded_json = json.dumps(keywords_encoded)
-            
-            # Update database
-            cursor.execute(
-                "UPDATE pdf_documents SET keywords_encoded = %s WHERE id = %s",
-                (keywords_encoded_json, doc['id'])
-            )
-            updated_count += 1
-        
-        conn.commit()
-        return True, f"Updated {updated_count} documents"
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "SELECT d.id, d.keywords FROM pdf_documents d WHERE NOT EXISTS "
+                    "(SELECT 1 FROM pdf_document_keywords dk WHERE dk.document_id = d.id)"
+                )
+                unlinked = cursor.fetchall()
+                added_count = 0
+                for document_id, keywords in unlinked:
+                    added_count += _link_document_keywords(cursor, document_id, split_keywords(keywords))[0]
+                conn.commit()
+                if added_count:
+                    keywords_changed()
+                if unlinked:
+                    documents_changed()
+                return True, f"Linked keywords of {len(unlinked)} documents"
+            except mysql.connector.Error as err:
+                conn.rollback()
+                return False, str(err)
+            finally:
+                cursor.close()
     except mysql.connector.Error as err:
         return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
 
 def rebuild_keywords_database():
     """
-    Rebuild the keywords database from remaining documents
+    Remove keywords that no document uses any more
+    
+    Keyword ids are stable: remaining keywords keep their ids, so no
+    document needs to be re-encoded.
     
     Returns:
         tuple: (success, message) - success status and result message
     """
-    # Get keywords from all documents
-    documents, error = get_all_pdf_documents()
-    if error:
-        return False, f"Failed to get documents: {error}"
-    
-    # Collect all keywords
-    all_keywords = set()
-    for doc in documents:
-        keywords = doc.get('keywords', '')
-        if keywords:
-            keyword_list = [k.strip() for k in keywords.split(',') if k.strip()]
-            all_keywords.update(keyword_list)
-    
-    # Clear existing keywords table
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("DELETE FROM all_keywords")
-        
-        # Insert new keywords
-        for keyword in sorted(all_keywords):
-            cursor.execute("INSERT INTO all_keywords (keyword) VALUES (%s)", (keyword,))
-        
-        conn.commit()
-        return True, f"Rebuilt keywords database with {len(all_keywords)} keywords"
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "DELETE FROM all_keywords WHERE NOT EXISTS "
+                "(SELECT 1 FROM pdf_document_keywords dk WHERE dk.keyword_id = all_keywords.id)"
+            )
+            removed_count = cursor.rowcount
+            conn.commit()
+            if removed_count:
+                keywords_changed()
+            return True, f"Removed {removed_count} unused keywords"
+        except mysql.connector.Error as err:
+            conn.rollback()
+            return False, str(err)
+        finally:
+            cursor.close()
 
 
 # ==================== Message Management Functions ====================
@@ -658,20 +834,19 @@ def update_message_reference(message_id, reference):
     Returns:
         tuple: (success, error) - success status and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE messages SET reference = %s WHERE message_id = %s",
-            (reference, message_id)
-        )
-        conn.commit()
-        return cursor.rowcount > 0, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE messages SET reference = %s WHERE message_id = %s",
+                (reference, message_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
 
 
 def update_message_checklist(message_id, checklist):
@@ -685,20 +860,19 @@ def update_message_checklist(message_id, checklist):
     Returns:
         tuple: (success, error) - success status and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE messages SET checklist = %s WHERE message_id = %s",
-            (checklist, message_id)
-        )
-        conn.commit()
-        return cursor.rowcount > 0, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE messages SET checklist = %s WHERE message_id = %s",
+                (checklist, message_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
 
 
 def update_checklist_item_status(message_id, item_index, checked):
@@ -713,48 +887,47 @@ def update_checklist_item_status(message_id, item_index, checked):
     Returns:
         tuple: (success, error) - success status and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        # Get current checklist
-        cursor.execute(
-            "SELECT checklist FROM messages WHERE message_id = %s",
-            (message_id,)
-        )
-        result = cursor.fetchone()
-        if not result:
-            return False, "Message not found"
-        
-        checklist_str = result[0]
-        if not checklist_str:
-            return False, "No checklist found"
-        
-        # Parse checklist JSON
+    with db_connection() as conn:
+        cursor = conn.cursor()
         try:
-            checklist = json.loads(checklist_str)
-        except json.JSONDecodeError:
-            return False, "Invalid checklist format"
-        
-        # Check if index is valid
-        if item_index < 0 or item_index >= len(checklist):
-            return False, "Invalid item index"
-        
-        # Update the status of the specified item
-        checklist[item_index]['done'] = checked
-        
-        # Save the updated checklist back to database
-        updated_checklist_str = json.dumps(checklist)
-        cursor.execute(
-            "UPDATE messages SET checklist = %s WHERE message_id = %s",
-            (updated_checklist_str, message_id)
-        )
-        conn.commit()
-        return True, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+            # Get current checklist
+            cursor.execute(
+                "SELECT checklist FROM messages WHERE message_id = %s",
+                (message_id,)
+            )
+            result = cursor.fetchone()
+            if not result:
+                return False, "Message not found"
+
+            checklist_str = result[0]
+            if not checklist_str:
+                return False, "No checklist found"
+
+            # Parse checklist JSON
+            try:
+                checklist = json.loads(checklist_str)
+            except json.JSONDecodeError:
+                return False, "Invalid checklist format"
+
+            # Check if index is valid
+            if item_index < 0 or item_index >= len(checklist):
+                return False, "Invalid item index"
+
+            # Update the status of the specified item
+            checklist[item_index]['done'] = checked
+
+            # Save the updated checklist back to database
+            updated_checklist_str = json.dumps(checklist)
+            cursor.execute(
+                "UPDATE messages SET checklist = %s WHERE message_id = %s",
+                (updated_checklist_str, message_id)
+            )
+            conn.commit()
+            return True, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
 
 
 def mark_message_need_human(message_id, need_human=True):
@@ -768,20 +941,19 @@ def mark_message_need_human(message_id, need_human=True):
     Returns:
         tuple: (success, error) - success status and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE messages SET need_human = %s WHERE message_id = %s",
-            (1 if need_human else 0, message_id)
-        )
-        conn.commit()
-        return cursor.rowcount > 0, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE messages SET need_human = %s WHERE message_id = %s",
+                (1 if need_human else 0, message_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
 
 
 def get_messages_by_mode(mode, limit=100):
@@ -795,25 +967,24 @@ def get_messages_by_mode(mode, limit=100):
     Returns:
         tuple: (messages_list, error) - list of messages or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            "SELECT m.*, ch.user_id FROM messages m "
-            "JOIN chat_history ch ON m.session_id = ch.session_id "
-            "WHERE m.mode = %s ORDER BY m.timestamp DESC LIMIT %s",
-            (mode, limit)
-        )
-        messages = cursor.fetchall()
-        # Convert boolean values
-        for message in messages:
-            message['need_human'] = bool(message['need_human'])
-        return messages, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                "SELECT m.*, ch.user_id FROM messages m "
+                "JOIN chat_history ch ON m.session_id = ch.session_id "
+                "WHERE m.mode = %s ORDER BY m.timestamp DESC LIMIT %s",
+                (mode, limit)
+            )
+            messages = cursor.fetchall()
+            # Convert boolean values
+            for message in messages:
+                message['need_human'] = bool(message['need_human'])
+            return messages, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def get_messages_need_human():
@@ -823,26 +994,25 @@ def get_messages_need_human():
     Returns:
         tuple: (messages_list, error) - list of messages or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            "SELECT m.*, ch.user_id, ui.first_name, ui.last_name, ui.email "
-            "FROM messages m "
-            "JOIN chat_history ch ON m.session_id = ch.session_id "
-            "JOIN user_info ui ON ch.user_id = ui.user_id "
-            "WHERE m.need_human = 1 ORDER BY m.timestamp DESC"
-        )
-        messages = cursor.fetchall()
-        # Convert boolean values
-        for message in messages:
-            message['need_human'] = bool(message['need_human'])
-        return messages, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                "SELECT m.*, ch.user_id, ui.first_name, ui.last_name, ui.email "
+                "FROM messages m "
+                "JOIN chat_history ch ON m.session_id = ch.session_id "
+                "JOIN user_info ui ON ch.user_id = ui.user_id "
+                "WHERE m.need_human = 1 ORDER BY m.timestamp DESC"
+            )
+            messages = cursor.fetchall()
+            # Convert boolean values
+            for message in messages:
+                message['need_human'] = bool(message['need_human'])
+            return messages, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def get_message_stats_by_mode():
@@ -852,21 +1022,20 @@ def get_message_stats_by_mode():
     Returns:
         tuple: (stats_list, error) - list of statistics or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            "SELECT mode, COUNT(*) as count, "
-            "SUM(CASE WHEN need_human = 1 THEN 1 ELSE 0 END) as need_human_count "
-            "FROM messages GROUP BY mode"
-        )
-        stats = cursor.fetchall()
-        return stats, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                "SELECT mode, COUNT(*) as count, "
+                "SUM(CASE WHEN need_human = 1 THEN 1 ELSE 0 END) as need_human_count "
+                "FROM messages GROUP BY mode"
+            )
+            stats = cursor.fetchall()
+            return stats, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 # ==================== Human Intervention Ticket Management Functions ====================
@@ -884,21 +1053,20 @@ def save_ticket(session_id, staff_id, staff_email, content):
     Returns:
         tuple: (ticket_id, error) - ticket ID on success, error message on failure
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "INSERT INTO tickets (session_id, staff_id, staff_email, content) VALUES (%s, %s, %s, %s)",
-            (session_id, staff_id, staff_email, content)
-        )
-        conn.commit()
-        ticket_id = cursor.lastrowid
-        return ticket_id, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO tickets (session_id, staff_id, staff_email, content) VALUES (%s, %s, %s, %s)",
+                (session_id, staff_id, staff_email, content)
+            )
+            conn.commit()
+            ticket_id = cursor.lastrowid
+            return ticket_id, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def get_unfinished_tickets(limit=100):
@@ -911,34 +1079,33 @@ def get_unfinished_tickets(limit=100):
     Returns:
         tuple: (tickets_list, error) - list of tickets or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            """
-            SELECT t.*, ui.first_name, ui.last_name, ui.department, ui.role,
-                   ch.title as session_title
-            FROM tickets t
-            JOIN user_info ui ON t.staff_id = ui.user_id
-            JOIN chat_history ch ON t.session_id = ch.session_id
-            WHERE t.is_finished = 0
-            ORDER BY t.request_time DESC
-            LIMIT %s
-            """,
-            (limit,)
-        )
-        tickets = cursor.fetchall()
-        
-        # Convert boolean values
-        for ticket in tickets:
-            ticket['is_finished'] = bool(ticket['is_finished'])
-            
-        return tickets, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                """
+                SELECT t.*, ui.first_name, ui.last_name, ui.department, ui.role,
+                       ch.title as session_title
+                FROM tickets t
+                JOIN user_info ui ON t.staff_id = ui.user_id
+                JOIN chat_history ch ON t.session_id = ch.session_id
+                WHERE t.is_finished = 0
+                ORDER BY t.request_time DESC
+                LIMIT %s
+                """,
+                (limit,)
+            )
+            tickets = cursor.fetchall()
+
+            # Convert boolean values
+            for ticket in tickets:
+                ticket['is_finished'] = bool(ticket['is_finished'])
+
+            return tickets, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def get_all_tickets(limit=500):
@@ -951,33 +1118,32 @@ def get_all_tickets(limit=500):
     Returns:
         tuple: (tickets_list, error) - list of tickets or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            """
-            SELECT t.*, ui.first_name, ui.last_name, ui.department, ui.role,
-                   ch.title as session_title
-            FROM tickets t
-            JOIN user_info ui ON t.staff_id = ui.user_id
-            JOIN chat_history ch ON t.session_id = ch.session_id
-            ORDER BY t.request_time DESC
-            LIMIT %s
-            """,
-            (limit,)
-        )
-        tickets = cursor.fetchall()
-        
-        # Convert boolean values
-        for ticket in tickets:
-            ticket['is_finished'] = bool(ticket['is_finished'])
-            
-        return tickets, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                """
+                SELECT t.*, ui.first_name, ui.last_name, ui.department, ui.role,
+                       ch.title as session_title
+                FROM tickets t
+                JOIN user_info ui ON t.staff_id = ui.user_id
+                JOIN chat_history ch ON t.session_id = ch.session_id
+                ORDER BY t.request_time DESC
+                LIMIT %s
+                """,
+                (limit,)
+            )
+            tickets = cursor.fetchall()
+
+            # Convert boolean values
+            for ticket in tickets:
+                ticket['is_finished'] = bool(ticket['is_finished'])
+
+            return tickets, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def finish_ticket(ticket_id, admin_notes=None):
@@ -991,20 +1157,19 @@ def finish_ticket(ticket_id, admin_notes=None):
     Returns:
         tuple: (success, error) - success status and error message if any
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE tickets SET is_finished = 1, finished_time = NOW(), admin_notes = %s WHERE ticket_id = %s",
-            (admin_notes, ticket_id)
-        )
-        conn.commit()
-        return cursor.rowcount > 0, None
-    except mysql.connector.Error as err:
-        return False, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE tickets SET is_finished = 1, finished_time = NOW(), admin_notes = %s WHERE ticket_id = %s",
+                (admin_notes, ticket_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
 
 
 def get_ticket_by_id(ticket_id):
@@ -1017,32 +1182,31 @@ def get_ticket_by_id(ticket_id):
     Returns:
         tuple: (ticket_info, error) - ticket information or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            """
-            SELECT t.*, ui.first_name, ui.last_name, ui.department, ui.role, ui.email,
-                   ch.title as session_title
-            FROM tickets t
-            JOIN user_info ui ON t.staff_id = ui.user_id
-            JOIN chat_history ch ON t.session_id = ch.session_id
-            WHERE t.ticket_id = %s
-            """,
-            (ticket_id,)
-        )
-        ticket = cursor.fetchone()
-        
-        if ticket:
-            # Convert boolean values
-            ticket['is_finished'] = bool(ticket['is_finished'])
-            
-        return ticket, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                """
+                SELECT t.*, ui.first_name, ui.last_name, ui.department, ui.role, ui.email,
+                       ch.title as session_title
+                FROM tickets t
+                JOIN user_info ui ON t.staff_id = ui.user_id
+                JOIN chat_history ch ON t.session_id = ch.session_id
+                WHERE t.ticket_id = %s
+                """,
+                (ticket_id,)
+            )
+            ticket = cursor.fetchone()
+
+            if ticket:
+                # Convert boolean values
+                ticket['is_finished'] = bool(ticket['is_finished'])
+
+            return ticket, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def get_tickets_stats():
@@ -1052,26 +1216,25 @@ def get_tickets_stats():
     Returns:
         tuple: (stats, error) - statistics dictionary or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            """
-            SELECT 
-                COUNT(*) as total_tickets,
-                SUM(CASE WHEN is_finished = 0 THEN 1 ELSE 0 END) as pending_tickets,
-                SUM(CASE WHEN is_finished = 1 THEN 1 ELSE 0 END) as finished_tickets,
-                COUNT(CASE WHEN request_time >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as recent_tickets
-            FROM tickets
-            """
-        )
-        stats = cursor.fetchone()
-        return stats, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                """
+                SELECT 
+                    COUNT(*) as total_tickets,
+                    SUM(CASE WHEN is_finished = 0 THEN 1 ELSE 0 END) as pending_tickets,
+                    SUM(CASE WHEN is_finished = 1 THEN 1 ELSE 0 END) as finished_tickets,
+                    COUNT(CASE WHEN request_time >= DATE_SUB(NOW(), INTERVAL 7 DAY) THEN 1 END) as recent_tickets
+                FROM tickets
+                """
+            )
+            stats = cursor.fetchone()
+            return stats, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
 
 
 def get_tickets_by_staff(staff_id, limit=50):
@@ -1085,29 +1248,254 @@ def get_tickets_by_staff(staff_id, limit=50):
     Returns:
         tuple: (tickets_list, error) - list of tickets or error message
     """
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        cursor.execute(
-            """
-            SELECT t.*, ch.title as session_title
-            FROM tickets t
-            JOIN chat_history ch ON t.session_id = ch.session_id
-            WHERE t.staff_id = %s
-            ORDER BY t.request_time DESC
-            LIMIT %s
-            """,
-            (staff_id, limit)
-        )
-        tickets = cursor.fetchall()
-        
-        # Convert boolean values
-        for ticket in tickets:
-            ticket['is_finished'] = bool(ticket['is_finished'])
-            
-        return tickets, None
-    except mysql.connector.Error as err:
-        return None, str(err)
-    finally:
-        cursor.close()
-        conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                """
+                SELECT t.*, ch.title as session_title
+                FROM tickets t
+                JOIN chat_history ch ON t.session_id = ch.session_id
+                WHERE t.staff_id = %s
+                ORDER BY t.request_time DESC
+                LIMIT %s
+                """,
+                (staff_id, limit)
+            )
+            tickets = cursor.fetchall()
+
+            # Convert boolean values
+            for ticket in tickets:
+                ticket['is_finished'] = bool(ticket['is_finished'])
+
+            return tickets, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
+
+
+# ==================== PDF Ingestion Job Management Functions ====================
+
+def create_ingest_job(job_id, pdf_path, title, keywords, document_date, file_size, uploader_id, extractor=None,
+                      content_hash=None, chunking=None):
+    """
+    Queue a PDF ingestion job
+    
+    Args:
+        job_id (str): Unique job ID
+        pdf_path (str): Saved PDF filename
+        title (str): Document title
+        keywords (str): Comma-separated keywords
+        document_date (str): Document date
+        file_size (int): File size in bytes
+        uploader_id (str): ID of the user who uploaded the document
+        extractor (str): PDF text extractor backend, None for the deployment default
+        content_hash (str): SHA-256 of the PDF bytes
+        chunking (str): Chunking mode (auto, qa or chunks), None for the deployment default
+    
+    Returns:
+        tuple: (job_id, error) - job ID on success, error message on failure
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "INSERT INTO ingest_jobs (job_id, pdf_path, title, keywords, document_date, file_size, uploader_id, extractor, content_hash, chunking) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                (job_id, pdf_path, title, keywords, document_date, file_size, uploader_id, extractor, content_hash, chunking)
+            )
+            conn.commit()
+            return job_id, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
+
+
+def claim_next_ingest_job(claim_id):
+    """
+    Atomically claim the oldest queued ingestion job
+    
+    Args:
+        claim_id (str): Unique ID of this claim attempt
+    
+    Returns:
+        tuple: (job, error) - job dictionary (None if the queue is empty) or error message
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(
+                """
+                UPDATE ingest_jobs
+                SET status = 'running', claimed_by = %s, attempts = attempts + 1, started_at = NOW()
+                WHERE status = 'queued'
+                ORDER BY created_at
+                LIMIT 1
+                """,
+                (claim_id,)
+            )
+            conn.commit()
+            if cursor.rowcount == 0:
+                return None, None
+            cursor.execute("SELECT * FROM ingest_jobs WHERE claimed_by = %s AND status = 'running'", (claim_id,))
+            return cursor.fetchone(), None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
+
+
+def update_ingest_job_stage(job_id, stage, progress):
+    """
+    Record the current stage of a running ingestion job
+    
+    Args:
+        job_id (str): Job ID
+        stage (str): Stage name
+        progress (int): Progress percentage (0-100)
+    
+    Returns:
+        tuple: (success, error) - success status and error message if any
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE ingest_jobs SET stage = %s, progress = %s WHERE job_id = %s",
+                (stage, progress, job_id)
+            )
+            conn.commit()
+            return True, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
+
+
+def heartbeat_ingest_job(job_id, claim_id):
+    """
+    Mark a running ingestion job as still being worked on
+    
+    Bumps updated_at, which requeue_stale_ingest_jobs compares against, so
+    a job that spends a long time in one stage is not taken for abandoned.
+    
+    Args:
+        job_id (str): Job ID
+        claim_id (str): claimed_by of the worker's claim
+    
+    Returns:
+        tuple: (claimed, error) - False if the job is no longer running under
+               this claim, error message if any
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "UPDATE ingest_jobs SET updated_at = NOW() WHERE job_id = %s AND claimed_by = %s AND status = 'running'",
+                (job_id, claim_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
+
+
+def finish_ingest_job(job_id, status, error=None, entries=None):
+    """
+    Mark an ingestion job as succeeded or failed
+    
+    Args:
+        job_id (str): Job ID
+        status (str): 'succeeded' or 'failed'
+        error (str): Error message for failed jobs
+        entries (int): Number of Q&A entries indexed
+    
+    Returns:
+        tuple: (success, error) - success status and error message if any
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if status == 'succeeded':
+                cursor.execute(
+                    "UPDATE ingest_jobs SET status = %s, stage = 'done', progress = 100, entries = %s, error = NULL, finished_at = NOW() WHERE job_id = %s",
+                    (status, entries, job_id)
+                )
+            else:
+                cursor.execute(
+                    "UPDATE ingest_jobs SET status = %s, error = %s, finished_at = NOW() WHERE job_id = %s",
+                    (status, error, job_id)
+                )
+            conn.commit()
+            return True, None
+        except mysql.connector.Error as err:
+            return False, str(err)
+        finally:
+            cursor.close()
+
+
+def get_ingest_job(job_id):
+    """
+    Get an ingestion job by ID
+    
+    Args:
+        job_id (str): Job ID
+    
+    Returns:
+        tuple: (job, error) - job dictionary (None if not found) or error message
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM ingest_jobs WHERE job_id = %s", (job_id,))
+            return cursor.fetchone(), None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
+
+
+def requeue_stale_ingest_jobs(stale_seconds, max_attempts):
+    """
+    Recover jobs whose worker stopped (process restart or crash)
+    
+    Running jobs without a stage update or heartbeat for ``stale_seconds``
+    are queued again, or failed once they have been attempted
+    ``max_attempts`` times.
+    
+    Args:
+        stale_seconds (int): Seconds without an update before a job counts as abandoned
+        max_attempts (int): Attempts after which a job is failed instead of re-queued
+    
+    Returns:
+        tuple: (requeued_count, error) - number of re-queued jobs or error message
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                UPDATE ingest_jobs
+                SET status = 'failed', error = 'Ingestion worker stopped while processing', finished_at = NOW()
+                WHERE status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND AND attempts >= %s
+                """,
+                (stale_seconds, max_attempts)
+            )
+            cursor.execute(
+                """
+                UPDATE ingest_jobs
+                SET status = 'queued', stage = 'queued', progress = 0, claimed_by = NULL
+                WHERE status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND
+                """,
+                (stale_seconds,)
+            )
+            requeued = cursor.rowcount
+            conn.commit()
+            return requeued, None
+        except mysql.connector.Error as err:
+            return None, str(err)
+        finally:
+            cursor.close()
@@ -0,0 +1,311 @@
+"""
+Database Connection Pool Module for HDingo Backend
+
+database.py used to open a new MySQL connection (TCP connect plus auth
+handshake) for every function call and close it afterwards, so one chat
+turn paid for several handshakes. This pool keeps connections open and
+lends them out through a context manager that always returns them.
+
+mysql.connector.pooling has a fixed size, raises as soon as every
+connection is busy and never checks connection health, so the pool is
+implemented here on top of plain mysql.connector connections.
+
+Configuration (environment):
+- DB_POOL_SIZE: connections kept open (default 5)
+- DB_POOL_MAX_OVERFLOW: extra connections opened under bursts; returned
+  connections are closed once DB_POOL_SIZE are idle (default 10)
+- DB_POOL_TIMEOUT: seconds to wait for a free connection (default 30)
+- DB_POOL_RECYCLE: idle seconds after which a connection is reopened
+  before use (default 300, below MySQL's wait_timeout)
+- DB_POOL_PRE_PING: ping connections on borrow (default 1)
+- DB_POOL: 0 opens and closes a connection per use, as before
+
+Key Features:
+- Fixed pool size plus bounded overflow connections
+- Borrowers wait for a free connection instead of failing, served in
+  arrival order
+- Health check on borrow; broken connections are replaced transparently
+- Idle recycling of connections the server may have dropped
+- Open transactions are rolled back on return, so the next borrower
+  starts from a fresh snapshot
+- Fork-safe: a forked child starts with an empty pool instead of sharing
+  the parent's sockets
+- Metrics: open, idle and in-use connections, waits, wait time, timeouts
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import contextlib
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+from mysql.connector import errors
+
+ENABLED = os.environ.get("DB_POOL", "1") != "0"
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", "10"))
+TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+RECYCLE_SECONDS = float(os.environ.get("DB_POOL_RECYCLE", "300"))
+PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") != "0"
+
+
+class PoolTimeout(errors.PoolError):
+    """No connection became free within the pool timeout"""
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _reset_in_child(pool_ref):
+    pool = pool_ref()
+    if pool is not None:
+        pool._reset_after_fork()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections
+
+    Connections are created with ``connect()`` on demand, up to
+    ``size + max_overflow`` at once. Use ``with pool.connection() as conn``
+    to borrow one.
+    """
+
+    def __init__(self, connect, size=POOL_SIZE, max_overflow=MAX_OVERFLOW, timeout=TIMEOUT,
+                 recycle=RECYCLE_SECONDS, pre_ping=PRE_PING, enabled=ENABLED):
+        """
+        Args:
+            connect (callable): Opens a new connection
+            size (int): Connections kept open when idle
+            max_overflow (int): Extra connections allowed under load
+            timeout (float): Seconds to wait for a free connection
+            recycle (float): Idle seconds after which a connection is reopened
+            pre_ping (bool): Ping connections before lending them out
+            enabled (bool): False opens and closes a connection per borrow
+        """
+        self._connect = connect
+        self.size = max(0, size)
+        self.max_overflow = max(0, max_overflow)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.enabled = enabled
+        self._idle = deque()  # (connection, returned at), most recently returned last
+        self._open = 0
+        self._in_use = 0
+        self._lock = threading.Lock()
+        # One condition per waiting borrower, served first come, first served
+        self._waiters = deque()
+        self._pid = os.getpid()
+        # Connections inherited through fork. They stay referenced because
+        # mysql.connector shuts the socket down when a connection is
+        # collected, and the parent process still uses that socket
+        self._inherited = []
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=lambda ref=weakref.ref(self): _reset_in_child(ref))
+
+        self.borrows = 0
+        self.connects = 0
+        self.peak_in_use = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+        self.recycled = 0
+        self.health_check_failures = 0
+
+    def _reset_after_fork(self):
+        """Start the child of a fork with an empty pool (runs in the child only)"""
+        self._inherited.extend(conn for conn, _ in self._idle)
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._waiters = deque()
+        # Another parent thread may have held the lock at fork time
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self):
+        """
+        Borrow a connection, waiting up to the timeout if all are in use
+
+        Returns:
+            Connection: A healthy connection; pass it back to release()
+
+        Raises:
+            PoolTimeout: If no connection became free in time
+            mysql.connector.Error: If a new connection could not be opened
+        """
+        conn = None
+        returned_at = None
+        started = None
+        waiter = None
+        with self._lock:
+            try:
+                while True:
+                    # New borrowers queue behind waiting ones instead of taking
+                    # the connection a waiter was woken for
+                    if not self._waiters or self._waiters[0] is waiter:
+                        if self._idle:
+                            conn, returned_at = self._idle.pop()
+                            break
+                        if self._can_open():
+                            self._open += 1
+                            break
+                    if started is None:
+                        started = time.monotonic()
+                        self.waits += 1
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        self.wait_time += time.monotonic() - started
+                        raise PoolTimeout(f"No database connection free after {self.timeout:.0f}s")
+                    if waiter is None:
+                        waiter = threading.Condition(self._lock)
+                        self._waiters.append(waiter)
+                    waiter.wait(remaining)
+            finally:
+                if waiter is not None:
+                    self._waiters.remove(waiter)
+                    if self._idle or self._can_open():
+                        self._notify_waiter()
+            if started is not None:
+                waited = time.monotonic() - started
+                self.wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+            self.borrows += 1
+            self._in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self._in_use)
+
+        # Checks and connects run outside the lock, so a slow server does not
+        # block other borrowers
+        try:
+            if conn is not None and time.monotonic() - returned_at > self.recycle:
+                _close_quietly(conn)
+                conn = None
+                with self._lock:
+                    self.recycled += 1
+            elif conn is not None and self.pre_ping and not self._alive(conn):
+                _close_quietly(conn)
+                conn = None
+                with self._lock:
+                    self.health_check_failures += 1
+            if conn is None:
+                conn = self._connect()
+                with self._lock:
+                    self.connects += 1
+        except BaseException:
+            with self._lock:
+                self._open -= 1
+                self._in_use -= 1
+                self._notify_waiter()
+            raise
+        return conn
+
+    def _can_open(self):
+        return not self.enabled or self._open < self.size + self.max_overflow
+
+    def _notify_waiter(self):
+        # Caller holds _lock
+        if self._waiters:
+            self._waiters[0].notify()
+
+    @staticmethod
+    def _alive(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except errors.Error:
+            return False
+
+    def release(self, conn, discard=False):
+        """
+        Return a borrowed connection
+
+        An open transaction is rolled back first. Broken and discarded
+        connections are closed, and so are connections returned while
+        ``size`` others are idle, unless a borrower is waiting for one.
+        """
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except errors.Error:
+                discard = True
+        with self._lock:
+            self._in_use -= 1
+            # Capping idle (not open) connections keeps overflow connections
+            # in use while load stays above the pool size
+            keep = self.enabled and not discard and (len(self._idle) < self.size or self._waiters)
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._open -= 1
+            self._notify_waiter()
+        if not keep:
+            _close_quietly(conn)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block
+
+        The connection is always returned, and dropped from the pool if the
+        block raised a connection-level error. A connection borrowed before
+        the process forked is left to the parent.
+        """
+        conn = self.acquire()
+        pid = self._pid
+        discard = False
+        try:
+            yield conn
+        except (errors.InterfaceError, errors.OperationalError):
+            discard = True
+            raise
+        finally:
+            if self._pid == pid:
+                self.release(conn, discard)
+            else:
+                self._inherited.append(conn)
+
+    def close_all(self):
+        """
+        Close every idle connection (borrowed ones are closed when returned)
+        """
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn, _ in idle:
+            _close_quietly(conn)
+
+    def stats(self):
+        """
+        Return pool configuration, connection counts and wait metrics
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "peak_in_use": self.peak_in_use,
+                "borrows": self.borrows,
+                "connects": self.connects,
+                "waits": self.waits,
+                "wait_time": round(self.wait_time, 4),
+                "max_wait_time": round(self.max_wait_time, 4),
+                "timeouts": self.timeouts,
+                "recycled": self.recycled,
+                "health_check_failures": self.health_check_failures,
+            }
@@ -0,0 +1,302 @@
+"""
+Embedding Encoder Module for HDingo Backend
+
+This module owns the process-wide SentenceTransformer used by every retrieval
+and ingestion path. The model is loaded once per process instead of once per
+query, warmed up at startup, and guarded by a semaphore so concurrent requests
+cannot pile unbounded inference work onto the CPU.
+
+Key Features:
+- Single lazily-loaded model instance per process
+- Startup warm-up so the first user request does not pay the load cost
+- Bounded concurrent inference
+- Encode latency statistics
+- Optional pinning of torch intra-op threads (EMBED_TORCH_THREADS) so several
+  gunicorn workers on one node do not oversubscribe the cores
+- Micro-batching queue that merges concurrent single-question encodes into
+  one forward pass (EMBED_BATCH_MAX_SIZE / EMBED_BATCH_MAX_WAIT_MS)
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+MODEL_NAME = os.environ.get("EMBED_MODEL_NAME", "all-MiniLM-L6-v2")
+# Maximum number of encode calls running inference at the same time
+MAX_CONCURRENCY = int(os.environ.get("EMBED_MAX_CONCURRENCY", "2"))
+# Torch intra-op threads per process (0 keeps the torch default)
+TORCH_THREADS = int(os.environ.get("EMBED_TORCH_THREADS", "0"))
+# Number of recent encode latencies kept for percentile reporting
+LATENCY_WINDOW = 1000
+# Micro-batching: flush after this many queued texts or this many milliseconds
+BATCH_MAX_SIZE = int(os.environ.get("EMBED_BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+
+class EmbeddingEncoder:
+    """
+    Shared sentence embedding encoder
+
+    Use ``get_encoder()`` rather than constructing this directly so the whole
+    process shares one model.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, max_concurrency=MAX_CONCURRENCY,
+                 torch_threads=TORCH_THREADS):
+        self.model_name = model_name
+        self.torch_threads = torch_threads
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self.max_concurrency = max(1, max_concurrency)
+
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._calls = 0
+        self._texts = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+
+    @property
+    def model(self):
+        """The underlying SentenceTransformer, loaded on first access"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    def _load_model(self):
+        if self.torch_threads > 0:
+            import torch
+            torch.set_num_threads(self.torch_threads)
+        from sentence_transformers import SentenceTransformer
+        start = time.perf_counter()
+        model = SentenceTransformer(self.model_name)
+        logging.info(f"Loaded embedding model {self.model_name} in {time.perf_counter() - start:.2f}s")
+        return model
+
+    @property
+    def dim(self):
+        """Embedding dimension of the loaded model"""
+        return self.model.get_sentence_embedding_dimension()
+
+    def warmup(self):
+        """
+        Load the model and run one dummy encode so kernels and tokenizer
+        caches are initialised before the first real request
+        """
+        self.encode(["warm up"])
+
+    def encode(self, texts, batch_size=32):
+        """
+        Encode texts into a float32 embedding matrix
+
+        Args:
+            texts (list): Texts to encode
+            batch_size (int): Batch size passed to the model
+
+        Returns:
+            numpy.ndarray: Matrix of shape (len(texts), dim)
+        """
+        model = self.model
+        if not len(texts):
+            return np.empty((0, self.dim), dtype="float32")
+        with self._slots:
+            start = time.perf_counter()
+            embeddings = model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+            elapsed = time.perf_counter() - start
+        self._record(len(texts), elapsed)
+
+        emb_array = np.asarray(embeddings, dtype="float32")
+        if emb_array.ndim == 1:
+            emb_array = emb_array.reshape(1, -1)
+        return emb_array
+
+    def _record(self, count, elapsed):
+        with self._stats_lock:
+            self._calls += 1
+            self._texts += count
+            self._total_time += elapsed
+            self._max_time = max(self._max_time, elapsed)
+            self._latencies.append(elapsed)
+
+    def stats(self):
+        """
+        Return encode latency statistics in milliseconds
+
+        Returns:
+            dict: Call counts and avg/p50/p95/max latency
+        """
+        with self._stats_lock:
+            recent = sorted(self._latencies)
+            calls = self._calls
+            texts = self._texts
+            total = self._total_time
+            max_time = self._max_time
+
+        def pct(p):
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(p * len(recent)))] * 1000
+
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "max_concurrency": self.max_concurrency,
+            "torch_threads": self.torch_threads,
+            "calls": calls,
+            "texts": texts,
+            "avg_ms": (total / calls * 1000) if calls else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "max_ms": max_time * 1000,
+        }
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching front end for an ``EmbeddingEncoder``
+
+    Concurrent callers enqueue their texts; a single background thread
+    collects them for up to ``max_wait_ms`` or ``max_batch_size`` items, runs
+    one batched forward pass and hands each caller back its own rows. With
+    ``max_wait_ms <= 0`` calls go straight to the encoder.
+    """
+
+    def __init__(self, encoder, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.encoder = encoder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_pid = None
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_seen = 0
+
+    def _ensure_worker(self):
+        # The worker thread does not survive a fork, so restart it per process
+        if self._worker is not None and self._worker_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._worker is not None and self._worker_pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def encode(self, texts):
+        """
+        Encode texts, sharing a forward pass with concurrent callers
+
+        Args:
+            texts (list): Texts to encode
+
+        Returns:
+            numpy.ndarray: Matrix of shape (len(texts), dim)
+        """
+        if self.max_wait <= 0 or not len(texts):
+            return self.encoder.encode(texts)
+        self._ensure_worker()
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return np.vstack([f.result() for f in futures])
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                vectors = self.encoder.encode([text for text, _ in batch], batch_size=len(batch))
+            except Exception as e:
+                logging.error(f"Batched embedding failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for row, (_, future) in enumerate(batch):
+                future.set_result(vectors[row:row + 1])
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._max_seen = max(self._max_seen, len(batch))
+
+    def stats(self):
+        """
+        Return batching statistics
+
+        Returns:
+            dict: Batch count, average and largest batch size
+        """
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "largest_batch": self._max_seen,
+            }
+
+
+_encoder = None
+_batcher = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder():
+    """
+    Return the process-wide encoder, creating it on first use
+    """
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = EmbeddingEncoder()
+    return _encoder
+
+
+def get_batcher():
+    """
+    Return the process-wide micro-batcher in front of ``get_encoder()``
+    """
+    global _batcher
+    if _batcher is None:
+        encoder = get_encoder()
+        with _encoder_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher(encoder)
+    return _batcher
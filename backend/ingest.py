@@ -0,0 +1,199 @@
+"""
+PDF Ingestion Job Queue Module for HDingo Backend
+
+``/api/upload`` only saves the file and queues a job; parsing, embedding,
+indexing and the database updates run on a small background worker pool.
+Jobs live in the MySQL ``ingest_jobs`` table, so they survive process
+restarts and every worker process can pick them up.
+
+Key Features:
+- Persistent job queue with atomic claiming, safe across worker processes
+- Fixed-size worker thread pool per process, woken immediately on submit
+- Stage and progress reporting for ``/api/upload/status/<job_id>``
+- Heartbeats while a job runs, so long stages are not mistaken for
+  abandoned jobs
+- Recovery of jobs abandoned by a stopped process, with an attempt limit
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+import database
+
+WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+POLL_INTERVAL = float(os.environ.get("INGEST_POLL_SECONDS", "2"))
+# Running jobs without a stage update or heartbeat for this long are treated as abandoned
+STALE_SECONDS = int(os.environ.get("INGEST_STALE_SECONDS", "900"))
+# How often a worker marks its running job as alive (well below STALE_SECONDS)
+HEARTBEAT_SECONDS = float(os.environ.get("INGEST_HEARTBEAT_SECONDS", "60"))
+MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS", "3"))
+# How often an idle worker looks for abandoned jobs
+RECOVER_INTERVAL = 60
+
+# Progress percentage reported when a job enters each stage
+STAGES = {
+    "queued": 0,
+    "parsing": 10,
+    "embedding": 40,
+    "indexing": 70,
+    "saving": 85,
+    "done": 100,
+}
+
+
+class IngestError(Exception):
+    """Expected ingestion failure; the message is shown to the uploader"""
+
+
+class IngestQueue:
+    """
+    Background worker pool that processes queued ingestion jobs
+
+    The handler is called as ``handler(job, report)`` with the job row and a
+    ``report(stage)`` callback, and returns the number of indexed entries.
+    Raising IngestError fails the job with that message.
+    """
+
+    def __init__(self, handler, workers=WORKERS, poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            handler (callable): Runs the ingestion pipeline for one job
+            workers (int): Worker threads per process
+            poll_interval (float): Seconds between queue polls when idle
+        """
+        self._handler = handler
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._last_recover = 0.0
+        self._last_error = None
+
+    def start(self):
+        """Start the worker threads (again after a fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._threads = [
+                threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            self._pid = os.getpid()
+            for thread in self._threads:
+                thread.start()
+
+    def submit(self, pdf_path, title, keywords, document_date, file_size, uploader_id=None, extractor=None,
+               content_hash=None, chunking=None):
+        """
+        Queue a job for a PDF that has already been saved
+
+        extractor names the PDF text extractor backend and chunking the
+        chunking mode (None for the defaults); content_hash is the SHA-256 of
+        the file used by the ingestion cache.
+
+        Returns:
+            tuple: (job_id, error) - job ID on success, error message on failure
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        job_id, error = database.create_ingest_job(
+            job_id, pdf_path, title, keywords, document_date, file_size, uploader_id, extractor, content_hash, chunking
+        )
+        if job_id:
+            self._wake.set()
+        return job_id, error
+
+    def status(self, job_id):
+        """
+        Get a job's status, stage and progress
+
+        Returns:
+            tuple: (job, error) - job dictionary (None if not found) or error message
+        """
+        self.start()
+        return database.get_ingest_job(job_id)
+
+    def _log_error(self, message):
+        # Avoid printing the same database error on every poll
+        if message != self._last_error:
+            print(f"Warning: Ingestion queue error: {message}")
+        self._last_error = message
+
+    def _recover(self):
+        now = time.monotonic()
+        if now - self._last_recover < RECOVER_INTERVAL:
+            return
+        self._last_recover = now
+        requeued, error = database.requeue_stale_ingest_jobs(STALE_SECONDS, MAX_ATTEMPTS)
+        if error:
+            self._log_error(error)
+        elif requeued:
+            print(f"Re-queued {requeued} abandoned ingestion job(s)")
+
+    def _run(self):
+        claim_prefix = f"{socket.gethostname()[:24]}:{os.getpid()}"
+        while True:
+            try:
+                self._recover()
+                job, error = database.claim_next_ingest_job(f"{claim_prefix}:{uuid.uuid4().hex[:12]}")
+            except Exception as e:
+                # e.g. the database is unreachable: get_db_connection raises
+                job, error = None, str(e)
+            if error:
+                self._log_error(error)
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._last_error = None
+            try:
+                self._process(job)
+            except Exception as e:
+                # Status updates failed; the job is recovered once it goes stale
+                self._log_error(str(e))
+
+    def _heartbeat(self, job, done):
+        # Stage updates only happen at stage boundaries; one stage (e.g.
+        # parsing a large PDF) can take longer than STALE_SECONDS
+        while not done.wait(HEARTBEAT_SECONDS):
+            try:
+                claimed, error = database.heartbeat_ingest_job(job["job_id"], job["claimed_by"])
+            except Exception as e:
+                claimed, error = True, str(e)
+            if error:
+                self._log_error(error)
+            elif not claimed:
+                return
+
+    def _process(self, job):
+        job_id = job["job_id"]
+
+        def report(stage):
+            database.update_ingest_job_stage(job_id, stage, STAGES[stage])
+
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), name=f"ingest-heartbeat-{job_id[:8]}",
+                                     daemon=True)
+        heartbeat.start()
+        try:
+            entries = self._handler(job, report)
+        except IngestError as e:
+            database.finish_ingest_job(job_id, "failed", error=str(e))
+        except Exception as e:
+            traceback.print_exc()
+            database.finish_ingest_job(job_id, "failed", error=f"Unexpected error: {str(e)}")
+        else:
+            database.finish_ingest_job(job_id, "succeeded", entries=entries)
+        finally:
+            done.set()
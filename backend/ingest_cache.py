@@ -0,0 +1,453 @@
+"""
+Content-Hash Ingestion Cache Module for HDingo Backend
+
+Uploads are hashed (SHA-256) while they are streamed to disk, and ingestion
+results are cached by that hash, so re-uploading a PDF - or the same PDF
+under a different filename - skips extraction, parsing and embedding.
+Embeddings are also cached per Q&A text, so an edited PDF only re-embeds
+the pairs that actually changed.
+
+Layout under the cache directory (default rag/cache):
+- documents/<sha256>-<variant>-<model>.ragstore: a copy of the shard
+  written for one uploaded file (entries and vectors); the variant names
+  how the entries were built (extractor backend and chunking mode)
+- embeddings-<model>.bin: append-only records of (SHA-1 of the Q&A text,
+  float32 vector) shared by all worker processes; each process
+  memory-maps it, so the vectors live once in the page cache and each
+  process only holds a key index (about 100 bytes per record)
+
+Both are keyed by the embedding model, so changing EMBED_MODEL_NAME never
+mixes vectors from different models. Both are also bounded:
+- documents/ is capped at INGEST_CACHE_MAX_DOCUMENTS_MB (default 2048);
+  the least recently used copies are deleted first
+- the embeddings file is capped at INGEST_CACHE_MAX_EMBEDDINGS_MB (default
+  512); once it grows past the cap it is rewritten with its newest half
+
+Key Features:
+- Single-pass hash-and-save of uploads (atomic rename into place)
+- Whole-document reuse keyed by content hash and build variant
+- Persistent per-text embedding cache; only misses reach the model
+- Lock-protected appends, so every worker process shares one cache file
+- Size caps with LRU eviction of documents and age eviction of embeddings
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import shutil
+import struct
+import threading
+
+import numpy as np
+
+import rag_shard
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+ENABLED = os.environ.get("INGEST_CACHE", "1") != "0"
+MAX_DOCUMENT_BYTES = int(float(os.environ.get("INGEST_CACHE_MAX_DOCUMENTS_MB", "2048")) * (1 << 20))
+MAX_EMBEDDING_BYTES = int(float(os.environ.get("INGEST_CACHE_MAX_EMBEDDINGS_MB", "512")) * (1 << 20))
+# Bytes read from the upload stream per hash/write step
+CHUNK_SIZE = 1 << 20
+
+_EMB_MAGIC = b"HDEMBC\x00\x01"
+_EMB_HEADER = struct.Struct("<8sI")
+_KEY_SIZE = 20  # SHA-1 digest
+
+
+def save_upload(stream, path, chunk_size=CHUNK_SIZE):
+    """
+    Write an upload stream to disk, hashing the bytes on the way
+
+    The file is written under a temporary name and renamed into place, so a
+    job still reading an earlier upload of the same name is not disturbed.
+
+    Args:
+        stream: Readable binary stream (e.g. ``FileStorage.stream``)
+        path (str): Destination path
+
+    Returns:
+        tuple: (sha256 hex digest, size in bytes)
+    """
+    sha = hashlib.sha256()
+    size = 0
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return sha.hexdigest(), size
+
+
+def hash_stream(stream, chunk_size=CHUNK_SIZE):
+    """
+    Hash a binary stream without storing it
+
+    Returns:
+        tuple: (sha256 hex digest, size in bytes)
+    """
+    sha = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        sha.update(chunk)
+        size += len(chunk)
+    return sha.hexdigest(), size
+
+
+def text_key(text):
+    """
+    Return the embedding cache key of one text
+    """
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """
+    Append-only, multi-process embedding cache file
+
+    The file is a small header (magic, dimension) followed by fixed-size
+    records. Each process memory-maps the file and keeps only an index from
+    key to record number, so vectors stay in the page cache shared by all
+    processes instead of being copied into every process' heap. Records
+    appended by other processes are picked up on a miss.
+
+    Once an append takes the file past max_bytes, the file is rewritten
+    with its newest half of records and renamed into place. Other processes
+    notice the new file (a different inode) and map it instead.
+    """
+
+    def __init__(self, path, max_bytes=MAX_EMBEDDING_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dim = None
+        self.evicted = 0
+        self._rows = {}
+        self._records = None
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def _record_size(self):
+        return _KEY_SIZE + 4 * self.dim
+
+    def _refresh(self):
+        """Map and index records appended since the last refresh (caller holds _lock)"""
+        try:
+            with open(self.path, "rb") as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != self._inode:
+                    # First read, or the file was rewritten by _shrink
+                    self._rows = {}
+                    self._records = None
+                    self.dim = None
+                    self._offset = 0
+                    self._inode = inode
+                if self.dim is None:
+                    header = f.read(_EMB_HEADER.size)
+                    if len(header) < _EMB_HEADER.size:
+                        return
+                    magic, dim = _EMB_HEADER.unpack(header)
+                    if magic != _EMB_MAGIC:
+                        raise ValueError(f"Not an embedding cache file: {self.path}")
+                    self.dim = dim
+                    self._offset = _EMB_HEADER.size
+                # A record still being appended by another process is read next time
+                count = (os.fstat(f.fileno()).st_size - self._offset) // self._record_size()
+                if not count:
+                    return
+                end = self._offset + count * self._record_size()
+                mapped = mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return
+        # Views of the previous mapping handed out by get_many keep it alive
+        start = len(self._records) if self._records is not None else 0
+        self._records = np.frombuffer(
+            # V, not S: S would strip trailing zero bytes from the keys
+            mapped, dtype=[("key", f"V{_KEY_SIZE}"), ("vector", "<f4", (self.dim,))],
+            count=(end - _EMB_HEADER.size) // self._record_size(), offset=_EMB_HEADER.size,
+        )
+        for row, key in enumerate(self._records["key"][start:].tolist(), start):
+            self._rows[key] = row
+        self._offset = end
+
+    def get_many(self, keys):
+        """
+        Look up vectors by key
+
+        Returns:
+            list: Read-only vector (a view of the mapped file) or None per key
+        """
+        with self._lock:
+            if any(key not in self._rows for key in keys):
+                self._refresh()
+            rows = [self._rows.get(key) for key in keys]
+            if self._records is None:
+                return rows
+            vectors = self._records["vector"]
+            return [vectors[row] if row is not None else None for row in rows]
+
+    def put_many(self, keys, vectors):
+        """
+        Append vectors for keys not yet in the file
+        """
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+        if not len(keys):
+            return
+        with self._lock:
+            with self._open_locked() as f:
+                try:
+                    self._refresh()
+                    if self.dim is None:
+                        self.dim = vectors.shape[1]
+                        if f.tell() == 0:
+                            f.write(_EMB_HEADER.pack(_EMB_MAGIC, self.dim))
+                        self._offset = _EMB_HEADER.size
+                    if vectors.shape[1] != self.dim:
+                        return
+                    out = bytearray()
+                    written = set()
+                    for key, vector in zip(keys, vectors):
+                        if key not in self._rows and key not in written:
+                            out += key + vector.tobytes()
+                            written.add(key)
+                    f.write(out)
+                    f.flush()
+                    # Map our own records while no other process can append
+                    self._refresh()
+                    if self._offset > self.max_bytes:
+                        self._shrink()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _open_locked(self):
+        """
+        Open the file for appending with an exclusive lock (caller holds _lock)
+
+        Retries if the file was replaced between opening and locking, so
+        records are never appended to a file that _shrink already replaced.
+        """
+        while True:
+            f = open(self.path, "ab")
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()
+
+    def _shrink(self):
+        """
+        Rewrite the file with its newest half of records (caller holds the file lock)
+
+        Records are kept in file order, so the oldest appends are evicted.
+        """
+        keep = max(0, (self.max_bytes // 2 - _EMB_HEADER.size) // self._record_size())
+        rows = sorted(self._rows.values())
+        kept = rows[len(rows) - keep:] if keep else []
+        tmp_path = f"{self.path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "wb") as out:
+            out.write(_EMB_HEADER.pack(_EMB_MAGIC, self.dim))
+            out.write(self._records[kept].tobytes())
+        os.replace(tmp_path, self.path)
+        self.evicted += len(rows) - len(kept)
+        self._inode = None
+        self._refresh()
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class IngestCache:
+    """
+    Document and embedding caches for PDF ingestion
+    """
+
+    def __init__(self, cache_dir, model_name, enabled=ENABLED, max_document_bytes=MAX_DOCUMENT_BYTES,
+                 max_embedding_bytes=MAX_EMBEDDING_BYTES):
+        """
+        Args:
+            cache_dir (str): Cache directory (created on first write)
+            model_name (str): Embedding model name; part of every cache key
+            enabled (bool): False turns every lookup into a miss and skips writes
+            max_document_bytes (int): Size cap of the cached documents
+            max_embedding_bytes (int): Size cap of the embeddings file
+        """
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.enabled = enabled
+        self.max_document_bytes = max_document_bytes
+        self._safe_model = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.embeddings = EmbeddingStore(
+            os.path.join(cache_dir, f"embeddings-{self._safe_model}.bin"), max_embedding_bytes
+        )
+        # Ingest worker threads update the counters concurrently
+        self._stats_lock = threading.Lock()
+        self.document_hits = 0
+        self.document_misses = 0
+        self.document_evictions = 0
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+
+    def _document_path(self, content_hash, variant):
+        name = f"{content_hash}-{variant}-{self._safe_model}{rag_shard.EXTENSION}"
+        return os.path.join(self.cache_dir, "documents", name)
+
+    def get_document(self, content_hash, variant, batch_size):
+        """
+        Look up the entries and vectors of an already ingested file
+
+        Args:
+            content_hash (str): SHA-256 of the PDF bytes
+            variant (str): How the entries were built, e.g. 'pdfplumber-qa'
+            batch_size (int): Rows per yielded batch
+
+        Returns:
+            generator: (pairs, vectors) batches - lists of {question, answer}
+                       dicts and float32 matrices - or None on a miss
+        """
+        if not self.enabled or not content_hash:
+            return None
+        path = self._document_path(content_hash, variant)
+        try:
+            store = rag_shard.RagStoreFile(path)
+        except (FileNotFoundError, ValueError):
+            with self._stats_lock:
+                self.document_misses += 1
+            return None
+        with self._stats_lock:
+            self.document_hits += 1
+        # The modification time doubles as last use for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return self._iter_document(store, batch_size)
+
+    @staticmethod
+    def _iter_document(store, batch_size):
+        for start in range(0, len(store), batch_size):
+            rows = range(start, min(start + batch_size, len(store)))
+            pairs = [{"question": store.question(row), "answer": store.answer(row)} for row in rows]
+            yield pairs, np.array(store.vectors[rows.start:rows.stop])
+
+    def put_document(self, content_hash, variant, shard_path):
+        """
+        Keep a copy of the shard written for a file
+        """
+        if not self.enabled or not content_hash:
+            return
+        path = self._document_path(content_hash, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.copyfile(shard_path, tmp_path)
+        os.replace(tmp_path, path)
+        self.prune_documents(keep=path)
+
+    def prune_documents(self, keep=None):
+        """
+        Delete the least recently used cached documents until they fit the cap
+
+        Args:
+            keep (str): Path never deleted (the document just written)
+
+        Returns:
+            int: Number of documents deleted
+        """
+        directory = os.path.join(self.cache_dir, "documents")
+        files = []
+        total = 0
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.endswith(rag_shard.EXTENSION) and entry.is_file():
+                        st = entry.stat()
+                        files.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+        except FileNotFoundError:
+            return 0
+        deleted = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_document_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Evicted by another worker process
+            total -= size
+            deleted += 1
+        with self._stats_lock:
+            self.document_evictions += deleted
+        return deleted
+
+    def encode(self, texts, encode_fn):
+        """
+        Embed texts, reusing cached vectors and encoding only the misses
+
+        Args:
+            texts (list): Texts to embed
+            encode_fn (callable): Encodes a list of texts into a float32 matrix
+
+        Returns:
+            numpy.ndarray: float32 matrix, row-aligned with texts
+        """
+        if not self.enabled:
+            return encode_fn(texts)
+        keys = [text_key(t) for t in texts]
+        cached = self.embeddings.get_many(keys)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        with self._stats_lock:
+            self.embedding_hits += len(texts) - len(missing)
+            self.embedding_misses += len(missing)
+        if len(missing) == len(texts):
+            vectors = np.asarray(encode_fn(texts), dtype="float32")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.embeddings.put_many(keys, vectors)
+            return vectors
+
+        if missing:
+            encoded = np.asarray(encode_fn([texts[i] for i in missing]), dtype="float32")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.embeddings.put_many([keys[i] for i in missing], encoded)
+            for i, vector in zip(missing, encoded):
+                cached[i] = vector
+        return np.vstack(cached).astype("float32", copy=False)
+
+    def stats(self):
+        """
+        Return hit/miss/eviction counters and the number of cached embeddings
+        """
+        with self._stats_lock:
+            return {
+                "enabled": self.enabled,
+                "document_hits": self.document_hits,
+                "document_misses": self.document_misses,
+                "document_evictions": self.document_evictions,
+                "embedding_hits": self.embedding_hits,
+                "embedding_misses": self.embedding_misses,
+                "embedding_evictions": self.embeddings.evicted,
+                "cached_embeddings": len(self.embeddings),
+            }
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+RAG Store Migration Tool
+
+Converts legacy RAG shards (``<name>.index`` + ``<name>_ids.pkl`` +
+``<name>_docs.json``) under a RAG directory into single ``<name>.ragstore``
+files (see rag_shard.py). Each converted store is read back and compared
+with the legacy shard before anything is removed.
+
+Usage:
+    python migrate_rag_store.py                  # convert backend/rag, keep legacy files
+    python migrate_rag_store.py --remove-legacy  # convert and delete the legacy triples
+    python migrate_rag_store.py --dry-run        # only list what would be converted
+
+Running servers pick up the new files on their next corpus reload (upload,
+delete or restart).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+import rag_shard
+import rag_store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def legacy_prefixes(rag_dir):
+    """
+    Return the names of all complete legacy shards in a directory
+    """
+    prefixes = []
+    for f in sorted(os.listdir(rag_dir)):
+        if not f.endswith(".index"):
+            continue
+        prefix = f[:-len(".index")]
+        if all(os.path.exists(p) for p in rag_store.shard_paths(rag_dir, prefix)):
+            prefixes.append(prefix)
+    return prefixes
+
+
+def migrate_shard(rag_dir, prefix, remove_legacy=False):
+    """
+    Convert one legacy shard and verify the result
+
+    Returns:
+        tuple: (success, message)
+    """
+    ids, vectors, entries = rag_store.load_legacy_shard(rag_dir, prefix)
+    _, _, docs_path = rag_store.shard_paths(rag_dir, prefix)
+    with open(docs_path, "r", encoding="utf-8") as f:
+        docs = json.load(f)
+    info = {prefix: docs[0].get("source", {})} if docs else {}
+
+    path = rag_store.store_path(rag_dir, prefix)
+    rag_shard.write_store(
+        path,
+        ids,
+        vectors,
+        [e[1] for e in entries],
+        [e[2] for e in entries],
+        [prefix],
+        info=info,
+    )
+
+    store = rag_shard.RagStoreFile(path)
+    if len(store) != len(entries) or not np.array_equal(store.vectors, vectors):
+        return False, f"verification failed for {prefix}"
+    for row, (_, question, answer) in enumerate(entries):
+        if store.question(row) != question or store.answer(row) != answer:
+            return False, f"text mismatch in {prefix} row {row}"
+
+    if remove_legacy:
+        for legacy in rag_store.shard_paths(rag_dir, prefix):
+            os.remove(legacy)
+    return True, f"{prefix}: {len(entries)} entries -> {os.path.basename(path)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert legacy RAG shards to .ragstore files")
+    parser.add_argument("--rag-dir", default=os.path.join(BASE_DIR, "rag"))
+    parser.add_argument("--remove-legacy", action="store_true", help="Delete legacy files after verification")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    prefixes = legacy_prefixes(args.rag_dir)
+    print(f"Found {len(prefixes)} legacy shards in {args.rag_dir}")
+    if args.dry_run:
+        for prefix in prefixes:
+            print(f"  {prefix}")
+        return 0
+
+    failures = 0
+    for prefix in prefixes:
+        ok, message = migrate_shard(args.rag_dir, prefix, args.remove_legacy)
+        print(("  OK    " if ok else "  FAIL  ") + message)
+        failures += 0 if ok else 1
+
+    print(f"Migrated {len(prefixes) - failures}/{len(prefixes)} shards")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+PDF Text Extraction Module for HDingo Backend
+
+pdfplumber is pure Python and extracts one page at a time, so large PDFs are
+split into page ranges that a process pool extracts in parallel. Each worker
+opens the PDF on its own and the pages are put back in order. Small PDFs are
+extracted in-process, where the pool's start-up and re-open cost would
+outweigh the gain.
+
+The text itself comes from one of several extractor backends, chosen per
+deployment (PDF_EXTRACT_BACKEND) or per call:
+- pdfplumber: full layout analysis; the reference output, and the slowest
+- pdfminer: pdfminer.six without layout analysis, lines split where the
+  baseline moves
+- pdfium: pypdfium2 (PDFium's native text extraction); by far the fastest
+
+Key Features:
+- Pluggable extractor backends sharing one page-range interface
+- Page-parallel extraction across a persistent process pool
+- Streaming page iterator (iter_pages) with bounded memory
+- Page-count threshold (PDF_PARALLEL_MIN_PAGES) for switching to the pool
+- Per-page failures are logged and skipped, as in serial extraction
+- Workers are forked only while the process is single-threaded
+  (start_pool() at server start-up)
+- Falls back to serial extraction where fork is unavailable or unsafe, or
+  the pool breaks
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import io
+import collections
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdfplumber
+import pypdfium2 as pdfium
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LTChar, LTContainer
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+BACKEND = os.environ.get("PDF_EXTRACT_BACKEND", "pdfplumber")
+WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# PDFs with fewer pages than this are extracted serially
+PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "32"))
+# Page ranges per worker; more ranges even out slow pages, fewer save re-opens
+RANGES_PER_WORKER = 2
+# Longest page range handed to a worker, which bounds the text held in memory
+STREAM_RANGE_PAGES = int(os.environ.get("PDF_STREAM_RANGE_PAGES", "64"))
+
+_pool = None
+_pool_pid = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+# PDFium is not thread-safe, and uploads are processed on several threads
+_pdfium_lock = threading.Lock()
+
+
+def _pdfplumber_count(path):
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _pdfplumber_pages(path, start, stop):
+    with pdfplumber.open(path, pages=list(range(start + 1, stop + 1))) as pdf:
+        for page_num, page in zip(range(start + 1, stop + 1), pdf.pages):
+            try:
+                yield page_num, page.extract_text(), None
+            except Exception as e:
+                yield page_num, None, str(e)
+            finally:
+                # Drop the page's parsed layout objects; they are the bulk of pdfplumber's memory
+                page.close()
+
+
+class _LineTextConverter(TextConverter):
+    """
+    pdfminer text output without layout analysis
+
+    Characters are written in content-stream order with a line break
+    wherever the baseline moves, which keeps the line structure that
+    parse_qa_pairs relies on.
+    """
+
+    def receive_layout(self, ltpage):
+        last_y = None
+        stack = [iter(ltpage)]
+        while stack:
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+            elif isinstance(item, LTChar):
+                if last_y is not None and abs(item.y0 - last_y) > item.size / 2:
+                    self.write_text("\n")
+                self.write_text(item.get_text())
+                last_y = item.y0
+            elif isinstance(item, LTContainer):
+                stack.append(iter(item))
+        self.write_text("\n")
+
+
+def _pdfminer_count(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in PDFPage.get_pages(f))
+
+
+def _pdfminer_pages(path, start, stop):
+    rsrcmgr = PDFResourceManager(caching=True)
+    out = io.StringIO()
+    interpreter = PDFPageInterpreter(rsrcmgr, _LineTextConverter(rsrcmgr, out, laparams=None))
+    with open(path, "rb") as f:
+        for page_num, page in zip(range(start + 1, stop + 1), PDFPage.get_pages(f, pagenos=range(start, stop))):
+            try:
+                interpreter.process_page(page)
+                text, error = out.getvalue().strip(), None
+            except Exception as e:
+                text, error = None, str(e)
+            out.seek(0)
+            out.truncate()
+            yield page_num, text, error
+
+
+def _pdfium_count(path):
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+
+def _pdfium_pages(path, start, stop):
+    # The lock is taken per page so that a slow consumer of the generator
+    # does not hold up other uploads
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(path)
+    try:
+        for page_num in range(start + 1, stop + 1):
+            with _pdfium_lock:
+                try:
+                    page = pdf[page_num - 1]
+                    text = page.get_textpage().get_text_range().replace("\r\n", "\n").strip()
+                    page.close()
+                    result = (page_num, text, None)
+                except Exception as e:
+                    result = (page_num, None, str(e))
+            yield result
+    finally:
+        with _pdfium_lock:
+            pdf.close()
+
+
+# name -> (page count, page generator, safe to run in the process pool)
+# Page generators yield (page number, text, error message) for pages [start, stop)
+# PDFium stays in-process: it is fast enough not to need the pool, and
+# forking while another thread holds _pdfium_lock would deadlock the worker
+BACKENDS = {
+    "pdfplumber": (_pdfplumber_count, _pdfplumber_pages, True),
+    "pdfminer": (_pdfminer_count, _pdfminer_pages, True),
+    "pdfium": (_pdfium_count, _pdfium_pages, False),
+}
+
+
+def _extract_range(backend, path, start, stop):
+    """
+    Extract pages [start, stop) (0-based) of one PDF with the named backend
+
+    Runs in a pool worker, so failures are returned instead of logged.
+
+    Returns:
+        tuple: (pages, errors) - lists of (page number, text) and (page number, message)
+    """
+    pages = []
+    errors = []
+    for page_num, text, error in BACKENDS[backend][1](path, start, stop):
+        if error is None:
+            pages.append((page_num, text))
+        else:
+            errors.append((page_num, error))
+    return pages, errors
+
+
+def resolve_backend(backend=None):
+    """
+    Return the backend name to use, defaulting to PDF_EXTRACT_BACKEND
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown PDF extractor '{backend}', expected one of: {', '.join(BACKENDS)}")
+    return backend
+
+
+def _fork_is_safe():
+    """
+    Whether forking pool workers cannot inherit a lock held by another thread
+
+    A forked child gets copies of every lock held at that moment but none of
+    the threads that would release them, so workers are only forked while
+    the main thread is the only Python thread. spawn and forkserver would
+    avoid this, but they run ``python app.py``'s module code again in every
+    worker (loading the embedding model and starting the ingest queue).
+    """
+    return threading.active_count() == 1
+
+
+def _get_pool(workers):
+    """
+    Return the process pool, creating it on first use (and again after a fork or resize)
+
+    Returns None when a new pool would have to be forked from a process that
+    is already running other threads; callers then extract serially.
+    """
+    global _pool, _pool_pid, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            if _pool_workers == workers:
+                return _pool
+            # Joins the pool's own threads, so a single-threaded caller can fork again
+            _pool.shutdown(wait=True)
+            _pool = None
+        if not _fork_is_safe():
+            return None
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        _pool_pid = os.getpid()
+        _pool_workers = workers
+        # With fork, the first submit forks every worker before the pool
+        # starts its own management thread
+        _pool.submit(int).result()
+        return _pool
+
+
+def start_pool(workers=None):
+    """
+    Fork the extraction workers now, before the caller starts any threads
+
+    The server calls this at start-up, ahead of loading the embedding model
+    and starting its worker threads. Later calls reuse the same pool.
+
+    Returns:
+        bool: True if a pool is running
+    """
+    workers = WORKERS if workers is None else workers
+    if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return False
+    return _get_pool(workers) is not None
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def page_count(path, backend=None):
+    """
+    Return the number of pages in a PDF
+    """
+    return BACKENDS[resolve_backend(backend)][0](path)
+
+
+def iter_pages(path, workers=None, min_pages=None, backend=None, numbered=False):
+    """
+    Yield the text of every page in page order
+
+    Serial extraction reads one page at a time. The pool path keeps at most
+    two page ranges per worker in flight, each at most STREAM_RANGE_PAGES
+    long, so memory stays bounded however long the document is.
+
+    Args:
+        path (str): PDF file path
+        workers (int): Pool size (defaults to PDF_EXTRACT_WORKERS; 1 disables the pool)
+        min_pages (int): Page count at which the pool is used (defaults to PDF_PARALLEL_MIN_PAGES)
+        backend (str): Extractor backend name (defaults to PDF_EXTRACT_BACKEND)
+        numbered (bool): Yield (page number, text) pairs instead of bare texts
+
+    Yields:
+        str: Non-empty page texts
+    """
+    backend = resolve_backend(backend)
+    count_pages, extract, poolable = BACKENDS[backend]
+    workers = WORKERS if workers is None else workers
+    min_pages = PARALLEL_MIN_PAGES if min_pages is None else min_pages
+    count = count_pages(path)
+
+    use_pool = (
+        poolable and workers > 1 and count >= min_pages
+        and "fork" in multiprocessing.get_all_start_methods()
+    )
+    # First page not yet yielded
+    next_page = 0
+    if use_pool:
+        size = min(STREAM_RANGE_PAGES, math.ceil(count / (workers * RANGES_PER_WORKER)))
+        in_flight = collections.deque()
+        submitted = 0
+        try:
+            pool = _get_pool(workers)
+            while pool is not None and next_page < count:
+                while submitted < count and len(in_flight) < workers * RANGES_PER_WORKER:
+                    stop = min(submitted + size, count)
+                    in_flight.append((stop, pool.submit(_extract_range, backend, path, submitted, stop)))
+                    submitted = stop
+                stop, future = in_flight.popleft()
+                pages, errors = future.result()
+                for page_num, message in errors:
+                    logging.error(f"Error extracting text from page {page_num}: {message}")
+                for page_num, text in pages:
+                    if text:
+                        yield (page_num, text) if numbered else text
+                next_page = stop
+        except BrokenProcessPool as e:
+            logging.error(f"PDF extraction pool failed, extracting serially: {e}")
+            _reset_pool()
+        finally:
+            # Also reached when the consumer stops early
+            for _, pending in in_flight:
+                pending.cancel()
+
+    for page_num, text, error in extract(path, next_page, count):
+        if error is not None:
+            logging.error(f"Error extracting text from page {page_num}: {error}")
+        elif text:
+            yield (page_num, text) if numbered else text
+
+
+def extract_pages(path, workers=None, min_pages=None, backend=None):
+    """
+    Extract the text of every page in page order
+
+    Returns:
+        list: Non-empty page texts in page order (see iter_pages)
+    """
+    return list(iter_pages(path, workers, min_pages, backend))
+
+
+def extract_text(path, workers=None, min_pages=None, backend=None):
+    """
+    Extract the whole document as one string (pages joined by newlines)
+    """
+    return "\n".join(extract_pages(path, workers, min_pages, backend))
@@ -0,0 +1,78 @@
+"""
+Q&A Parsing Module for HDingo Backend
+
+Turns the extracted text of a taggi-style PDF into question/answer pairs.
+Kept apart from app.py so that tools and benchmarks can parse documents
+without starting the web application.
+
+Key Features:
+- Questions are lines ending in '?' or numbered headings ("3.1: ...")
+- Answers are the following lines up to a blank line or the next question
+- Streaming parser (iter_qa_pairs) that reads one line at a time, so large
+  documents never need to be held as one string
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import re
+import uuid
+
+HEADING_RE = re.compile(r'^(\d+(?:\.\d+)*):\s*(.+)')
+
+
+def iter_lines(pages):
+    """
+    Yield the lines of page texts as if the pages were joined with newlines
+    """
+    for text in pages:
+        yield from text.splitlines()
+        # An empty page, or one ending in a line break, leaves a blank line before
+        # the next ("\r" does not: joined with "\n" it becomes a single "\r\n" break)
+        if not text or (text[-1] != "\r" and text[-1].splitlines() == [""]):
+            yield ""
+
+
+def _make_pair(question, answer_lines):
+    return {
+        'id': f"qa_{uuid.uuid4().hex[:8]}",
+        'question': question,
+        'answer': ' '.join(answer_lines).strip()
+    }
+
+
+def iter_qa_pairs(lines):
+    """
+    Yield Q&A pairs from an iterable of lines
+
+    Produces the same pairs as parse_qa_pairs while holding only the
+    current question's answer lines.
+    """
+    question = None
+    answer_lines = []
+    for line in lines:
+        line = line.strip()
+        if question is not None:
+            if line and not (line.endswith('?') or HEADING_RE.match(line)):
+                answer_lines.append(line)
+                continue
+            yield _make_pair(question, answer_lines)
+            question = None
+        if line.endswith('?') or line.endswith('？'):
+            question = line
+        else:
+            m = HEADING_RE.match(line)
+            if m:
+                question = m.group(2)
+        answer_lines = []
+    if question is not None:
+        yield _make_pair(question, answer_lines)
+
+
+def parse_qa_pairs(full_text):
+    """
+    Extract Q&A pairs from full text.
+    Match lines ending with question marks or numbered heading lines as questions, 
+    with subsequent content as answers.
+    """
+    return list(iter_qa_pairs(full_text.splitlines()))
@@ -0,0 +1,131 @@
+"""
+RAG Retrieval Cache Module for HDingo Backend
+
+Onboarding questions repeat heavily ("account expired", "how do I get
+software"), so ``rag_search`` keeps two size-bounded LRU caches in front of
+the encoder and the corpus:
+
+- Level one maps normalized question text to its embedding
+- Level two maps (normalized question, top_k, score_threshold, corpus version)
+  to the hit list, including empty (negative) results
+
+Both levels are cleared whenever the corpus version changes after an upload
+or delete.
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("RAG_EMBEDDING_CACHE_SIZE", "2048"))
+RESULT_CACHE_SIZE = int(os.environ.get("RAG_RESULT_CACHE_SIZE", "4096"))
+
+
+def normalize_question(text):
+    """
+    Normalize question text for cache lookups
+
+    The embedding model is uncased, so lowercasing and collapsing whitespace
+    does not change what it sees.
+    """
+    return " ".join(text.lower().split())
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache with hit/miss counters
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size):
+        self.max_size = max(1, max_size)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, self._MISSING)
+            if value is self._MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+class RetrievalCache:
+    """
+    Question embedding cache plus retrieval result cache, tied to one corpus version
+    """
+
+    def __init__(self, embedding_size=EMBEDDING_CACHE_SIZE, result_size=RESULT_CACHE_SIZE):
+        self.embeddings = LRUCache(embedding_size)
+        self.results = LRUCache(result_size)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def sync(self, version):
+        """
+        Clear both levels if the corpus version changed since the last call
+        """
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self.embeddings.clear()
+                self.results.clear()
+                self._version = version
+
+    def get_embedding(self, question):
+        return self.embeddings.get(question)
+
+    def put_embedding(self, question, embedding):
+        self.embeddings.put(question, embedding)
+
+    def get_results(self, question, top_k, score_threshold, version):
+        return self.results.get((question, top_k, score_threshold, version))
+
+    def put_results(self, question, top_k, score_threshold, version, hits):
+        # Stored as a tuple so callers cannot mutate the cached list
+        self.results.put((question, top_k, score_threshold, version), tuple(hits))
+
+    def stats(self):
+        return {
+            "corpus_version": self._version,
+            "embeddings": self.embeddings.stats(),
+            "results": self.results.stats(),
+        }
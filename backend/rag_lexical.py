@@ -0,0 +1,202 @@
+"""
+RAG Lexical Index Module for HDingo Backend
+
+Many support questions are exact-term lookups ("sftp", "pp", "disk quota",
+"ssh key") where MiniLM distances are fuzzy. This module keeps an in-process
+BM25 inverted index over the same Q&A entries the vector index holds, and
+fuses both rankings with reciprocal-rank fusion.
+
+Key Features:
+- Inverted index with BM25 term weights precomputed from term frequencies
+  and document lengths at build time, so a query is a few array adds
+- Reciprocal-rank fusion (RRF) of lexical and vector rankings
+- Confidence check for a lexical-only fast path that answers exact-term
+  matches without running the embedding model
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# Fuse BM25 with vector search in rag_search (0 = vector search only)
+HYBRID = os.environ.get("RAG_HYBRID", "1") != "0"
+# Answer short exact-term queries from the lexical index alone (0 disables)
+FAST_PATH = os.environ.get("RAG_LEXICAL_FAST_PATH", "1") != "0"
+# Fast path only for queries of at most this many terms...
+FAST_PATH_MAX_TERMS = int(os.environ.get("RAG_LEXICAL_FAST_PATH_MAX_TERMS", "4"))
+# ...whose best BM25 score beats the best partial match by this factor
+FAST_PATH_MARGIN = float(os.environ.get("RAG_LEXICAL_FAST_PATH_MARGIN", "1.25"))
+# RRF constant and the number of candidates each ranking contributes (top_k * depth)
+RRF_K = int(os.environ.get("RAG_RRF_K", "60"))
+CANDIDATE_DEPTH = int(os.environ.get("RAG_HYBRID_DEPTH", "2"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i if in is it me my of on or
+should the this to what when where which who why will with you your
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _fold_plural(term):
+    if len(term) > 3 and term.endswith("s") and not term.endswith(("ss", "us", "is")):
+        return term[:-1]
+    return term
+
+
+def tokenize(text):
+    """
+    Split text into lowercase alphanumeric terms without stopwords
+
+    Short technical terms such as 'pp' or 'ssh' are kept, and simple plurals
+    are folded ('accounts' -> 'account').
+    """
+    return [_fold_plural(t) for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Immutable BM25 inverted index over a list of documents
+
+    Each posting list stores document positions and the document's full BM25
+    weight for the term (idf and length normalization included), so scoring
+    a query only sums the posting arrays of its terms.
+
+    BM25 scores depend on the collection statistics (document count, document
+    frequencies, average length), so scores of two indexes are only
+    comparable if they share them. An index built with ``reference`` takes
+    its idf from the document frequencies of both indexes and its length
+    normalization from the reference, which keeps a small index of recent
+    additions on the same scale as the large index it is merged with.
+    """
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B, reference=None):
+        postings = defaultdict(list)
+        doc_len = np.zeros(len(texts), dtype="float32")
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc, tf))
+
+        self.count = len(texts)
+        self.avgdl = float(doc_len.mean()) if self.count and doc_len.any() else 1.0
+        self.df = {term: len(plist) for term, plist in postings.items()}
+        total, avgdl = self.count, self.avgdl
+        if reference is not None and reference.count:
+            total += reference.count
+            avgdl = reference.avgdl
+
+        self.postings = {}
+        for term, plist in postings.items():
+            docs = np.array([d for d, _ in plist], dtype="int64")
+            tf = np.array([t for _, t in plist], dtype="float32")
+            df = len(docs) + (reference.df.get(term, 0) if reference is not None else 0)
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            weights = idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len[docs] / avgdl))
+            self.postings[term] = (docs, weights.astype("float32"))
+
+    def __len__(self):
+        return self.count
+
+    def search(self, terms, k, exclude=None):
+        """
+        Score documents against query terms
+
+        Args:
+            terms (list): Query terms from ``tokenize``
+            k (int): Maximum number of results
+            exclude (numpy.ndarray): Document positions to leave out
+
+        Returns:
+            tuple: (scores, docs) - 1-D arrays sorted by descending score,
+                   only documents matching at least one term
+        """
+        scores = np.zeros(self.count, dtype="float32")
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if posting is not None:
+                docs, weights = posting
+                scores[docs] += weights
+        if exclude is not None and len(exclude):
+            scores[exclude] = 0
+        matched = np.flatnonzero(scores)
+        top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+        return scores[top], top
+
+
+def rrf_fuse(rankings, top_k, k=RRF_K):
+    """
+    Reciprocal-rank fusion of several ranked lists
+
+    Args:
+        rankings (list): Lists of hashable keys, best first
+        top_k (int): Number of fused results
+        k (int): RRF constant; larger values flatten the rank weights
+
+    Returns:
+        list: (key, fused score) pairs sorted by descending score
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+
+
+def contains_all(terms, text):
+    """True if every query term occurs in text"""
+    return set(terms) <= set(tokenize(text))
+
+
+def full_matches(terms, results):
+    """
+    Leading results that contain every query term
+
+    Args:
+        terms (list): Query terms
+        results (list): (bm25 score, (pdf, question, answer)) pairs, best first
+
+    Returns:
+        list: The results before the first one that misses a term
+    """
+    for i, (_, (_, question, answer)) in enumerate(results):
+        if not contains_all(terms, question + " " + answer):
+            return results[:i]
+    return results
+
+
+def is_confident(terms, results, top_k):
+    """
+    Decide whether lexical results can be returned without vector search
+
+    True for short queries whose every term appears in the best entry's
+    question, when that entry clearly outscores the best entry that misses
+    one of the terms. Several entries matching every term are fine; they are
+    all returned (see ``full_matches``), but terms matched by more than
+    ``top_k`` entries are not selective enough.
+
+    Args:
+        terms (list): Query terms
+        results (list): (bm25 score, (pdf, question, answer)) pairs, best first
+        top_k (int): Number of results the caller asked for
+    """
+    terms = set(terms)
+    if not terms or len(terms) > FAST_PATH_MAX_TERMS or not results:
+        return False
+    best_score, (_, best_question, _) = results[0]
+    if not contains_all(terms, best_question):
+        return False
+    matched = full_matches(terms, results)
+    if len(matched) < len(results):
+        return best_score >= FAST_PATH_MARGIN * results[len(matched)][0]
+    return len(results) < top_k
@@ -0,0 +1,294 @@
+"""
+RAG Store File Format for HDingo Backend
+
+A ``.ragstore`` file holds everything retrieval needs for one corpus (a single
+PDF shard, or the merged corpus snapshot) in one versioned binary file,
+replacing the ``.index`` + ``_ids.pkl`` + ``_docs.json`` triple. Files are
+written to a temporary path and renamed into place, so a crash never leaves a
+half-updated shard behind.
+
+Layout (little-endian):
+- Header: magic, format version, vector dimension, row count, then an
+  (offset, length) pair for each section
+- meta:         UTF-8 JSON (source names and per-source info such as title/url)
+- ids:          int64[count] stable row ids (for faiss.IndexIDMap)
+- vectors:      float32[count, dim]
+- row_source:   int32[count] index into meta["sources"]
+- text_offsets: int64[2 * count + 1]; question i is text[off[2i]:off[2i+1]],
+                answer i is text[off[2i+1]:off[2i+2]]
+- text:         UTF-8 blob
+
+Every section starts on a 64-byte boundary, so readers memory-map the file and
+take zero-copy numpy views; only the text of rows actually read is decoded.
+StoreWriter builds a file batch by batch, spooling each section to a temporary
+file, for writers that must not hold a whole document in memory.
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+import uuid
+
+import numpy as np
+
+MAGIC = b"HDRAGST\x00"
+FORMAT_VERSION = 1
+EXTENSION = ".ragstore"
+SECTIONS = ("meta", "ids", "vectors", "row_source", "text_offsets", "text")
+ALIGN = 64
+
+_HEADER = struct.Struct("<8sIIQ")
+_SECTION = struct.Struct("<QQ")
+HEADER_SIZE = _HEADER.size + _SECTION.size * len(SECTIONS)
+
+
+def new_ids(count):
+    """
+    Return ``count`` random positive int64 row ids
+    """
+    return np.array([uuid.uuid4().int >> 65 for _ in range(count)], dtype="int64")
+
+
+def _align(pos):
+    return (pos + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _encode_text(questions, answers, pos=0):
+    """Encode rows of text; offsets[0] is ``pos`` and the rest are end positions"""
+    offsets = np.zeros(2 * len(questions) + 1, dtype="int64")
+    offsets[0] = pos
+    chunks = []
+    for row, (question, answer) in enumerate(zip(questions, answers)):
+        for j, text in enumerate((question, answer)):
+            data = text.encode("utf-8")
+            chunks.append(data)
+            pos += len(data)
+            offsets[2 * row + j + 1] = pos
+    return offsets, b"".join(chunks)
+
+
+def _layout(lengths):
+    """Return the (offset, length) table for section lengths and the file size"""
+    table = []
+    pos = _align(HEADER_SIZE)
+    for length in lengths:
+        table.append((pos, length))
+        pos = _align(pos + length)
+    return table, pos
+
+
+def _write_header(f, dim, count, table):
+    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, dim, count))
+    for offset, length in table:
+        f.write(_SECTION.pack(offset, length))
+
+
+def _encode_meta(sources, info):
+    return json.dumps({"sources": list(sources), "info": info or {}}, ensure_ascii=False).encode("utf-8")
+
+
+def write_store(path, ids, vectors, questions, answers, sources, row_source=None, info=None):
+    """
+    Atomically write a .ragstore file
+
+    Args:
+        path (str): Destination path
+        ids (array-like): int64 row ids
+        vectors (numpy.ndarray): float32 matrix of shape (count, dim)
+        questions (list): Question text per row
+        answers (list): Answer text per row
+        sources (list): Source (PDF) names
+        row_source (array-like): Index into ``sources`` per row (defaults to all 0)
+        info (dict): Optional per-source metadata, e.g. {pdf: {"title": ..., "url": ...}}
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    count = len(questions)
+    dim = vectors.shape[1] if vectors.ndim == 2 else 0
+    if row_source is None:
+        row_source = np.zeros(count, dtype="int32")
+    offsets, text = _encode_text(questions, answers)
+    meta = _encode_meta(sources, info)
+
+    payloads = {
+        "meta": meta,
+        "ids": np.ascontiguousarray(ids, dtype="int64").tobytes(),
+        "vectors": vectors.tobytes(),
+        "row_source": np.ascontiguousarray(row_source, dtype="int32").tobytes(),
+        "text_offsets": offsets.tobytes(),
+        "text": text,
+    }
+
+    table, pos = _layout([len(payloads[name]) for name in SECTIONS])
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        _write_header(f, dim, count, table)
+        for name, (offset, _) in zip(SECTIONS, table):
+            f.seek(offset)
+            f.write(payloads[name])
+        f.truncate(pos)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class StoreWriter:
+    """
+    Write a .ragstore file incrementally, one batch of rows at a time
+
+    Each section except meta is spooled to a temporary file as rows are
+    appended, and ``close`` assembles the final file (then renames it into
+    place), so memory is bounded by the batch size rather than the row count.
+    Use as a context manager: the file is only published if the block
+    completes, and is discarded if it raises.
+    """
+
+    def __init__(self, path, sources, info=None):
+        """
+        Args:
+            path (str): Destination path
+            sources (list): Source (PDF) names
+            info (dict): Per-source metadata; may be replaced before ``close``
+        """
+        self.path = path
+        self.sources = list(sources)
+        self.info = info
+        self.dim = None
+        self.count = 0
+        self._text_pos = 0
+        spool_dir = os.path.dirname(os.path.abspath(path))
+        self._spool = {name: tempfile.TemporaryFile(dir=spool_dir) for name in SECTIONS if name != "meta"}
+        self._spool["text_offsets"].write(np.zeros(1, dtype="int64").tobytes())
+
+    def append(self, ids, vectors, questions, answers, row_source=None):
+        """
+        Append rows
+
+        Args:
+            ids (array-like): int64 row ids
+            vectors (numpy.ndarray): float32 matrix of shape (rows, dim)
+            questions (list): Question text per row
+            answers (list): Answer text per row
+            row_source (array-like): Index into ``sources`` per row (defaults to all 0)
+        """
+        vectors = np.ascontiguousarray(vectors, dtype="float32")
+        rows = len(questions)
+        if not rows:
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Vector dimension {vectors.shape[1]} does not match {self.dim}")
+        if row_source is None:
+            row_source = np.zeros(rows, dtype="int32")
+        offsets, text = _encode_text(questions, answers, self._text_pos)
+        self._spool["ids"].write(np.ascontiguousarray(ids, dtype="int64").tobytes())
+        self._spool["vectors"].write(vectors.tobytes())
+        self._spool["row_source"].write(np.ascontiguousarray(row_source, dtype="int32").tobytes())
+        self._spool["text_offsets"].write(offsets[1:].tobytes())
+        self._spool["text"].write(text)
+        self._text_pos = int(offsets[-1])
+        self.count += rows
+
+    def close(self):
+        """
+        Assemble the file and atomically move it into place
+        """
+        meta = _encode_meta(self.sources, self.info)
+        lengths = [len(meta) if name == "meta" else self._spool[name].tell() for name in SECTIONS]
+        table, pos = _layout(lengths)
+
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        try:
+            with open(tmp_path, "wb") as f:
+                _write_header(f, self.dim or 0, self.count, table)
+                for name, (offset, _) in zip(SECTIONS, table):
+                    f.seek(offset)
+                    if name == "meta":
+                        f.write(meta)
+                    else:
+                        spool = self._spool[name]
+                        spool.seek(0)
+                        shutil.copyfileobj(spool, f)
+                f.truncate(pos)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self.abort()
+
+    def abort(self):
+        """
+        Discard the spooled rows without writing the file
+        """
+        for spool in self._spool.values():
+            spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class RagStoreFile:
+    """
+    Read-only, memory-mapped view of one .ragstore file
+
+    Indexing returns (source, question, answer) for a row, decoding only that
+    row's text.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mm = np.memmap(path, dtype="uint8", mode="r")
+        magic, version, dim, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a RAG store file: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported RAG store version {version}: {path}")
+        self.dim = dim
+        self.count = count
+
+        sections = {}
+        for i, name in enumerate(SECTIONS):
+            offset, length = _SECTION.unpack_from(self._mm, _HEADER.size + i * _SECTION.size)
+            sections[name] = self._mm[offset:offset + length]
+
+        meta = json.loads(bytes(sections["meta"]).decode("utf-8"))
+        self.sources = meta["sources"]
+        self.info = meta.get("info", {})
+        self.ids = sections["ids"].view("int64")
+        self.vectors = sections["vectors"].view("float32").reshape(count, dim)
+        self.row_source = sections["row_source"].view("int32")
+        self.offsets = sections["text_offsets"].view("int64")
+        self._text = sections["text"]
+
+    def __len__(self):
+        return self.count
+
+    def _decode(self, start, end):
+        return bytes(self._text[start:end]).decode("utf-8")
+
+    def question(self, row):
+        return self._decode(self.offsets[2 * row], self.offsets[2 * row + 1])
+
+    def answer(self, row):
+        return self._decode(self.offsets[2 * row + 1], self.offsets[2 * row + 2])
+
+    def source(self, row):
+        return self.sources[self.row_source[row]]
+
+    def __getitem__(self, row):
+        return self.source(row), self.question(row), self.answer(row)
@@ -0,0 +1,1226 @@
+"""
+RAG Corpus Module for HDingo Backend
+
+This module keeps the retrieval corpus resident in the process. All per-PDF
+shards under ``rag/`` (``<name>.ragstore``, see rag_shard.py, or the legacy
+``<name>.index`` / ``_ids.pkl`` / ``_docs.json`` triple) are loaded once and
+merged into a single FAISS index plus a flat row -> (pdf, question, answer)
+table, so a chat turn costs one ``index.search`` call instead of re-reading
+every shard from disk.
+
+Key Features:
+- One-time load and merge of all RAG shards
+- Single search call over the merged index, and one matrix search for a
+  batch of queries
+- Streaming shard writer: Q&A pairs are embedded and appended in fixed-size
+  batches, so ingestion memory does not grow with the document
+- Incremental document adds and removes: new shards go into an id-mapped
+  delta index, deleted rows are hidden and dropped with remove_ids, so an
+  update costs O(document size) instead of a full re-merge
+- Hybrid retrieval: BM25 over the same Q&A entries (rag_lexical.py) fused
+  with vector results by reciprocal-rank fusion, plus a lexical-only fast path
+- Base and delta results merged lazily through a heap; the delta is skipped
+  when a centroid/radius lower bound shows it cannot reach the top_k
+- Per-snapshot journal replayed by every worker process, with background and
+  periodic compaction into a fresh snapshot
+- Atomic swap of the resident corpus after uploads and deletes
+- Corpus version counter shared between worker processes via a stamp file
+- Read-only snapshot of the merged corpus (FAISS index plus one .ragstore
+  file holding ids, float32 vectors and offset-indexed text) opened with mmap,
+  so worker processes share one physical copy through the page cache and
+  restarts skip the merge
+- Configurable search index type (RAG_INDEX_TYPE): exact flat, IVF-Flat with
+  nprobe, or HNSW with efSearch. Approximate indexes are only trained once the
+  corpus crosses RAG_ANN_MIN_VECTORS; smaller corpora stay exact
+- Optional compressed vector storage (RAG_INDEX_QUANTIZATION): SQ8, fp16 or
+  product quantization, with an exact re-rank of the top candidates
+  (RAG_RERANK_FACTOR) to recover recall
+
+Author: HDingo Team
+Date: 2024
+"""
+
+import contextlib
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import faiss
+import numpy as np
+
+import rag_lexical
+import rag_shard
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads within one process are serialized
+    fcntl = None
+
+# Replaced on every reload so other worker processes notice the corpus changed;
+# holds the name of the current snapshot under SNAPSHOT_DIR
+STAMP_FILE = ".corpus_stamp"
+SNAPSHOT_DIR = "corpus"
+SNAPSHOT_FORMAT = 2
+# Document adds/removes made since a snapshot was built, one JSON op per line
+JOURNAL_FILE = "journal.jsonl"
+# Cross-process locks for journal appends / snapshot swaps and for compaction
+LOCK_FILE = ".corpus_lock"
+COMPACT_LOCK_FILE = ".corpus_compact"
+# Open snapshot indexes memory-mapped so worker processes share one physical copy
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+# Search index configuration
+INDEX_TYPE = os.environ.get("RAG_INDEX_TYPE", "flat")  # flat | ivf | hnsw
+# Below this many vectors the exact flat index is used whatever INDEX_TYPE says
+ANN_MIN_VECTORS = int(os.environ.get("RAG_ANN_MIN_VECTORS", "10000"))
+IVF_NLIST = int(os.environ.get("RAG_IVF_NLIST", "0"))  # 0 = 4 * sqrt(n)
+IVF_NPROBE = int(os.environ.get("RAG_IVF_NPROBE", "16"))
+HNSW_M = int(os.environ.get("RAG_HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("RAG_HNSW_EF_CONSTRUCTION", "80"))
+HNSW_EF_SEARCH = int(os.environ.get("RAG_HNSW_EF_SEARCH", "64"))
+# FAISS wants roughly this many training points per IVF list
+IVF_MIN_POINTS_PER_LIST = 39
+
+# Vector compression: none | sq8 | fp16 | pq
+QUANTIZATION = os.environ.get("RAG_INDEX_QUANTIZATION", "none")
+PQ_M = int(os.environ.get("RAG_PQ_M", "48"))  # sub-quantizers, must divide the dimension
+PQ_NBITS = 8
+# Fetch top_k * factor candidates from a compressed index and re-rank them exactly (0 disables)
+RERANK_FACTOR = int(os.environ.get("RAG_RERANK_FACTOR", "0"))
+# Default maximum L2 distance of vector hits; the only threshold the lexical
+# fast path answers for, since BM25 hits have no distance to compare
+DEFAULT_SCORE_THRESHOLD = 1.0
+
+# Compaction: fold incremental changes into a new snapshot once they reach
+# max(RAG_COMPACT_MIN_CHANGES, RAG_COMPACT_RATIO * base rows), and every
+# RAG_COMPACT_INTERVAL seconds if anything is pending (0 disables the timer)
+COMPACT_MIN_CHANGES = int(os.environ.get("RAG_COMPACT_MIN_CHANGES", "256"))
+COMPACT_RATIO = float(os.environ.get("RAG_COMPACT_RATIO", "0.1"))
+COMPACT_INTERVAL = int(os.environ.get("RAG_COMPACT_INTERVAL", "600"))
+# Q&A pairs embedded and written per batch by the streaming shard writer
+STREAM_BATCH_SIZE = int(os.environ.get("RAG_STREAM_BATCH_SIZE", "256"))
+
+SQ_TYPES = {
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+}
+
+
+def build_index(vectors, index_type=None, min_vectors=None, nlist=None, nprobe=None,
+                hnsw_m=None, ef_construction=None, ef_search=None, quantization=None,
+                pq_m=None):
+    """
+    Build a FAISS L2 index over the given vectors
+
+    Args:
+        vectors (numpy.ndarray): float32 matrix of shape (n, dim)
+        index_type (str): 'flat', 'ivf' or 'hnsw' (defaults to RAG_INDEX_TYPE)
+        min_vectors (int): Corpus size at which approximate or compressed indexes kick in
+        nlist (int): IVF list count (0 derives it from the corpus size)
+        nprobe (int): IVF lists visited per query
+        hnsw_m (int): HNSW graph degree
+        ef_construction (int): HNSW build-time beam width
+        ef_search (int): HNSW query-time beam width
+        quantization (str): 'none', 'sq8', 'fp16' or 'pq' (defaults to RAG_INDEX_QUANTIZATION)
+        pq_m (int): Number of PQ sub-quantizers
+
+    Returns:
+        faiss.Index: Trained index containing all vectors
+    """
+    index_type = index_type or INDEX_TYPE
+    quantization = quantization or QUANTIZATION
+    min_vectors = ANN_MIN_VECTORS if min_vectors is None else min_vectors
+    pq_m = PQ_M if pq_m is None else pq_m
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+
+    if quantization not in ("none", "pq") and quantization not in SQ_TYPES:
+        raise ValueError(f"Unknown RAG index quantization: {quantization}")
+    if n < min_vectors:
+        index_type, quantization = "flat", "none"
+
+    if index_type == "flat":
+        if quantization == "pq":
+            index = faiss.IndexPQ(dim, pq_m, PQ_NBITS)
+        elif quantization in SQ_TYPES:
+            index = faiss.IndexScalarQuantizer(dim, SQ_TYPES[quantization])
+        else:
+            index = faiss.IndexFlatL2(dim)
+    elif index_type == "ivf":
+        nlist = IVF_NLIST if nlist is None else nlist
+        if nlist <= 0:
+            nlist = int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, n // IVF_MIN_POINTS_PER_LIST))
+        quantizer = faiss.IndexFlatL2(dim)
+        if quantization == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, PQ_NBITS)
+        elif quantization in SQ_TYPES:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, SQ_TYPES[quantization])
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        index.nprobe = min(nlist, IVF_NPROBE if nprobe is None else nprobe)
+    elif index_type == "hnsw":
+        hnsw_m = HNSW_M if hnsw_m is None else hnsw_m
+        if quantization == "pq":
+            index = faiss.IndexHNSWPQ(dim, pq_m, hnsw_m)
+        elif quantization in SQ_TYPES:
+            index = faiss.IndexHNSWSQ(dim, SQ_TYPES[quantization], hnsw_m)
+        else:
+            index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION if ef_construction is None else ef_construction
+        index.hnsw.efSearch = HNSW_EF_SEARCH if ef_search is None else ef_search
+    else:
+        raise ValueError(f"Unknown RAG index type: {index_type}")
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def is_exact(index):
+    """True if the index returns exact L2 distances (uncompressed, exhaustive)"""
+    return isinstance(index, faiss.IndexFlatL2)
+
+
+def search_rows_batch(index, queries, k, vectors=None, rerank_factor=None):
+    """
+    Search a batch of queries in one call, optionally re-ranking compressed results exactly
+
+    When ``vectors`` is given, ``k * rerank_factor`` candidates are fetched
+    from the index and re-scored against the uncompressed rows.
+
+    Args:
+        index (faiss.Index): Index to search
+        queries: Query embeddings, shape (n, dim)
+        k (int): Number of results per query
+        vectors (numpy.ndarray): Uncompressed rows for re-ranking, or None
+        rerank_factor (int): Candidate over-fetch factor (defaults to RAG_RERANK_FACTOR)
+
+    Returns:
+        tuple: (distances, rows) - (n, k) arrays sorted by distance per query
+               (rows may contain -1)
+    """
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    rerank_factor = RERANK_FACTOR if rerank_factor is None else rerank_factor
+    if vectors is None or rerank_factor <= 0:
+        return index.search(queries, k)
+
+    _, I = index.search(queries, min(k * rerank_factor, index.ntotal))
+    exact = ((vectors[np.maximum(I, 0)] - queries[:, None, :]) ** 2).sum(axis=2)
+    exact[I < 0] = np.inf
+    order = np.argsort(exact, axis=1)[:, :k]
+    D = np.take_along_axis(exact, order, axis=1)
+    I = np.take_along_axis(I, order, axis=1)
+    I[np.isinf(D)] = -1
+    return D, I
+
+
+def search_rows(index, q_emb, k, vectors=None, rerank_factor=None):
+    """
+    Search one query (see ``search_rows_batch``)
+
+    Returns:
+        tuple: (distances, rows) - 1-D arrays sorted by distance (rows may contain -1)
+    """
+    query = np.asarray(q_emb, dtype="float32").reshape(1, -1)
+    D, I = search_rows_batch(index, query, k, vectors, rerank_factor)
+    return D[0], I[0]
+
+
+def shard_paths(rag_dir, prefix):
+    """
+    Return the legacy (index, ids, docs) file paths of one PDF shard
+    """
+    return (
+        os.path.join(rag_dir, f"{prefix}.index"),
+        os.path.join(rag_dir, f"{prefix}_ids.pkl"),
+        os.path.join(rag_dir, f"{prefix}_docs.json"),
+    )
+
+
+def store_path(rag_dir, prefix):
+    """
+    Return the .ragstore path of one PDF shard
+    """
+    return os.path.join(rag_dir, f"{prefix}{rag_shard.EXTENSION}")
+
+
+def legacy_id(doc_id):
+    """
+    Derive a stable int64 row id from a legacy string id such as 'qa_91a2d6bc'
+    """
+    return int(hashlib.sha1(doc_id.encode("utf-8")).hexdigest()[:15], 16)
+
+
+def write_shard(rag_dir, prefix, docs, vectors, ids=None):
+    """
+    Write one PDF shard as a single .ragstore file
+
+    Shards store the exact float32 vectors: they are the source of truth that
+    the resident corpus merges and re-indexes.
+
+    Args:
+        rag_dir (str): Directory holding the RAG files
+        prefix (str): PDF name without extension
+        docs (list): Q&A dicts (question, answer, optional source), row-aligned with vectors
+        vectors (numpy.ndarray): float32 matrix of shape (len(docs), dim)
+        ids (array-like): int64 row ids (new random ids if omitted)
+
+    Returns:
+        str: Path of the written store
+    """
+    path = store_path(rag_dir, prefix)
+    info = {prefix: docs[0].get("source", {})} if docs else {}
+    rag_shard.write_store(
+        path,
+        rag_shard.new_ids(len(docs)) if ids is None else ids,
+        vectors,
+        [d["question"] for d in docs],
+        [d["answer"] for d in docs],
+        [prefix],
+        info=info,
+    )
+    return path
+
+
+def embed_batches(docs, encode_fn, batch_size=STREAM_BATCH_SIZE):
+    """
+    Group Q&A dicts into fixed-size batches and embed each batch
+
+    Args:
+        docs (iterable): Q&A dicts (question, answer), e.g. a generator
+        encode_fn (callable): Encodes a list of texts into a float32 matrix
+        batch_size (int): Q&A pairs per batch
+
+    Yields:
+        tuple: (docs, vectors) for each batch
+    """
+    docs = iter(docs)
+    while True:
+        batch = list(itertools.islice(docs, batch_size))
+        if not batch:
+            return
+        yield batch, encode_fn([d["question"] + " " + d["answer"] for d in batch])
+
+
+def write_shard_stream(rag_dir, prefix, batches, source=None):
+    """
+    Write one PDF shard from a stream of (docs, vectors) batches
+
+    Only one batch is held in memory at a time. Nothing is written if the
+    stream turns out to be empty, so an existing shard of the same name is
+    left in place.
+
+    Args:
+        rag_dir (str): Directory holding the RAG files
+        prefix (str): PDF name without extension
+        batches (iterable): (docs, vectors) pairs, e.g. from embed_batches
+        source (dict): Document source (title, url, last_edited)
+
+    Returns:
+        tuple: (path, count) - path of the written store and the number of rows
+    """
+    path = store_path(rag_dir, prefix)
+    writer = rag_shard.StoreWriter(path, [prefix], info={prefix: source or {}})
+    try:
+        for docs, vectors in batches:
+            writer.append(
+                rag_shard.new_ids(len(docs)),
+                vectors,
+                [d["question"] for d in docs],
+                [d["answer"] for d in docs],
+            )
+    except BaseException:
+        writer.abort()
+        raise
+    if not writer.count:
+        writer.abort()
+        return path, 0
+    writer.close()
+    return path, writer.count
+
+
+def remove_shard(rag_dir, prefix):
+    """
+    Delete every file (store or legacy triple) belonging to one PDF shard
+
+    Returns:
+        list: Paths that were removed
+    """
+    removed = []
+    for path in (store_path(rag_dir, prefix),) + shard_paths(rag_dir, prefix):
+        if os.path.isfile(path):
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+def load_legacy_shard(rag_dir, prefix):
+    """
+    Load a shard stored as the legacy .index / _ids.pkl / _docs.json triple
+
+    Returns:
+        tuple: (ids, vectors, entries) or None if the shard is missing
+    """
+    idx_path, ids_path, docs_path = shard_paths(rag_dir, prefix)
+    if not (os.path.exists(idx_path) and os.path.exists(ids_path) and os.path.exists(docs_path)):
+        return None
+
+    index = faiss.read_index(idx_path)
+    with open(ids_path, "rb") as f:
+        ids = pickle.load(f)
+    with open(docs_path, "r", encoding="utf-8") as f:
+        docs = json.load(f)
+    doc_map = {d["id"]: d for d in docs}
+
+    vectors = index.reconstruct_n(0, index.ntotal)
+    entries = []
+    for doc_id in ids[:index.ntotal]:
+        entry = doc_map.get(doc_id, {})
+        entries.append((prefix, entry.get("question", ""), entry.get("answer", "")))
+    row_ids = np.array([legacy_id(doc_id) for doc_id in ids[:index.ntotal]], dtype="int64")
+    return row_ids, vectors, entries
+
+
+def load_shard(rag_dir, prefix):
+    """
+    Load the ids, vectors and Q&A entries of one PDF shard
+
+    Prefers the .ragstore file and falls back to the legacy triple for
+    directories that have not been migrated yet.
+
+    Args:
+        rag_dir (str): Directory holding the RAG files
+        prefix (str): PDF name without extension
+
+    Returns:
+        tuple: (ids, vectors, entries) - int64 ids, float32 matrix and list of
+               (pdf, question, answer), or None if the shard is missing
+    """
+    path = store_path(rag_dir, prefix)
+    if not os.path.exists(path):
+        return load_legacy_shard(rag_dir, prefix)
+    store = rag_shard.RagStoreFile(path)
+    entries = [(prefix, store.question(row), store.answer(row)) for row in range(len(store))]
+    return np.array(store.ids), np.array(store.vectors), entries
+
+
+def merge_shards(rag_dir, pdf_names):
+    """
+    Load and concatenate the shards of the given PDFs
+
+    Args:
+        rag_dir (str): Directory holding the RAG files
+        pdf_names (list): PDF names (without extension) to include
+
+    Returns:
+        tuple: (ids, matrix, entries) - int64 ids and float32 matrix (both None
+               if no shard exists) and row-aligned list of (pdf, question, answer)
+    """
+    id_blocks = []
+    blocks = []
+    entries = []
+    for prefix in pdf_names:
+        shard = load_shard(rag_dir, prefix)
+        if shard is None:
+            continue
+        ids, vectors, shard_entries = shard
+        if not len(shard_entries):
+            continue
+        id_blocks.append(ids)
+        blocks.append(vectors)
+        entries.extend(shard_entries)
+
+    if not blocks:
+        return None, None, []
+    matrix = np.ascontiguousarray(np.vstack(blocks), dtype="float32")
+    return np.concatenate(id_blocks), matrix, entries
+
+
+def shard_manifest(rag_dir, pdf_names):
+    """
+    Map each existing shard to the mtime of its store (or legacy index) file
+
+    Used to tell whether a saved snapshot still matches the shards on disk.
+    """
+    shards = {}
+    for prefix in pdf_names:
+        for path in (store_path(rag_dir, prefix), shard_paths(rag_dir, prefix)[0]):
+            try:
+                shards[prefix] = os.stat(path).st_mtime_ns
+                break
+            except FileNotFoundError:
+                continue
+    return shards
+
+
+class _Lazy:
+    """Thread-safe value built on first use"""
+
+    def __init__(self, build):
+        self._build = build
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._build()
+        return self._value
+
+
+class RagCorpus:
+    """
+    Merged view over every RAG shard: an immutable base index plus small
+    incremental changes
+
+    Row ``i`` of ``index`` corresponds to ``entries[i]``. Documents added since
+    the base was built live in ``delta`` (an exact, id-mapped flat index), and
+    base rows of deleted or replaced documents are listed in ``removed`` and
+    filtered out of results. Instances are never mutated after construction;
+    ``apply_changes`` returns a new instance that shares the base.
+
+    ``vectors`` holds the uncompressed float32 rows only when exact re-ranking
+    of an approximate or compressed index is enabled.
+    """
+
+    def __init__(self, index, entries, version=0, vectors=None, shards=None):
+        self.index = index
+        self.entries = entries
+        self.version = version
+        self.vectors = vectors
+        # Shard -> store mtime this corpus reflects (base plus applied changes)
+        self.shards = dict(shards or {})
+        self.delta = None
+        self.delta_entries = {}
+        self.delta_ids = {}
+        # pdf -> (centroid, radius) of its delta vectors, for skipping the delta
+        self.delta_bounds = {}
+        self.removed = np.empty(0, dtype="int64")
+        # Byte offset up to which the snapshot journal has been applied
+        self.journal_pos = 0
+        # BM25 indexes, built on the first lexical query. The base one is shared
+        # by every corpus derived from this one through apply_changes
+        self._base_lexical = _Lazy(self._build_base_lexical)
+        self._delta_lexical = _Lazy(self._build_delta_lexical)
+
+    @classmethod
+    def load(cls, rag_dir, pdf_names, version=0):
+        """
+        Load and merge the shards of the given PDFs into memory
+
+        Args:
+            rag_dir (str): Directory holding the RAG files
+            pdf_names (list): PDF names (without extension) to include
+            version (int): Corpus version to tag the instance with
+
+        Returns:
+            RagCorpus: Merged corpus (empty if no shard exists)
+        """
+        _, matrix, entries = merge_shards(rag_dir, pdf_names)
+        if matrix is None:
+            return cls(None, [], version)
+
+        index = build_index(matrix)
+        vectors = matrix if RERANK_FACTOR > 0 and not is_exact(index) else None
+        return cls(index, entries, version, vectors, shard_manifest(rag_dir, pdf_names))
+
+    @staticmethod
+    def write_snapshot(path, index, ids, matrix, entries, shards):
+        """
+        Write a corpus snapshot directory that workers can open with mmap
+
+        Layout: ``index.faiss`` (search index), ``corpus.ragstore`` (ids,
+        float32 rows and Q&A text of the merged corpus) and ``manifest.json``
+        written last, so a directory without a manifest is known to be incomplete.
+        Changes made after the snapshot are appended to ``journal.jsonl``.
+        """
+        os.makedirs(path, exist_ok=True)
+        faiss.write_index(index, os.path.join(path, "index.faiss"))
+
+        sources = []
+        source_pos = {}
+        row_source = np.empty(len(entries), dtype="int32")
+        for row, (pdf, _, _) in enumerate(entries):
+            if pdf not in source_pos:
+                source_pos[pdf] = len(sources)
+                sources.append(pdf)
+            row_source[row] = source_pos[pdf]
+        rag_shard.write_store(
+            os.path.join(path, "corpus" + rag_shard.EXTENSION),
+            ids,
+            matrix,
+            [e[1] for e in entries],
+            [e[2] for e in entries],
+            sources,
+            row_source,
+        )
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "count": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]),
+            "shards": shards,
+        }
+        with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+
+    @staticmethod
+    def read_manifest(path):
+        try:
+            with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return manifest if manifest.get("format") == SNAPSHOT_FORMAT else None
+
+    @classmethod
+    def open_snapshot(cls, path, version=0, shards=None):
+        """
+        Open a snapshot read-only with the index, vectors and text memory-mapped
+
+        Returns:
+            RagCorpus: Corpus whose large arrays live in the shared page cache
+        """
+        index = faiss.read_index(os.path.join(path, "index.faiss"), MMAP_FLAGS)
+        entries = rag_shard.RagStoreFile(os.path.join(path, "corpus" + rag_shard.EXTENSION))
+        vectors = entries.vectors if RERANK_FACTOR > 0 and not is_exact(index) else None
+        return cls(index, entries, version, vectors, shards)
+
+    def _base_rows(self, pdf):
+        """Rows of the base index that belong to one PDF"""
+        if isinstance(self.entries, rag_shard.RagStoreFile):
+            if pdf not in self.entries.sources:
+                return np.empty(0, dtype="int64")
+            return np.flatnonzero(self.entries.row_source == self.entries.sources.index(pdf))
+        return np.array([row for row, entry in enumerate(self.entries) if entry[0] == pdf], dtype="int64")
+
+    def apply_changes(self, rag_dir, ops, version, journal_pos=None):
+        """
+        Return a new corpus with document adds and removes applied
+
+        Each op re-syncs one PDF with its shard on disk: the PDF's base rows
+        are hidden, its previous delta vectors are dropped with ``remove_ids``
+        and, for 'add', the current shard is added with its stable ids. The
+        cost is proportional to the changed documents, not the corpus, and
+        replaying an op twice gives the same result.
+
+        Args:
+            rag_dir (str): Directory holding the RAG files
+            ops (list): Dicts with 'op' ('add' or 'remove') and 'pdf'
+            version (int): Version of the new corpus
+            journal_pos (int): Journal offset the new corpus reflects
+
+        Returns:
+            RagCorpus: Updated corpus sharing this corpus' base index
+        """
+        corpus = RagCorpus(self.index, self.entries, version, self.vectors, self.shards)
+        corpus.delta = faiss.clone_index(self.delta) if self.delta is not None else None
+        corpus.delta_entries = dict(self.delta_entries)
+        corpus.delta_ids = dict(self.delta_ids)
+        corpus.delta_bounds = dict(self.delta_bounds)
+        corpus.journal_pos = self.journal_pos if journal_pos is None else journal_pos
+        corpus._base_lexical = self._base_lexical
+
+        removed = [self.removed]
+        for op in ops:
+            pdf = op["pdf"]
+            removed.append(self._base_rows(pdf))
+            corpus.shards.pop(pdf, None)
+            corpus.delta_bounds.pop(pdf, None)
+            old_ids = corpus.delta_ids.pop(pdf, None)
+            if old_ids is not None:
+                corpus.delta.remove_ids(old_ids)
+                for doc_id in old_ids.tolist():
+                    corpus.delta_entries.pop(doc_id, None)
+            if op["op"] != "add":
+                continue
+
+            mtime = shard_manifest(rag_dir, [pdf]).get(pdf)
+            shard = load_shard(rag_dir, pdf)
+            if shard is None or not len(shard[2]):
+                continue
+            ids, vectors, entries = shard
+            if corpus.delta is None:
+                corpus.delta = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+            corpus.delta.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), ids)
+            corpus.delta_ids[pdf] = ids
+            centroid = vectors.mean(axis=0)
+            corpus.delta_bounds[pdf] = (centroid, float(np.linalg.norm(vectors - centroid, axis=1).max()))
+            corpus.delta_entries.update(zip(ids.tolist(), entries))
+            corpus.shards[pdf] = mtime
+        corpus.removed = np.unique(np.concatenate(removed))
+        return corpus
+
+    @property
+    def pending(self):
+        """Number of rows changed since the base index was built"""
+        return len(self.removed) + (self.delta.ntotal if self.delta is not None else 0)
+
+    def needs_compaction(self):
+        """True once pending changes are large enough to fold into a new base"""
+        return self.pending >= max(COMPACT_MIN_CHANGES, COMPACT_RATIO * len(self.entries))
+
+    def __len__(self):
+        return len(self.entries) - len(self.removed) + (self.delta.ntotal if self.delta is not None else 0)
+
+    @property
+    def index_type(self):
+        """FAISS class name of the search index (None for an empty corpus)"""
+        return type(self.index).__name__ if self.index is not None else None
+
+    def delta_lower_bound(self, q_emb):
+        """
+        Smallest L2 distance any delta vector can have to the query
+
+        Each added document is summarized by the centroid and radius of its
+        vectors; by the triangle inequality no vector of that document is
+        closer than ``|q - centroid| - radius``.
+
+        Returns:
+            float: Squared-L2 lower bound (inf if the delta is empty)
+        """
+        if not self.delta_bounds:
+            return math.inf
+        query = np.asarray(q_emb, dtype="float32").reshape(-1)
+        centroids = np.stack([c for c, _ in self.delta_bounds.values()])
+        radii = np.array([r for _, r in self.delta_bounds.values()], dtype="float32")
+        gaps = np.maximum(np.linalg.norm(centroids - query, axis=1) - radii, 0.0)
+        return float(gaps.min()) ** 2
+
+    def _search_base(self, queries, top_k):
+        if self.index is None or len(self.entries) <= len(self.removed):
+            return [[] for _ in queries]
+        # Over-fetch by the number of hidden rows so filtering never drops below top_k
+        k = min(top_k + len(self.removed), len(self.entries))
+        D, I = search_rows_batch(self.index, queries, k, self.vectors)
+        results = []
+        for dists, rows in zip(D, I):
+            if len(self.removed):
+                keep = ~np.isin(rows, self.removed)
+                dists, rows = dists[keep], rows[keep]
+            results.append([
+                (float(dist), self.entries[row]) for dist, row in zip(dists[:top_k], rows[:top_k]) if row >= 0
+            ])
+        return results
+
+    def _search_delta(self, queries, top_k):
+        D, I = self.delta.search(queries, min(top_k, self.delta.ntotal))
+        return [
+            [(float(dist), self.delta_entries[int(doc_id)]) for dist, doc_id in zip(dists, ids) if doc_id >= 0]
+            for dists, ids in zip(D, I)
+        ]
+
+    def search_batch(self, q_embs, top_k=10, score_threshold=1.0):
+        """
+        Retrieve the closest Q&A entries for many query embeddings at once
+
+        The base index is searched with one matrix call. The delta is only
+        searched for queries whose delta lower bound can beat both the score
+        threshold and their k-th base hit, and each query's two sorted result
+        lists are merged lazily so only the global top_k are materialized.
+
+        Args:
+            q_embs: Query embeddings, shape (n, dim)
+            top_k (int): Maximum number of hits per query
+            score_threshold (float): Maximum L2 distance kept
+
+        Returns:
+            list: One list of hit dicts (score, pdf, question, answer) per query,
+                  sorted by distance
+        """
+        queries = np.ascontiguousarray(np.atleast_2d(q_embs), dtype="float32")
+        base = self._search_base(queries, top_k)
+        delta = [[] for _ in queries]
+        if self.delta is not None and self.delta.ntotal:
+            todo = []
+            for i, hits in enumerate(base):
+                cutoff = min(score_threshold, hits[top_k - 1][0]) if len(hits) >= top_k else score_threshold
+                if self.delta_lower_bound(queries[i]) <= cutoff:
+                    todo.append(i)
+            if todo:
+                for i, hits in zip(todo, self._search_delta(queries[todo], top_k)):
+                    delta[i] = hits
+
+        results = []
+        for base_hits, delta_hits in zip(base, delta):
+            hits = []
+            merged = heapq.merge(base_hits, delta_hits, key=lambda c: c[0])
+            for dist, (pdf, question, answer) in itertools.islice(merged, top_k):
+                if dist > score_threshold:
+                    break
+                hits.append({
+                    "score": dist,
+                    "pdf": pdf,
+                    "question": question,
+                    "answer": answer,
+                })
+            results.append(hits)
+        return results
+
+    def search(self, q_emb, top_k=10, score_threshold=1.0):
+        """
+        Retrieve the closest Q&A entries for a query embedding
+
+        Args:
+            q_emb: Query embedding, shape (dim,) or (1, dim)
+            top_k (int): Maximum number of hits
+            score_threshold (float): Maximum L2 distance kept
+
+        Returns:
+            list: Hit dicts (score, pdf, question, answer) sorted by distance
+        """
+        query = np.asarray(q_emb, dtype="float32").reshape(1, -1)
+        return self.search_batch(query, top_k, score_threshold)[0]
+
+    def _build_base_lexical(self):
+        if isinstance(self.entries, rag_shard.RagStoreFile):
+            texts = (self.entries.question(row) + " " + self.entries.answer(row) for row in range(len(self.entries)))
+        else:
+            texts = (question + " " + answer for _, question, answer in self.entries)
+        return rag_lexical.BM25Index(list(texts))
+
+    def _build_delta_lexical(self):
+        # Score the delta with the base statistics so both score lists can be merged
+        reference = self._base_lexical.get() if self.index is not None and len(self.entries) else None
+        entries = list(self.delta_entries.values())
+        texts = [question + " " + answer for _, question, answer in entries]
+        return rag_lexical.BM25Index(texts, reference=reference), entries
+
+    def lexical_search(self, terms, top_k=10):
+        """
+        Rank entries by BM25 over their question and answer text
+
+        Base and delta entries are scored with the same collection
+        statistics, so their scores are merged directly.
+
+        Args:
+            terms (list): Query terms from ``rag_lexical.tokenize``
+            top_k (int): Maximum number of results
+
+        Returns:
+            list: (bm25 score, (pdf, question, answer)) pairs, best first
+        """
+        if not terms:
+            return []
+        results = []
+        if self.index is not None and len(self.entries):
+            scores, rows = self._base_lexical.get().search(terms, top_k, self.removed)
+            results.extend((float(score), self.entries[row]) for score, row in zip(scores, rows))
+        if self.delta_entries:
+            index, entries = self._delta_lexical.get()
+            scores, docs = index.search(terms, top_k)
+            results.extend((float(score), entries[doc]) for score, doc in zip(scores, docs))
+        results.sort(key=lambda r: -r[0])
+        return results[:top_k]
+
+    def lexical_match(self, text, top_k=10, score_threshold=DEFAULT_SCORE_THRESHOLD):
+        """
+        Lexical-only fast path for exact-term lookups
+
+        Hits carry no vector distance (score is None), so a caller asking
+        for any threshold other than DEFAULT_SCORE_THRESHOLD always gets
+        None and the thresholded hybrid search instead. Only entries that
+        contain every query term are returned, as in ``hybrid_search_batch``.
+
+        Args:
+            text (str): Normalized question
+            top_k (int): Maximum number of hits
+            score_threshold (float): The caller's maximum L2 distance
+
+        Returns:
+            list: Hit dicts if the best BM25 match is confident (see
+                  ``rag_lexical.is_confident``), otherwise None and the caller
+                  falls back to embedding the question
+        """
+        if not rag_lexical.FAST_PATH or score_threshold != DEFAULT_SCORE_THRESHOLD:
+            return None
+        terms = rag_lexical.tokenize(text)
+        results = self.lexical_search(terms, top_k)
+        if not rag_lexical.is_confident(terms, results, top_k):
+            return None
+        return [
+            {"score": None, "bm25": score, "pdf": pdf, "question": question, "answer": answer}
+            for score, (pdf, question, answer) in rag_lexical.full_matches(terms, results)
+        ]
+
+    def hybrid_search_batch(self, texts, q_embs, top_k=10, score_threshold=1.0):
+        """
+        Vector search fused with BM25 through reciprocal-rank fusion
+
+        Both rankings contribute ``top_k * RAG_HYBRID_DEPTH`` candidates.
+        Vector candidates must pass ``score_threshold``; lexical-only
+        candidates must contain every query term, so a single common word
+        does not pull in unrelated entries. Falls back to plain vector search
+        when RAG_HYBRID is off.
+
+        Args:
+            texts (list): Question text per query
+            q_embs: Query embeddings, shape (n, dim)
+            top_k (int): Maximum number of hits per query
+            score_threshold (float): Maximum L2 distance of vector candidates
+
+        Returns:
+            list: One list of hit dicts (score, bm25, rrf, pdf, question, answer)
+                  per query, best first; score or bm25 is None when the entry
+                  came from only one ranking
+        """
+        if not rag_lexical.HYBRID:
+            return self.search_batch(q_embs, top_k, score_threshold)
+
+        depth = top_k * max(1, rag_lexical.CANDIDATE_DEPTH)
+        results = []
+        for text, vector_hits in zip(texts, self.search_batch(q_embs, depth, score_threshold)):
+            terms = rag_lexical.tokenize(text)
+            distances = {(h["pdf"], h["question"], h["answer"]): h["score"] for h in vector_hits}
+            bm25 = {entry: score for score, entry in self.lexical_search(terms, depth)}
+
+            hits = []
+            for entry, rrf in rag_lexical.rrf_fuse([list(distances), list(bm25)], depth):
+                if entry not in distances and not rag_lexical.contains_all(terms, entry[1] + " " + entry[2]):
+                    continue
+                pdf, question, answer = entry
+                hits.append({
+                    "score": distances.get(entry),
+                    "bm25": bm25.get(entry),
+                    "rrf": rrf,
+                    "pdf": pdf,
+                    "question": question,
+                    "answer": answer,
+                })
+                if len(hits) == top_k:
+                    break
+            results.append(hits)
+        return results
+
+    def hybrid_search(self, text, q_emb, top_k=10, score_threshold=1.0):
+        """
+        Hybrid retrieval for one query (see ``hybrid_search_batch``)
+        """
+        query = np.asarray(q_emb, dtype="float32").reshape(1, -1)
+        return self.hybrid_search_batch([text], query, top_k, score_threshold)[0]
+
+
+class CorpusManager:
+    """
+    Holds the process-resident corpus and swaps it when the RAG files change
+
+    Readers call ``get()`` and keep the returned instance for the duration of
+    their query, so a concurrent update never changes a corpus mid-search.
+
+    Uploads and deletes call ``add_document()`` / ``remove_document()``, which
+    append an op to the current snapshot's journal and touch the stamp file.
+    Every worker replays new journal ops onto its resident corpus, so an update
+    costs O(document size). Compaction folds the journal into a new snapshot
+    in a background thread once enough changes pile up, and periodically.
+    """
+
+    def __init__(self, rag_dir, list_names):
+        """
+        Args:
+            rag_dir (str): Directory holding the RAG files
+            list_names (callable): Returns the PDF names that make up the corpus
+        """
+        self.rag_dir = rag_dir
+        self._list_names = list_names
+        self._corpus = None
+        self._token = None
+        self._stamp = None
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+        self._compactor_pid = None
+
+    @property
+    def version(self):
+        """Version of the currently resident corpus (0 before the first load)"""
+        corpus = self._corpus
+        return corpus.version if corpus is not None else 0
+
+    def _read_stamp(self):
+        try:
+            return os.stat(os.path.join(self.rag_dir, STAMP_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _read_token(self):
+        try:
+            with open(os.path.join(self.rag_dir, STAMP_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    def _write_token(self, token):
+        stamp_path = os.path.join(self.rag_dir, STAMP_FILE)
+        tmp_path = f"{stamp_path}.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(token)
+        os.replace(tmp_path, stamp_path)
+
+    @contextlib.contextmanager
+    def _file_lock(self, name=LOCK_FILE, blocking=True):
+        """
+        Hold an exclusive lock shared by all worker processes
+
+        Yields False instead of waiting when ``blocking`` is off and another
+        process holds the lock. Without fcntl (Windows) only threads are serialized.
+        """
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.rag_dir, name), "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _snapshot_path(self, token):
+        return os.path.join(self.rag_dir, SNAPSHOT_DIR, token)
+
+    def _read_journal(self, token, pos):
+        """
+        Read complete journal ops after a byte offset
+
+        Returns:
+            tuple: (ops, new offset)
+        """
+        try:
+            with open(os.path.join(self._snapshot_path(token), JOURNAL_FILE), "rb") as f:
+                f.seek(pos)
+                data = f.read()
+        except FileNotFoundError:
+            return [], pos
+        end = data.rfind(b"\n") + 1
+        ops = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return ops, pos + end
+
+    def _append_journal(self, token, ops):
+        with open(os.path.join(self._snapshot_path(token), JOURNAL_FILE), "a", encoding="utf-8") as f:
+            for op in ops:
+                f.write(json.dumps(op) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _remove_stale_snapshots(self, keep):
+        """
+        Delete snapshot directories other than the tokens in keep
+
+        The caller keeps the new and the previous snapshot, so a process that
+        read the previous token just before the swap can still open it.
+        """
+        root = os.path.join(self.rag_dir, SNAPSHOT_DIR)
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            # Directories without a manifest may still be written by another process
+            if name in keep or RagCorpus.read_manifest(path) is None:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _publish_snapshot(self):
+        """
+        Merge every shard into a new snapshot and make it the current one
+
+        The merge runs without holding the cross-process lock. Shards that
+        changed on disk while it ran are written to the new snapshot's journal
+        as ops before the stamp file is replaced, so concurrent updates are
+        never lost.
+        """
+        names = self._list_names()
+        shards = shard_manifest(self.rag_dir, names)
+        ids, matrix, entries = merge_shards(self.rag_dir, names)
+        token = ""
+        if matrix is not None:
+            token = f"{time.time_ns():x}-{os.getpid()}"
+            RagCorpus.write_snapshot(self._snapshot_path(token), build_index(matrix), ids, matrix, entries, shards)
+
+        with self._file_lock():
+            current = shard_manifest(self.rag_dir, self._list_names())
+            changed = sorted(pdf for pdf in set(shards) | set(current) if shards.get(pdf) != current.get(pdf))
+            if not token and changed:
+                retry = True
+            else:
+                retry = False
+                if token:
+                    self._append_journal(token, [
+                        {"op": "add" if pdf in current else "remove", "pdf": pdf} for pdf in changed
+                    ])
+                previous = self._read_token()
+                self._write_token(token)
+                if os.path.isdir(os.path.join(self.rag_dir, SNAPSHOT_DIR)):
+                    self._remove_stale_snapshots(keep={token, previous})
+        if retry:
+            # Shards appeared while building an empty corpus; merge again
+            self._publish_snapshot()
+
+    def _open(self, version, verify=True):
+        """
+        Open the current snapshot (or catch up on its journal) and swap it in
+
+        Returns:
+            RagCorpus: The corpus, or None if the snapshot is missing or no
+                       longer matches the shards on disk
+        """
+        stamp = self._read_stamp()
+        token = self._read_token()
+        corpus = self._corpus
+        try:
+            if token and corpus is not None and token == self._token:
+                ops, pos = self._read_journal(token, corpus.journal_pos)
+                corpus = corpus.apply_changes(self.rag_dir, ops, version, pos)
+            elif token:
+                path = self._snapshot_path(token)
+                manifest = RagCorpus.read_manifest(path)
+                if manifest is None:
+                    if self._read_token() != token:
+                        raise FileNotFoundError(path)
+                    return None
+                ops, pos = self._read_journal(token, 0)
+                corpus = RagCorpus.open_snapshot(path, version, manifest["shards"])
+                corpus = corpus.apply_changes(self.rag_dir, ops, version, pos)
+            else:
+                corpus = RagCorpus(None, [], version)
+        except (FileNotFoundError, RuntimeError):
+            # Two newer snapshots were published while this one was loading
+            # (only the current and previous ones are kept) and its directory
+            # is gone; faiss reports a missing file as RuntimeError. Open the
+            # new one
+            if self._read_token() == token:
+                raise
+            return self._open(version, verify)
+
+        # A process opening its first snapshot checks it against the shards on disk
+        if verify and self._corpus is None and corpus.shards != shard_manifest(self.rag_dir, self._list_names()):
+            return None
+        self._token = token
+        self._stamp = stamp
+        self._corpus = corpus
+        return corpus
+
+    def _load(self, version):
+        corpus = self._open(version)
+        if corpus is None:
+            self._publish_snapshot()
+            corpus = self._open(version, verify=False)
+        return corpus
+
+    def _start_compactor(self):
+        if COMPACT_INTERVAL <= 0 or self._compactor_pid == os.getpid():
+            return
+        self._compactor = threading.Thread(target=self._compact_loop, name="rag-compactor", daemon=True)
+        self._compactor_pid = os.getpid()
+        self._compactor.start()
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(COMPACT_INTERVAL)
+            try:
+                if self.get().pending:
+                    self.compact()
+            except Exception as e:
+                print(f"Warning: RAG corpus compaction failed: {str(e)}")
+
+    def get(self):
+        """
+        Return the resident corpus, opening the current snapshot on first use
+        or catching up after another worker process has replaced the stamp file
+        """
+        corpus = self._corpus
+        if corpus is not None and self._stamp == self._read_stamp():
+            return corpus
+        with self._lock:
+            self._start_compactor()
+            if self._corpus is None or self._stamp != self._read_stamp():
+                return self._load(self.version + 1)
+            return self._corpus
+
+    def _update(self, op, pdf):
+        with self._lock:
+            with self._file_lock():
+                token = self._read_token()
+                if token:
+                    self._append_journal(token, [{"op": op, "pdf": pdf}])
+                    self._write_token(token)
+            if not token:
+                # No snapshot to journal against yet: build the first one
+                self._publish_snapshot()
+            corpus = self._load(self.version + 1)
+        if corpus.needs_compaction():
+            self.compact_async()
+        return corpus
+
+    def add_document(self, pdf):
+        """
+        Add (or replace) one PDF's shard in the corpus incrementally
+
+        Args:
+            pdf (str): PDF name without extension; its shard must already be written
+
+        Returns:
+            RagCorpus: The newly resident corpus
+        """
+        return self._update("add", pdf)
+
+    def remove_document(self, pdf):
+        """
+        Remove one PDF's rows from the corpus incrementally
+
+        Args:
+            pdf (str): PDF name without extension
+
+        Returns:
+            RagCorpus: The newly resident corpus
+        """
+        return self._update("remove", pdf)
+
+    def compact(self):
+        """
+        Fold pending changes into a fresh snapshot
+
+        Skipped when another thread or worker process is already compacting.
+        Workers open the new snapshot on their next query.
+
+        Returns:
+            bool: True if a new snapshot was published
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._file_lock(COMPACT_LOCK_FILE, blocking=False) as locked:
+                if not locked:
+                    return False
+                self._publish_snapshot()
+                return True
+        finally:
+            self._compact_lock.release()
+
+    def compact_async(self):
+        """Run ``compact()`` in a background thread"""
+        threading.Thread(target=self.compact, name="rag-compact", daemon=True).start()
+
+    def reload(self):
+        """
+        Rebuild the corpus from all shards, write a new snapshot and swap it in
+
+        Replacing the stamp file makes other worker processes open the new
+        snapshot on their next query.
+
+        Returns:
+            RagCorpus: The newly resident corpus
+        """
+        with self._lock:
+            self._publish_snapshot()
+            return self._load(self.version + 1)
@@ -7,60 +7,311 @@ various similarity metrics to find the most relevant recipes based on user queri
 
 Key Features:
 - Keyword extraction from text using database keywords
+- In-process keyword vocabulary, re-read only after the keyword table changes
+- Aho-Corasick matching of every keyword in one pass over the query, and an
+  n-gram index for partial matches, built once per vocabulary version
 - Multi-hot encoding for keyword representation
+- Stable keyword ids (all_keywords.id) as the document and query encoding
 - Jaccard and cosine similarity calculations
 - Combined similarity scoring with keyword and title matching
 - Vector normalization for consistent comparison
+- Inverted keyword/title index, so search scores only candidate documents
 
 Author: Capstone Project Team
 Date: 2024
 Version: 1.0
 """
 
+import functools
+import os
 import re
+import threading
+import time
+from collections import deque
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 import database
 
+# Seconds a cached vocabulary is trusted without a local change; keywords
+# added by another worker process are picked up within this window
+VOCABULARY_TTL = float(os.environ.get("KEYWORD_VOCABULARY_TTL", "30"))
+# Seconds the cached document index is trusted without a local change
+DOCUMENT_INDEX_TTL = float(os.environ.get("SEARCH_INDEX_TTL", "30"))
+# Longest n-gram indexed for partial matching
+NGRAM_SIZE = 3
+
+class KeywordMatcher:
+    """
+    Multi-pattern matcher over lowercase keywords
+    
+    exact() runs an Aho-Corasick automaton, so every keyword occurring in a
+    text is found in one pass over the text regardless of vocabulary size.
+    containing() finds the keywords that contain a word through an index of
+    each keyword's 1- to NGRAM_SIZE-grams instead of scanning the vocabulary.
+    """
+    
+    def __init__(self, lowered):
+        """
+        Args:
+            lowered (list): Lowercase keywords; results are their positions
+        """
+        # Trie: per state a char -> state dict, the keywords ending there,
+        # the failure link and the nearest failure-chain state with output
+        self._goto = [{}]
+        self._out = [[]]
+        self._always = []  # empty keywords occur in every text
+        for i, pattern in enumerate(lowered):
+            if not pattern:
+                self._always.append(i)
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(i)
+        
+        self._fail = [0] * len(self._goto)
+        self._dict_link = [-1] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = fail
+                self._dict_link[nxt] = fail if self._out[fail] else self._dict_link[fail]
+                queue.append(nxt)
+        
+        self._lowered = lowered
+        self._grams = {}
+        for i, pattern in enumerate(lowered):
+            grams = set()
+            for n in range(1, NGRAM_SIZE + 1):
+                grams.update(pattern[j:j + n] for j in range(len(pattern) - n + 1))
+            for gram in grams:
+                self._grams.setdefault(gram, set()).add(i)
+    
+    def exact(self, text):
+        """
+        Return the positions of the keywords occurring in text, in order
+        
+        Args:
+            text (str): Lowercase text
+            
+        Returns:
+            list: Sorted keyword positions
+        """
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        found = set(self._always)
+        visited = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            # Each output chain is collected once, keeping the pass linear
+            match = state if out[state] else dict_link[state]
+            while match > 0 and match not in visited:
+                visited.add(match)
+                found.update(out[match])
+                match = dict_link[match]
+        return sorted(found)
+    
+    def containing(self, word):
+        """
+        Return the positions of the keywords that contain word, in order
+        
+        Args:
+            word (str): Lowercase, non-empty word
+            
+        Returns:
+            list: Sorted keyword positions
+        """
+        if len(word) <= NGRAM_SIZE:
+            return sorted(self._grams.get(word, ()))
+        postings = []
+        for j in range(len(word) - NGRAM_SIZE + 1):
+            posting = self._grams.get(word[j:j + NGRAM_SIZE])
+            if not posting:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return sorted(i for i in candidates if word in self._lowered[i])
+
+class Vocabulary:
+    """
+    Immutable snapshot of the keyword vocabulary
+    
+    Attributes:
+        keywords (list): Keywords in table order (multi-hot positions)
+        index (dict): Keyword -> position in the multi-hot encoding
+        ids (dict): Keyword -> stable all_keywords id (the position if no
+                    ids were given)
+        lowered (list): Lowercase form of each keyword, for matching
+        version (int): Incremented every time the vocabulary changes
+    """
+    
+    def __init__(self, keywords, version=0, ids=None):
+        self.keywords = list(keywords)
+        self.index = {}
+        for i, keyword in enumerate(self.keywords):
+            self.index.setdefault(keyword, i)
+        self.ids = dict(zip(self.keywords, ids)) if ids is not None else dict(self.index)
+        self.lowered = [keyword.lower() for keyword in self.keywords]
+        self.version = version
+    
+    def __len__(self):
+        return len(self.keywords)
+    
+    @functools.cached_property
+    def matcher(self):
+        """KeywordMatcher over the lowercase keywords, built on first use"""
+        return KeywordMatcher(self.lowered)
+
+class TableCache:
+    """
+    Process-wide cache of a snapshot built from a database read
+    
+    The snapshot is read once and then only again after invalidate() (called
+    by the database functions that change the underlying table) or once it is
+    older than the TTL. After invalidate() the next get() waits for the new
+    snapshot; once only the TTL has expired, get() keeps returning the current
+    snapshot while a background thread reads the next one, so readers never
+    wait for a rebuild. Subclasses implement _read().
+    """
+    
+    def __init__(self, initial, ttl):
+        self.ttl = ttl
+        self.last_error = None
+        self._snapshot = initial
+        self._loaded_at = None
+        self._invalidations = 0
+        self._lock = threading.Lock()
+    
+    def _read(self, current):
+        """
+        Read the table and return (snapshot, error); current is the cached snapshot
+        """
+        raise NotImplementedError
+    
+    def get(self):
+        """
+        Return the current snapshot, reading the table if needed
+        
+        Returns:
+            The current snapshot (the previous one if the read fails)
+        """
+        loaded_at = self._loaded_at
+        if loaded_at is not None:
+            if time.monotonic() - loaded_at >= self.ttl and self._lock.acquire(blocking=False):
+                threading.Thread(target=self._refresh, name=f"{type(self).__name__}-refresh", daemon=True).start()
+            return self._snapshot
+        with self._lock:
+            if self._loaded_at is not None:
+                return self._snapshot
+            return self._reload(retry_later=False)
+    
+    def _refresh(self):
+        """Re-read an expired snapshot (runs with _lock acquired by get())"""
+        try:
+            self._reload(retry_later=True)
+        finally:
+            self._lock.release()
+    
+    def _reload(self, retry_later):
+        """Read the table into the snapshot (caller holds _lock)"""
+        invalidations = self._invalidations
+        snapshot, error = self._read(self._snapshot)
+        self.last_error = error
+        if error:
+            # Keep serving the expired snapshot and try again after another TTL
+            # rather than re-reading on every request while the database is down
+            if retry_later and invalidations == self._invalidations:
+                self._loaded_at = time.monotonic()
+            return self._snapshot
+        self._snapshot = snapshot
+        # A change committed while reading may be missing; read again next time
+        if invalidations == self._invalidations:
+            self._loaded_at = time.monotonic()
+        return self._snapshot
+    
+    def invalidate(self):
+        """
+        Mark the cached snapshot stale after the table changed
+        """
+        self._invalidations += 1
+        self._loaded_at = None
+
+class KeywordVocabulary(TableCache):
+    """
+    Process-wide cache of the all_keywords table
+    
+    Invalidated by the database functions that add or remove keywords.
+    """
+    
+    def __init__(self, ttl=VOCABULARY_TTL):
+        super().__init__(Vocabulary([]), ttl)
+    
+    def _read(self, current):
+        entries, error = database.get_keyword_ids_from_db()
+        if error:
+            return None, error
+        keywords = [keyword for keyword, _ in entries]
+        ids = [keyword_id for _, keyword_id in entries]
+        if keywords == current.keywords and ids == [current.ids[k] for k in current.keywords]:
+            return current, None
+        return Vocabulary(keywords, current.version + 1, ids), None
+
+keyword_vocabulary = KeywordVocabulary()
+
 def get_all_keywords():
     """
-    Retrieve all keywords from the database
+    Retrieve all keywords (from the in-process vocabulary cache)
     
     Returns:
         list: List of all available keywords from the database
     """
-    keywords, error = database.get_all_keywords_from_db()
-    if error:
-        return []
-    return keywords
+    return list(keyword_vocabulary.get().keywords)
 
-def extract_keywords(text):
+def extract_keywords(text, vocabulary=None):
     """
     Extract relevant keywords from input text using database keywords
     
     Args:
         text (str): Input text to extract keywords from
+        vocabulary (Vocabulary): Vocabulary snapshot; the cached one if omitted
         
     Returns:
         list: List of extracted keywords
     """
     keywords = []
     text_lower = text.lower()
-    all_keywords = get_all_keywords()
+    if vocabulary is None:
+        vocabulary = keyword_vocabulary.get()
     
     # First try to match exact keywords from database
-    for keyword in all_keywords:
-        if keyword.lower() in text_lower:
-            keywords.append(keyword)
+    matcher = vocabulary.matcher
+    for i in matcher.exact(text_lower):
+        keywords.append(vocabulary.keywords[i])
     
-    # If no exact matches found, try partial matching
+    # If no exact matches found, try partial matching. Every word is part of
+    # the text, so no keyword can lie inside a word here (it would have
+    # matched exactly); only keywords containing a word remain
     if not keywords:
-        words = re.findall(r'\b\w+\b', text.lower())
+        words = re.findall(r'\b\w+\b', text_lower)
         for word in words:
-            for keyword in all_keywords:
-                if word in keyword.lower() or keyword.lower() in word:
-                    if keyword not in keywords:
-                        keywords.append(keyword)
+            for i in matcher.containing(word):
+                keyword = vocabulary.keywords[i]
+                if keyword not in keywords:
+                    keywords.append(keyword)
         
         # If still no matches, return input words but limit quantity
         if not keywords:
@@ -68,24 +319,43 @@ def extract_keywords(text):
     
     return keywords
 
-def multi_hot_encode(keywords):
+def multi_hot_encode(keywords, all_keywords=None):
     """
     Convert keywords list to multi-hot encoded vector
     
     Args:
         keywords (list): List of keywords to encode
+        all_keywords (Vocabulary or list): Keyword vocabulary; the cached one if omitted
         
     Returns:
         list: Binary encoded vector where 1 indicates presence of keyword
     """
-    all_keywords = get_all_keywords()
+    if all_keywords is None:
+        all_keywords = keyword_vocabulary.get()
+    elif not isinstance(all_keywords, Vocabulary):
+        all_keywords = Vocabulary(all_keywords)
     encoded = [0] * len(all_keywords)
     for keyword in keywords:
-        if keyword in all_keywords:
-            idx = all_keywords.index(keyword)
+        idx = all_keywords.index.get(keyword)
+        if idx is not None:
             encoded[idx] = 1
     return encoded
 
+def encode_keyword_ids(keywords, vocabulary=None):
+    """
+    Convert keywords list to the sorted list of their stable keyword ids
+    
+    Args:
+        keywords (list): List of keywords to encode
+        vocabulary (Vocabulary): Vocabulary snapshot; the cached one if omitted
+        
+    Returns:
+        list: Keyword ids of the keywords in the vocabulary
+    """
+    if vocabulary is None:
+        vocabulary = keyword_vocabulary.get()
+    return sorted({vocabulary.ids[k] for k in keywords if k in vocabulary.ids})
+
 def normalize_encoded_vector(encoded_vector, target_length):
     """
     Normalize encoded vector to target length
@@ -170,3 +440,209 @@ def calculate_similarity(query_encoded, db_encoded, query_text, db_title):
     
     # Ensure minimum threshold
     return final_score if final_score > 0.05 else 0.0
+
+def title_words(text):
+    """
+    Return the set of lowercase words of a title or query
+    """
+    return set(re.findall(r'\b\w+\b', text.lower()))
+
+class DocumentIndex:
+    """
+    Inverted index over all searchable documents, for candidate-only scoring
+    
+    Maps keyword ids and title words to the ids of the documents that have
+    them. calculate_similarity is 0 for a document sharing neither with the
+    query, so score() only visits documents reached through the query's
+    postings, and search cost grows with the number of matching documents
+    rather than the corpus size.
+    
+    add() and remove() update the index in place for single uploads and
+    deletes. Posting sets are replaced rather than mutated, so concurrent
+    searches never see a set change size under them, and a document removed
+    mid-search is either skipped or scored from its complete postings.
+    """
+    
+    def __init__(self, documents=()):
+        """
+        Args:
+            documents (list): Rows from database.get_pdf_documents_for_search,
+                              each with a 'keyword_ids' list
+        """
+        self.documents = {}
+        self._terms = {}
+        self._lock = threading.Lock()
+        keyword_postings = {}
+        title_postings = {}
+        for doc in documents:
+            document_id = doc["id"]
+            keyword_ids = frozenset(doc.get("keyword_ids") or ())
+            words = frozenset(title_words(doc["title"]))
+            self.documents[document_id] = doc
+            self._terms[document_id] = (keyword_ids, words)
+            for keyword_id in keyword_ids:
+                keyword_postings.setdefault(keyword_id, set()).add(document_id)
+            for word in words:
+                title_postings.setdefault(word, set()).add(document_id)
+        self.keyword_postings = {k: frozenset(v) for k, v in keyword_postings.items()}
+        self.title_postings = {w: frozenset(v) for w, v in title_postings.items()}
+    
+    def __len__(self):
+        return len(self.documents)
+    
+    @staticmethod
+    def _post(postings, key, document_id, add):
+        posting = postings.get(key, frozenset())
+        posting = posting | {document_id} if add else posting - {document_id}
+        if posting:
+            postings[key] = posting
+        else:
+            postings.pop(key, None)
+    
+    def add(self, doc):
+        """
+        Add a document (replacing any document with the same id)
+        
+        Args:
+            doc (dict): Row as from database.get_pdf_documents_for_search
+        """
+        with self._lock:
+            self._remove(doc["id"])
+            document_id = doc["id"]
+            keyword_ids = frozenset(doc.get("keyword_ids") or ())
+            words = frozenset(title_words(doc["title"]))
+            for keyword_id in keyword_ids:
+                self._post(self.keyword_postings, keyword_id, document_id, True)
+            for word in words:
+                self._post(self.title_postings, word, document_id, True)
+            # Terms go last, so score() only scores it with the row in place
+            self.documents[document_id] = doc
+            self._terms[document_id] = (keyword_ids, words)
+    
+    def remove(self, document_id):
+        """
+        Remove a document by id (no-op if it is not indexed)
+        """
+        with self._lock:
+            self._remove(document_id)
+    
+    def _remove(self, document_id):
+        terms = self._terms.pop(document_id, None)
+        if terms is None:
+            return
+        # Terms go first: score() skips candidates without them
+        keyword_ids, words = terms
+        for keyword_id in keyword_ids:
+            self._post(self.keyword_postings, keyword_id, document_id, False)
+        for word in words:
+            self._post(self.title_postings, word, document_id, False)
+        del self.documents[document_id]
+    
+    def score(self, query_ids, query_text):
+        """
+        Score the documents that share a keyword or title word with a query
+        
+        Args:
+            query_ids (list): Keyword ids of the query (see encode_keyword_ids)
+            query_text (str): Original query text
+            
+        Returns:
+            tuple: (document ids, scores) - numpy arrays ordered by document
+                   id; every other document scores 0. A document removed
+                   while scoring is either skipped or scored in full, and
+                   may be gone from self.documents afterwards
+        """
+        query_ids = set(query_ids)
+        query_words = title_words(query_text)
+        common = {}
+        for keyword_id in query_ids:
+            for document_id in self.keyword_postings.get(keyword_id, ()):
+                common[document_id] = common.get(document_id, 0) + 1
+        common_words = {}
+        for word in query_words:
+            for document_id in self.title_postings.get(word, ()):
+                common_words[document_id] = common_words.get(document_id, 0) + 1
+        
+        # _remove() drops a document's terms before its postings, so a
+        # document whose terms are still here after the postings were read
+        # had complete postings when they were read
+        candidates = []
+        counts = []
+        for document_id in sorted(common.keys() | common_words.keys()):
+            terms = self._terms.get(document_id)
+            if terms is not None:
+                candidates.append(document_id)
+                counts.append(len(terms[0]))
+        document_ids = np.array(candidates, dtype=np.int64)
+        if not candidates:
+            return document_ids, np.zeros(0)
+        shared = np.array([common.get(d, 0) for d in candidates], dtype=np.float64)
+        counts = np.array(counts, dtype=np.float64)
+        
+        # Same blend as calculate_similarity, on keyword sets as multi-hot vectors
+        union = len(query_ids) + counts - shared
+        jaccard = np.divide(shared, union, out=np.zeros(len(candidates)), where=union > 0)
+        cosine = np.zeros(len(candidates))
+        if query_ids:
+            np.divide(shared, np.sqrt(counts), out=cosine, where=counts > 0)
+            cosine /= np.sqrt(len(query_ids))
+        keyword_sim = 0.7 * jaccard + 0.3 * cosine
+        if query_words:
+            title_sim = np.array([common_words.get(d, 0) for d in candidates], dtype=np.float64) / len(query_words)
+        else:
+            title_sim = np.zeros(len(candidates))
+        
+        final_score = 0.75 * keyword_sim + 0.25 * title_sim
+        return document_ids, np.where(final_score > 0.05, final_score, 0.0)
+    
+    @staticmethod
+    def top(document_ids, scores, k, min_score):
+        """
+        Return the k best scores above min_score
+        
+        Ties keep document id order, like a stable sort over the table.
+        
+        Returns:
+            list: (document id, score) pairs, best first
+        """
+        rows = np.flatnonzero(scores > min_score)
+        if len(rows) > k:
+            candidate = scores[rows]
+            kth = candidate[np.argpartition(-candidate, k - 1)[k - 1]]
+            above = rows[candidate > kth]
+            rows = np.concatenate([above, rows[candidate == kth][:k - len(above)]])
+        rows = rows[np.lexsort((rows, -scores[rows]))]
+        return [(int(document_ids[row]), float(scores[row])) for row in rows]
+
+class DocumentIndexCache(TableCache):
+    """
+    Process-wide cache of the DocumentIndex over pdf_documents
+    
+    Single uploads and deletes in this process are applied to the cached
+    index in place (update()); other changes invalidate it.
+    """
+    
+    def __init__(self, ttl=DOCUMENT_INDEX_TTL):
+        super().__init__(None, ttl)
+    
+    def _read(self, current):
+        documents, error = database.get_pdf_documents_for_search()
+        if error:
+            return None, error
+        return DocumentIndex(documents), None
+    
+    def update(self, added=(), removed=()):
+        """
+        Apply added documents and removed document ids to the cached index
+        """
+        # A reload already reading the table may predate this change
+        self._invalidations += 1
+        index = self._snapshot
+        if index is None:
+            return
+        for document_id in removed:
+            index.remove(document_id)
+        for doc in added:
+            index.add(doc)
+
+document_index = DocumentIndexCache()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""
+Database Pool Stress Test - Per-Call Connections vs. Connection Pool Tool
+
+Runs the same database.py workload from many threads twice: once opening and
+closing a MySQL connection per call (the behaviour before db_pool, DB_POOL=0)
+and once borrowing from the connection pool.
+
+Key features include:
+
+1. Concurrent Callers: N threads issuing the reads a chat turn makes
+   (get_user, session_exists, get_messages_db, get_sessions_db)
+2. Before/After: The same workload without and with pooling, against the
+   database configured in backend/database.py
+3. Latency Percentiles: p50, p95 and p99 per call, throughput and errors
+4. Pool Metrics: Open connections, peak in use, waits and wait time from
+   ConnectionPool.stats()
+
+Usage:
+- python db_pool_stress_test.py --users 50 --calls 200
+- python db_pool_stress_test.py --pool-size 10 --max-overflow 20 --user-id z1234567
+- python db_pool_stress_test.py --host db.staging --port 3306
+
+Version: 1.0
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import database  # noqa: E402
+import db_pool  # noqa: E402
+
+
+def workload(user_id, session_id):
+    """The database reads of one chat turn"""
+    return [
+        lambda: database.get_user(user_id),
+        lambda: database.session_exists(session_id),
+        lambda: database.get_messages_db(session_id),
+        lambda: database.get_sessions_db(user_id),
+    ]
+
+
+def run(pool, users, calls, user_id, session_id):
+    """
+    Run users threads of calls database calls each through pool
+
+    Returns:
+        tuple: (latencies in seconds, errors, wall time, pool stats)
+    """
+    database.pool = pool
+    latencies = [[] for _ in range(users)]
+    errors = [0] * users
+    barrier = threading.Barrier(users + 1)
+
+    def user(index):
+        steps = workload(user_id, session_id)
+        barrier.wait()
+        for i in range(calls):
+            start = time.perf_counter()
+            try:
+                steps[i % len(steps)]()
+            except Exception:
+                errors[index] += 1
+                continue
+            latencies[index].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    stats = pool.stats()
+    pool.close_all()
+    return np.array([x for per_user in latencies for x in per_user]), sum(errors), wall, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress database.py with and without connection pooling")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent threads")
+    parser.add_argument("--calls", type=int, default=200, help="Database calls per thread")
+    parser.add_argument("--pool-size", type=int, default=db_pool.POOL_SIZE)
+    parser.add_argument("--max-overflow", type=int, default=db_pool.MAX_OVERFLOW)
+    parser.add_argument("--user-id", default="admin", help="Existing user_info.user_id to read")
+    parser.add_argument("--session-id", default="stress-test-session", help="Session id to read")
+    parser.add_argument("--host", default=None, help="Database host (default: database.db_config)")
+    parser.add_argument("--port", type=int, default=None, help="Database port")
+    args = parser.parse_args()
+    if args.host:
+        database.db_config["host"] = args.host
+    if args.port:
+        database.db_config["port"] = args.port
+
+    print("Database Pool Stress Test")
+    print("=" * 60)
+    print(f"Database: {database.db_config['user']}@{database.db_config['host']}:{database.db_config.get('port', 3306)}"
+          f"/{database.db_config['database']}")
+    print(f"Users: {args.users}, calls per user: {args.calls}, "
+          f"pool size: {args.pool_size}, max overflow: {args.max_overflow}")
+    print("=" * 60)
+    print(f"{'mode':>10}{'calls/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'errors':>8}")
+
+    pooled = None
+    for mode, enabled in (("per-call", False), ("pooled", True)):
+        pool = db_pool.ConnectionPool(database.get_db_connection, size=args.pool_size,
+                                      max_overflow=args.max_overflow, enabled=enabled)
+        latencies, errors, wall, stats = run(pool, args.users, args.calls, args.user_id, args.session_id)
+        if not len(latencies):
+            print(f"{mode:>10}  every call failed ({errors} errors) - is MySQL running?")
+            continue
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        print(f"{mode:>10}{len(latencies) / wall:>10.0f}{p50:>7.2f} ms{p95:>7.2f} ms{p99:>7.2f} ms"
+              f"{latencies.max() * 1000:>7.1f} ms{errors:>8}")
+        if enabled:
+            pooled = stats
+    print("=" * 60)
+    if pooled:
+        print("Pool metrics:")
+        for key, value in pooled.items():
+            print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Embedding Batch Benchmark - Query Encoding Throughput Tool
+
+Compares the throughput of encoding single questions one-by-one against the
+micro-batching queue in backend/embedding.py when many users ask at once.
+
+Key features include:
+
+1. Concurrent Callers: Simulates N threads each encoding single questions, as
+   /api/aichat/rag, /api/ask and /api/aichat/checklist do
+2. Direct vs Batched: Runs the same workload through EmbeddingEncoder and
+   EmbeddingBatcher
+3. Configurable Batching: --max-batch-size and --max-wait-ms mirror the
+   EMBED_BATCH_MAX_SIZE / EMBED_BATCH_MAX_WAIT_MS settings
+
+Usage:
+- python embedding_batch_benchmark.py --users 50 --questions 20
+
+Version: 1.0
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import embedding  # noqa: E402
+
+QUESTIONS = [
+    "My account has expired, what should I do?",
+    "How do I get software installed on a lab machine?",
+    "Why can't I log in to a CSE computer?",
+    "How do I change file permissions on my home directory?",
+    "What is a courtesy account?",
+    "How do I request a group account?",
+    "My account was disabled, how do I get it back?",
+    "How much disk quota do student accounts get?",
+]
+
+
+def run_workload(encode, users, questions_per_user):
+    latencies = []
+    lock = threading.Lock()
+
+    def user(user_id):
+        local = []
+        for i in range(questions_per_user):
+            question = QUESTIONS[(user_id + i) % len(QUESTIONS)]
+            start = time.perf_counter()
+            encode([question])
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(users)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+    }
+
+
+def print_result(name, result):
+    print(f"{name}:")
+    print(f"  Elapsed: {result['elapsed']:.2f}s")
+    print(f"  Throughput: {result['throughput']:.1f} questions/s")
+    print(f"  Latency p50: {result['p50_ms']:.1f}ms, p95: {result['p95_ms']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark one-by-one vs micro-batched query encoding")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=20, help="Questions per user")
+    parser.add_argument("--max-batch-size", type=int, default=embedding.BATCH_MAX_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=embedding.BATCH_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    print("Embedding Batch Benchmark")
+    print("=" * 60)
+    encoder = embedding.get_encoder()
+    encoder.warmup()
+    batcher = embedding.EmbeddingBatcher(encoder, args.max_batch_size, args.max_wait_ms)
+
+    print(f"Users: {args.users}, questions per user: {args.questions}")
+    print(f"Batching: max {args.max_batch_size} items / {args.max_wait_ms}ms")
+    print("=" * 60)
+
+    direct = run_workload(encoder.encode, args.users, args.questions)
+    print_result("One-by-one (EmbeddingEncoder)", direct)
+    batched = run_workload(batcher.encode, args.users, args.questions)
+    print_result("Micro-batched (EmbeddingBatcher)", batched)
+
+    stats = batcher.stats()
+    print(f"  Batches: {stats['batches']}, avg size: {stats['avg_batch_size']:.1f}, largest: {stats['largest_batch']}")
+    if direct["throughput"] > 0:
+        print(f"\nSpeedup: {batched['throughput'] / direct['throughput']:.2f}x")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
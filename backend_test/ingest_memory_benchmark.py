@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""
+Ingestion Memory Benchmark - Streaming vs. In-Memory Pipeline Tool
+
+Compares peak memory of the two ingestion paths for one PDF:
+
+- in-memory: extract_text -> parse_qa_pairs -> encode all texts -> write_shard
+  (the whole text, every Q&A dict and the full embedding matrix at once)
+- streaming: iter_pages -> iter_lines -> iter_qa_pairs -> embed_batches ->
+  write_shard_stream (one page and one embedding batch at a time)
+
+Key features include:
+
+1. Synthetic Handbooks: Generated PDFs of several page counts, so growth
+   with document size is visible
+2. Isolation: Each path runs in its own forked process
+3. Metrics: tracemalloc peak (Python and numpy allocations), peak RSS and time
+4. Correctness: Both paths must write identical shard contents
+5. Encoders: Deterministic random vectors (pipeline memory only, default) or
+   the real embedding model
+
+Usage:
+- python ingest_memory_benchmark.py --pages 100 400 1000
+- python ingest_memory_benchmark.py --encoder model --backend pdfium
+
+Version: 1.0
+"""
+
+import argparse
+import hashlib
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import pdf_extract  # noqa: E402
+import qa_parser  # noqa: E402
+import rag_shard  # noqa: E402
+import rag_store  # noqa: E402
+from pdf_extract_benchmark import synthetic_pdf  # noqa: E402
+
+DIM = 384
+
+
+def random_encode(texts):
+    """Deterministic per-text unit vectors, standing in for the model"""
+    out = np.empty((len(texts), DIM), dtype="float32")
+    for i, text in enumerate(texts):
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        v = np.random.default_rng(seed).standard_normal(DIM)
+        out[i] = v / np.linalg.norm(v)
+    return out
+
+
+def get_encode(name):
+    if name == "model":
+        import embedding
+        return embedding.get_encoder().encode
+    return random_encode
+
+
+def in_memory_path(pdf_path, out_dir, encode, backend, batch_size):
+    text = pdf_extract.extract_text(pdf_path, workers=1, backend=backend)
+    docs = qa_parser.parse_qa_pairs(text)
+    vectors = encode([d["question"] + " " + d["answer"] for d in docs])
+    rag_store.write_shard(out_dir, "doc", docs, vectors)
+    return len(docs)
+
+
+def streaming_path(pdf_path, out_dir, encode, backend, batch_size):
+    pages = pdf_extract.iter_pages(pdf_path, workers=1, backend=backend)
+    qa = qa_parser.iter_qa_pairs(qa_parser.iter_lines(pages))
+    batches = rag_store.embed_batches(qa, encode, batch_size)
+    _, count = rag_store.write_shard_stream(out_dir, "doc", batches)
+    return count
+
+
+PATHS = {"in-memory": in_memory_path, "streaming": streaming_path}
+
+
+def _child(conn, path_name, pdf_path, out_dir, encoder, backend, batch_size):
+    encode = get_encode(encoder)
+    encode(["warm up"])
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = PATHS[path_name](pdf_path, out_dir, encode, backend, batch_size)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KiB on Linux
+    conn.send((count, peak, rss, elapsed))
+    conn.close()
+
+
+def run_isolated(path_name, pdf_path, out_dir, encoder, backend, batch_size):
+    """Run one path in a fresh forked process; returns (entries, tracemalloc peak, peak RSS, seconds)"""
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=_child, args=(child, path_name, pdf_path, out_dir, encoder, backend, batch_size))
+    proc.start()
+    result = parent.recv()
+    proc.join()
+    return result
+
+
+def shard_contents(path):
+    store = rag_shard.RagStoreFile(path)
+    return [store[row][1:] for row in range(len(store))], np.array(store.vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark peak memory of streaming vs in-memory ingestion")
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 400])
+    parser.add_argument("--backend", default=pdf_extract.BACKEND, choices=list(pdf_extract.BACKENDS))
+    parser.add_argument("--encoder", default="random", choices=["random", "model"])
+    parser.add_argument("--batch-size", type=int, default=rag_store.STREAM_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print("Ingestion Memory Benchmark")
+    print("=" * 60)
+    print(f"Extractor: {args.backend}, encoder: {args.encoder}, stream batch size: {args.batch_size}")
+    print("=" * 60)
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        print(f"{'pages':>6}{'Q&A':>7}  {'path':<11}{'traced peak':>13}{'peak RSS':>11}{'time':>9}")
+        for pages in args.pages:
+            pdf_path = synthetic_pdf(os.path.join(tmp_dir, f"handbook_{pages}.pdf"), pages)
+            contents = {}
+            for name in PATHS:
+                out_dir = os.path.join(tmp_dir, f"{name}_{pages}")
+                os.makedirs(out_dir)
+                count, peak, rss, elapsed = run_isolated(
+                    name, pdf_path, out_dir, args.encoder, args.backend, args.batch_size
+                )
+                contents[name] = shard_contents(rag_store.store_path(out_dir, "doc"))
+                print(f"{pages:>6}{count:>7}  {name:<11}{peak / 2**20:>10.1f} MB"
+                      f"{rss / 2**20:>8.1f} MB{elapsed:>8.2f}s")
+            (rows_a, vecs_a), (rows_b, vecs_b) = contents.values()
+            if rows_a != rows_b or not np.array_equal(vecs_a, vecs_b):
+                print("       (SHARD MISMATCH between the two paths)")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
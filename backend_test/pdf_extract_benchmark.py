@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+"""
+PDF Extraction Benchmark - Page-Parallel Text Extraction Tool
+
+Compares serial pdfplumber extraction with the page-parallel process pool in
+backend/pdf_extract.py, on the PDFs in backend/pdfs/ and on a synthetic
+multi-page handbook.
+
+Key features include:
+
+1. Real Documents: Every PDF in backend/pdfs/ (small; mostly below the threshold)
+2. Synthetic Handbook: Generated N-page PDF with numbered Q&A headings
+3. Worker Sweep: Serial vs. 2, 4, ... pool workers, pool warmed up first
+4. Correctness: Checks the parallel text is identical to the serial text
+
+Usage:
+- python pdf_extract_benchmark.py --pages 500 --workers 2 4
+
+Version: 1.0
+"""
+
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import pdf_extract  # noqa: E402
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def synthetic_pdf(path, pages, questions_per_page=6):
+    """
+    Write a plain-text PDF shaped like a taggi handbook: numbered question
+    headings followed by answer paragraphs
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for p in range(pages):
+        lines = []
+        for q in range(questions_per_page):
+            n = p * questions_per_page + q + 1
+            lines.append(f"{n}: How do I configure service {n} on a CSE machine?")
+            lines.append(f"Log in to a lab machine and run the setup command for service {n}.")
+            lines.append(f"Contact the helpdesk if service {n} still reports a quota or permission error.")
+            lines.append("")
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+        for line in lines:
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def time_extract(path, workers, repeat):
+    best = None
+    text = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = pdf_extract.extract_text(path, workers=workers, min_pages=0)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs page-parallel PDF extraction")
+    parser.add_argument("--pdf-dir", default=os.path.join(BACKEND_DIR, "pdfs"))
+    parser.add_argument("--pages", type=int, default=500, help="Pages in the synthetic PDF (0 to skip)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    print("PDF Extraction Benchmark")
+    print("=" * 60)
+    print(f"CPU cores: {os.cpu_count()}, pool sizes: {args.workers}, "
+          f"production threshold: {pdf_extract.PARALLEL_MIN_PAGES} pages")
+    print("=" * 60)
+
+    paths = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if args.pages > 0:
+        tmp_dir = tempfile.mkdtemp()
+        paths.append(synthetic_pdf(os.path.join(tmp_dir, f"synthetic_{args.pages}_pages.pdf"), args.pages))
+
+    serial = {}
+    for path in paths:
+        serial[path] = time_extract(path, 1, args.repeat)
+
+    parallel = {}
+    for workers in args.workers:
+        # Start the pool up front so fork cost is not charged to the first file
+        pdf_extract._get_pool(workers).submit(int).result()
+        for path in paths:
+            parallel[path, workers] = time_extract(path, workers, args.repeat)
+
+    header = f"{'file':<42}{'pages':>6}{'serial':>10}"
+    for workers in args.workers:
+        header += f"{f'{workers} workers':>17}"
+    print(header)
+    for path in paths:
+        elapsed, reference = serial[path]
+        line = f"{os.path.basename(path)[:40]:<42}{pdf_extract.page_count(path):>6}{elapsed:>9.3f}s"
+        for workers in args.workers:
+            t, text = parallel[path, workers]
+            line += f"{t:>9.3f}s x{elapsed / t:4.1f}"
+            if text != reference:
+                line += " (TEXT MISMATCH)"
+        print(line)
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+PDF Extractor Benchmark - Backend Speed and Q&A Fidelity Tool
+
+Runs every extractor backend in backend/pdf_extract.py over the PDFs in
+backend/pdfs/ and reports extraction speed alongside how many Q&A pairs
+parse_qa_pairs finds in each backend's text, so the fastest backend that
+keeps the Q&A structure can be chosen for PDF_EXTRACT_BACKEND.
+
+Key features include:
+
+1. Speed: Pages per second for each backend and PDF (serial, best of N runs)
+2. Fidelity: Q&A pair count per backend, and how many of pdfplumber's
+   questions the backend reproduces exactly
+3. Synthetic Handbook: Optional generated N-page PDF (--pages)
+4. Recommendation: Fastest backend that loses no Q&A pairs on any PDF
+
+Usage:
+- python pdf_extractor_benchmark.py
+- python pdf_extractor_benchmark.py --backends pdfplumber pdfium --pages 100
+
+Version: 1.0
+"""
+
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import pdf_extract  # noqa: E402
+from pdf_extract_benchmark import synthetic_pdf  # noqa: E402
+from qa_parser import parse_qa_pairs  # noqa: E402
+
+REFERENCE = "pdfplumber"
+
+
+def run_backend(path, backend, repeat):
+    """Extract one PDF serially; returns (best seconds, Q&A pairs)"""
+    best = None
+    text = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = pdf_extract.extract_text(path, workers=1, backend=backend)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, parse_qa_pairs(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF extractor backends for speed and Q&A fidelity")
+    parser.add_argument("--pdf-dir", default=os.path.join(BACKEND_DIR, "pdfs"))
+    parser.add_argument("--backends", nargs="+", default=list(pdf_extract.BACKENDS),
+                        choices=list(pdf_extract.BACKENDS))
+    parser.add_argument("--pages", type=int, default=0, help="Also run a synthetic N-page PDF (0 to skip)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    backends = [REFERENCE] + [b for b in args.backends if b != REFERENCE]
+
+    print("PDF Extractor Benchmark")
+    print("=" * 60)
+    print(f"Backends: {', '.join(backends)} (reference: {REFERENCE}), best of {args.repeat} runs")
+    print("=" * 60)
+
+    paths = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if args.pages > 0:
+        tmp_dir = tempfile.mkdtemp()
+        paths.append(synthetic_pdf(os.path.join(tmp_dir, f"synthetic_{args.pages}_pages.pdf"), args.pages))
+    if not paths:
+        print(f"No PDFs found in {args.pdf_dir}")
+        return
+
+    totals = {b: [0.0, 0] for b in backends}  # seconds, pages
+    lossless = {b: True for b in backends}
+
+    print(f"{'file':<36}{'backend':<12}{'pages':>6}{'pages/s':>10}{'Q&A':>6}{'same Q':>10}")
+    for path in paths:
+        pages = pdf_extract.page_count(path)
+        reference_questions = None
+        for backend in backends:
+            elapsed, qa = run_backend(path, backend, args.repeat)
+            questions = [d["question"] for d in qa]
+            if reference_questions is None:
+                reference_questions = set(questions)
+            same = len(reference_questions & set(questions))
+            if same < len(reference_questions):
+                lossless[backend] = False
+            totals[backend][0] += elapsed
+            totals[backend][1] += pages
+            print(f"{os.path.basename(path)[:34]:<36}{backend:<12}{pages:>6}{pages / elapsed:>10.1f}"
+                  f"{len(qa):>6}{f'{same}/{len(reference_questions)}':>10}")
+
+    print("=" * 60)
+    print(f"{'backend':<12}{'pages/s':>10}{'speedup':>10}  keeps all Q&A")
+    reference_rate = totals[REFERENCE][1] / totals[REFERENCE][0]
+    for backend in backends:
+        seconds, pages = totals[backend]
+        rate = pages / seconds
+        print(f"{backend:<12}{rate:>10.1f}{rate / reference_rate:>9.1f}x  {'yes' if lossless[backend] else 'no'}")
+
+    candidates = [b for b in backends if lossless[b]]
+    fastest = max(candidates, key=lambda b: totals[b][1] / totals[b][0])
+    print("=" * 60)
+    print(f"Fastest backend without Q&A loss: {fastest} (PDF_EXTRACT_BACKEND={fastest})")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+Quantization Benchmark - RAG Index Memory and Recall Tool
+
+Reports bytes per vector and recall loss of the compressed index options in
+backend/rag_store.py (SQ8, fp16, PQ) against the exact float32 flat index,
+with and without the exact re-rank over the top candidates.
+
+Key features include:
+
+1. Memory: Serialized index size per vector, i.e. what each worker holds in RSS
+2. Recall: recall@k against exact flat search on the same queries
+3. Re-rank: Same recall measured after re-scoring k * factor candidates exactly
+4. Index Types: Every quantization is measured on the flat, ivf and hnsw layouts
+
+Usage:
+- python quantization_benchmark.py --vectors 50000 --queries 300 --rerank-factor 4
+
+Version: 1.0
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+import rag_store  # noqa: E402
+from ann_benchmark import synthetic_corpus, recall_at_k  # noqa: E402
+
+
+def run_queries(index, queries, k, vectors=None, rerank_factor=0):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        _, rows = rag_store.search_rows(index, q, k, vectors, rerank_factor)
+        results.append(np.pad(rows, (0, k - len(rows)), constant_values=-1))
+    elapsed = time.perf_counter() - start
+    return np.array(results), elapsed / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQ8 / fp16 / PQ memory and recall")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pq-m", type=int, default=rag_store.PQ_M)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--index-types", nargs="+", default=["flat", "ivf", "hnsw"])
+    args = parser.parse_args()
+
+    print("Quantization Benchmark")
+    print("=" * 60)
+    print(f"Vectors: {args.vectors:,}, dim: {args.dim}, queries: {args.queries}, k: {args.k}")
+    print(f"Re-rank factor: {args.rerank_factor} (re-rank keeps {args.dim * 4} bytes/vector of float32 rows)")
+    print("=" * 60)
+
+    data = synthetic_corpus(args.vectors + args.queries, args.dim, args.clusters)
+    corpus, queries = data[:args.vectors], data[args.vectors:]
+
+    exact = rag_store.build_index(corpus, index_type="flat", quantization="none")
+    truth, _ = run_queries(exact, queries, args.k)
+
+    print(f"{'index':<8}{'quant':<7}{'bytes/vec':>10}{'recall':>9}{'ms/query':>10}"
+          f"{'rerank recall':>15}{'ms/query':>10}")
+    for index_type in args.index_types:
+        for quantization in ["none", "fp16", "sq8", "pq"]:
+            index = rag_store.build_index(corpus, index_type=index_type, quantization=quantization,
+                                          min_vectors=0, pq_m=args.pq_m)
+            bytes_per_vector = len(faiss.serialize_index(index)) / index.ntotal
+
+            found, ms = run_queries(index, queries, args.k)
+            recall = recall_at_k(truth, found)
+            line = f"{index_type:<8}{quantization:<7}{bytes_per_vector:>10.1f}{recall:>9.3f}{ms:>10.3f}"
+            if args.rerank_factor > 0 and not rag_store.is_exact(index):
+                found, ms = run_queries(index, queries, args.k, corpus, args.rerank_factor)
+                line += f"{recall_at_k(truth, found):>15.3f}{ms:>10.3f}"
+            print(line)
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
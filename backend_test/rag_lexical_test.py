@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""
+RAG Lexical Test - Fast Path and BM25 Score Scale Checks
+
+Checks the two guarantees hybrid retrieval relies on:
+
+1. Lexical Fast Path: RagCorpus.lexical_match never returns an entry that
+   misses one of the query terms, on a synthetic corpus and on the shards
+   shipped in backend/rag
+2. Score Scale: a delta BM25 index built with the base index as reference
+   scores a document like the base index does, so base and delta results
+   can be merged by score
+
+Usage:
+- python rag_lexical_test.py
+- python -m pytest rag_lexical_test.py
+
+Version: 1.0
+"""
+
+import os
+import sys
+
+import faiss
+import numpy as np
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND)
+
+import rag_lexical  # noqa: E402
+import rag_store  # noqa: E402
+
+QUERIES = [
+    "group account", "group accounts", "file permissions", "ownership", "account expiry",
+    "disk quota", "ssh key", "login problems", "courtesy account", "student account",
+]
+
+SYNTHETIC = [
+    ("groups", "Group Accounts", "Group accounts are shared by a team."),
+    ("groups", "Logging into group accounts", "Use ssh to log into the group account."),
+    ("groups", "Ownership", "Files belong to a group."),
+    ("perms", "Permissions", "Each account has its own home directory."),
+    ("perms", "Viewing file permissions", "Run ls -l to see the mode bits."),
+    ("expiry", "When do CSE student accounts expire?", "Accounts expire after graduation."),
+]
+
+
+def _assert_full_matches(corpus, queries):
+    for query in queries:
+        terms = rag_lexical.tokenize(query)
+        hits = corpus.lexical_match(query, 10)
+        for hit in hits or []:
+            assert rag_lexical.contains_all(terms, hit["question"] + " " + hit["answer"]), \
+                f"{query!r} returned partial match {hit['question']!r}"
+
+
+def test_fast_path_synthetic():
+    index = faiss.IndexFlatL2(4)
+    index.add(np.random.default_rng(0).random((len(SYNTHETIC), 4), dtype="float32"))
+    corpus = rag_store.RagCorpus(index, SYNTHETIC)
+    hits = corpus.lexical_match("group account", 10)
+    assert hits is not None
+    assert [h["question"] for h in hits] == ["Group Accounts", "Logging into group accounts"]
+    _assert_full_matches(corpus, QUERIES)
+
+
+def test_fast_path_shipped_corpus():
+    rag_dir = os.path.join(BACKEND, "rag")
+    names = sorted({f.rsplit("_docs.json", 1)[0] for f in os.listdir(rag_dir) if f.endswith("_docs.json")})
+    corpus = rag_store.RagCorpus.load(rag_dir, names)
+    assert len(corpus)
+    _assert_full_matches(corpus, QUERIES)
+
+
+def test_delta_scores_match_base():
+    rng = np.random.default_rng(1)
+    words = [f"w{i}" for i in range(200)]
+    base_texts = [" ".join(rng.choice(words, 12)) for _ in range(1000)]
+    added = ["sftp upload guide", "printing quota"]
+    # The same entries once added to the delta and once built into the base
+    delta = rag_lexical.BM25Index(added, reference=rag_lexical.BM25Index(base_texts))
+    alone = rag_lexical.BM25Index(added)
+    merged = rag_lexical.BM25Index(base_texts + added)
+
+    terms = rag_lexical.tokenize("sftp upload")
+    base_score = merged.search(terms, 1)[0][0]
+    delta_score = delta.search(terms, 1)[0][0]
+    assert abs(delta_score - base_score) / base_score < 0.05, (base_score, delta_score)
+    # Without shared statistics the two-document index puts the same text on another scale
+    assert abs(alone.search(terms, 1)[0][0] - base_score) / base_score > 0.5
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
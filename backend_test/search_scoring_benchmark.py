@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+Search Scoring Benchmark - Per-Document Loop vs. Inverted Document Index Tool
+
+Compares the two ways /api/search can score a query against every document:
+
+- loop: json.loads each document's dense multi-hot encoding (the former
+  keywords_encoded column) and call calculate_similarity once per document
+  (the original search_api)
+- index: search.DocumentIndex, an inverted index from keyword ids and title
+  words to documents, scoring only the documents that share a keyword or
+  title word with the query, then argpartition for the top 5
+
+Key features include:
+
+1. Synthetic Corpora: Generated documents with multi-hot keyword encodings
+   and titles, at several corpus sizes
+2. Timing: Mean per-query latency of both paths and the mean number of
+   candidate documents the index scored, plus the one-off index build time
+   (uploads and deletes then update the index in place)
+3. Correctness: Largest score difference over all documents and whether
+   both paths return the same top 5
+
+Usage:
+- python search_scoring_benchmark.py
+- python search_scoring_benchmark.py --documents 10000 100000 --queries 5
+
+Version: 1.0
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from search import (  # noqa: E402
+    DocumentIndex, Vocabulary, calculate_similarity, encode_keyword_ids, extract_keywords, multi_hot_encode
+)
+
+TITLE_WORDS = [
+    "account", "exam", "password", "vpn", "printing", "quota", "email", "lab", "machine", "access",
+    "enrolment", "timetable", "wifi", "storage", "backup", "software", "licence", "course", "special",
+    "consideration", "assignment", "submission", "late", "penalty", "marks", "results", "graduation",
+    "library", "card", "parking", "security", "phishing", "reset", "guide", "policy", "request",
+]
+
+
+def synthetic_corpus(count, vocabulary_size, title_vocabulary_size, seed=0):
+    """Return (vocabulary, documents) shaped like get_pdf_documents_for_search rows"""
+    rnd = random.Random(seed)
+    keywords = sorted(f"topic{i}" for i in range(vocabulary_size))
+    vocabulary = Vocabulary(keywords)
+    rare_words = [f"term{i}" for i in range(title_vocabulary_size)]
+    documents = []
+    for doc_id in range(count):
+        doc_keywords = rnd.sample(keywords, rnd.randint(2, 6))
+        # One common word and a few rarer ones, as in real document titles
+        title = " ".join([rnd.choice(TITLE_WORDS)] + rnd.sample(rare_words, rnd.randint(1, 3))).capitalize()
+        documents.append({
+            "id": doc_id,
+            "title": title,
+            "keywords": ",".join(doc_keywords),
+            "keywords_encoded": json.dumps(multi_hot_encode(doc_keywords, vocabulary)),
+            "keyword_ids": encode_keyword_ids(doc_keywords, vocabulary),
+            "pdf_path": f"doc_{doc_id}.pdf",
+            "document_date": "2024-01-01",
+        })
+    return vocabulary, documents
+
+
+def loop_search(documents, query_encoded, query):
+    """The original per-document search_api loop; returns (scores, top 5 rows)"""
+    scores = []
+    for doc in documents:
+        keywords_encoded = json.loads(doc["keywords_encoded"])
+        scores.append(calculate_similarity(query_encoded, keywords_encoded, query, doc["title"]))
+    ranked = sorted([(row, s) for row, s in enumerate(scores) if s > 0.1], key=lambda x: x[1], reverse=True)[:5]
+    return np.array(scores), [row for row, _ in ranked]
+
+
+def index_search(index, query_ids, query):
+    """Candidate-only scoring; returns (document ids, scores, top 5 ids)"""
+    document_ids, scores = index.score(query_ids, query)
+    return document_ids, scores, [document_id for document_id, _ in index.top(document_ids, scores, 5, 0.1)]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/search scoring: per-document loop vs sparse index")
+    parser.add_argument("--documents", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--vocabulary", type=int, default=2000, help="Keywords in the vocabulary")
+    parser.add_argument("--title-vocabulary", type=int, default=5000, help="Distinct rare title words")
+    parser.add_argument("--queries", type=int, default=3)
+    args = parser.parse_args()
+
+    print("Search Scoring Benchmark")
+    print("=" * 60)
+    print(f"Vocabulary: {args.vocabulary} keywords, {args.title_vocabulary} rare title words, "
+          f"queries per corpus: {args.queries}")
+    print("=" * 60)
+    print(f"{'docs':>8}{'loop/query':>13}{'index/query':>13}{'candidates':>12}{'speedup':>9}"
+          f"{'build':>9}{'max diff':>11}  top 5")
+
+    for count in args.documents:
+        vocabulary, documents = synthetic_corpus(count, args.vocabulary, args.title_vocabulary)
+        index, build_time = timed(DocumentIndex, documents)
+        rnd = random.Random(count)
+        loop_total = index_total = 0.0
+        candidates = 0
+        max_diff = 0.0
+        same_top = True
+        for _ in range(args.queries):
+            doc = rnd.choice(documents)
+            query = f"{' '.join(doc['keywords'].split(',')[:2])} {doc['title'].split()[0]}"
+            extracted = extract_keywords(query, vocabulary)
+            query_encoded = multi_hot_encode(extracted, vocabulary)
+            query_ids = encode_keyword_ids(extracted, vocabulary)
+            (loop_scores, loop_top), loop_time = timed(loop_search, documents, query_encoded, query)
+            (document_ids, scores, index_top), index_time = timed(index_search, index, query_ids, query)
+            loop_total += loop_time
+            index_total += index_time
+            candidates += len(document_ids)
+            # Document ids are row numbers; documents that were not candidates score 0
+            index_scores = np.zeros(count)
+            index_scores[document_ids] = scores
+            max_diff = max(max_diff, float(np.max(np.abs(loop_scores - index_scores))))
+            same_top = same_top and loop_top == index_top
+        loop_ms = loop_total / args.queries * 1000
+        index_ms = index_total / args.queries * 1000
+        print(f"{count:>8}{loop_ms:>10.1f} ms{index_ms:>10.2f} ms{candidates // args.queries:>12}{loop_ms / index_ms:>8.0f}x"
+              f"{build_time:>8.2f}s{max_diff:>11.1e}  {'same' if same_top else 'DIFFERENT'}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
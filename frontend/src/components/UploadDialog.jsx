@@ -22,6 +22,7 @@ function UploadDialog({ open, onClose, onUpload }) {
   const [selectedFile, setSelectedFile] = useState(null);
   const [uploading, setUploading] = useState(false);
   const [error, setError] = useState('');
+  const [progress, setProgress] = useState('');
   const fileInputRef = useRef();
 
   const handleFileSelect = (event) => {
@@ -35,6 +36,22 @@ function UploadDialog({ open, onClose, onUpload }) {
     }
   };
 
+  // Poll the ingestion job until the background worker finishes it
+  const waitForJob = async (statusUrl) => {
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const response = await fetch(statusUrl);
+      const job = await response.json();
+      if (!job.success) {
+        throw new Error(job.error || 'Failed to get processing status');
+      }
+      if (job.status === 'succeeded' || job.status === 'failed') {
+        return job;
+      }
+      setProgress(`Processing: ${job.stage} (${job.progress}%)`);
+    }
+  };
+
   const handleUpload = async () => {
     if (!selectedFile) {
       setError('Please select a PDF file');
@@ -70,17 +87,25 @@ function UploadDialog({ open, onClose, onUpload }) {
 
       const data = await response.json();
       
-      if (data.success) {
-        onUpload(data);
+      if (!data.success) {
+        setError(data.message || 'Upload failed');
+        return;
+      }
+
+      setProgress('Processing: queued');
+      const job = await waitForJob(data.status_url);
+      if (job.status === 'succeeded') {
+        onUpload({ ...data, entries: job.entries });
         handleClose();
       } else {
-        setError(data.message || 'Upload failed');
+        setError(job.error || 'Processing failed');
       }
     } catch (err) {
       console.error('Error uploading document:', err);
       setError('Network error occurred');
     } finally {
       setUploading(false);
+      setProgress('');
     }
   };
 
@@ -90,6 +115,7 @@ function UploadDialog({ open, onClose, onUpload }) {
     setDocumentDate(null);
     setSelectedFile(null);
     setError('');
+    setProgress('');
     setUploading(false);
     if (fileInputRef.current) {
       fileInputRef.current.value = '';
@@ -160,6 +186,13 @@ function UploadDialog({ open, onClose, onUpload }) {
             />
           </LocalizationProvider>
 
+          {/* Processing Status */}
+          {progress && (
+            <Alert severity="info" sx={{ mb: 2 }}>
+              {progress}
+            </Alert>
+          )}
+
           {/* Error Display */}
           {error && (
             <Alert severity="error" sx={{ mb: 2 }}>